@@ -2,6 +2,7 @@ import kite_data
 import pandas as pd
 import numpy as np
 import time
+import telemetry
 
 # List of instruments to scan
 SYMBOL_LIST = [
@@ -136,14 +137,16 @@ def score_symbol(symbol, df):
         "reasons": ", ".join(reasons)
     }
 
-def pick_best_symbol():
+@telemetry.traced()
+def rank_symbols(limit=None):
     """
-    Iterates through SYMBOL_LIST, fetches data, scores them, and returns the best one.
+    Iterates through SYMBOL_LIST, fetches data and scores each symbol.
+    Returns the score details of every scanned symbol, best first
+    (at most `limit` entries if given).
     """
     print(f"\n[AutoSelect] Scanning {len(SYMBOL_LIST)} symbols for best opportunity...")
     
-    best_score = -999
-    best_pick = None
+    ranked = []
     
     for sym in SYMBOL_LIST:
         print(f" -> Checking {sym}...", end="")
@@ -156,12 +159,21 @@ def pick_best_symbol():
         score, details = score_symbol(sym, df)
         
         print(f" Score: {score:.1f} ({details['trend']})")
+        ranked.append(details)
         
-        if score > best_score:
-            best_score = score
-            best_pick = details
+    # Stable sort keeps SYMBOL_LIST order on ties (first scanned wins)
+    ranked.sort(key=lambda d: d['score'], reverse=True)
+    return ranked[:limit] if limit else ranked
+
+@telemetry.traced()
+def pick_best_symbol():
+    """
+    Returns the best symbol from rank_symbols().
+    """
+    ranked = rank_symbols(limit=1)
             
-    if best_pick:
+    if ranked:
+        best_pick = ranked[0]
         return (
             best_pick['symbol'], 
             best_pick['reasons'], 
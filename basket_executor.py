@@ -0,0 +1,165 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils import logger
+import kite_data
+from rate_limiter import ENDPOINT_LIMITS, ORDERS, PRIORITY_ORDER, PRIORITY_EXIT
+
+# ------------------------------------------------------------------------
+# MULTI-LEG BASKET EXECUTION
+# ------------------------------------------------------------------------
+# Legs of one basket go out concurrently (the broker's order bucket in
+# rate_limiter still caps the rate). With hedge_first, the BUY legs are
+# sent and acknowledged before any SELL leg, so the shorts are margined as
+# hedged. With all_or_nothing, any rejected leg unwinds the legs already
+# filled. A leg only counts as filled once the order book mirror reports
+# it COMPLETE; without a mirror, accepted orders stay PLACED (unconfirmed)
+# and are never reversed, since the reversal could fill while the original
+# does not.
+
+MAX_CONCURRENT_LEGS = int(ENDPOINT_LIMITS[ORDERS][1])
+ACK_TIMEOUT = 3.0   # seconds to wait for an order update when an order book is attached
+ACK_POLL = 0.05
+FILLED_STATUS = "COMPLETE"
+FAILED_STATUSES = ("REJECTED", "CANCELLED")
+DONE_STATUSES = (FILLED_STATUS,) + FAILED_STATUSES
+
+def make_leg(action, symbol, token, qty, exchange="NFO", product="INTRADAY", order_type="MARKET", price=0):
+    return {"action": action, "symbol": symbol, "token": token, "qty": qty, "exchange": exchange,
+            "product": product, "order_type": order_type, "price": price}
+
+def legs_from_trade(trade_legs, product="NRML"):
+    """
+    Basket legs for the "legs" of a suggest_trade plan (single-leg or
+    hedging_engine spreads). Plan symbols carry the "NFO:" quote prefix;
+    orders take the bare tradingsymbol, whose token comes from the NFO dump.
+    """
+    kite_data.ensure_tokens_loaded(kite_data.get_kite())
+    legs = []
+    for leg in trade_legs:
+        symbol = kite_data.bare_symbol(leg["symbol"])
+        legs.append(make_leg(leg["action"], symbol, kite_data.OPTION_TOKENS.get(symbol), leg["qty"], product=product))
+    return legs
+
+def execute_plan(result, broker, order_book=None, product="NRML"):
+    """
+    Places a suggest_trade TRADE result as one basket: hedges first, and
+    all-or-nothing, so a spread is never left with a naked short leg.
+    Returns the BasketExecutor.execute report.
+    """
+    if result.get("status") != "TRADE":
+        raise ValueError(f"Not a trade plan: {result.get('status')} ({result.get('reason')})")
+    legs = legs_from_trade(result["data"]["legs"], product)
+    missing = [leg["symbol"] for leg in legs if leg["token"] is None]
+    if missing:
+        raise ValueError(f"No instrument token for {', '.join(missing)}")
+    return BasketExecutor(broker, order_book).execute(legs, hedge_first=True, all_or_nothing=True)
+
+def _reverse(action):
+    return "SELL" if action == "BUY" else "BUY"
+
+class BasketExecutor:
+    def __init__(self, broker, order_book=None, max_workers=MAX_CONCURRENT_LEGS, ack_timeout=ACK_TIMEOUT):
+        self.broker = broker
+        self.order_book = order_book # Optional OrderBookMirror: confirms fills/rejections
+        self.max_workers = max_workers
+        self.ack_timeout = ack_timeout
+
+    def _place(self, leg, priority, action=None):
+        """
+        Places one leg; returns a report with order id, status and ack latency (ms).
+        """
+        action = action or leg["action"]
+        start = time.perf_counter()
+        try:
+            order_id = self.broker.place_order(action, leg["exchange"], leg["token"], leg["qty"], leg["product"],
+                                               leg["order_type"], leg["price"], leg["symbol"], priority=priority)
+            error = None if order_id else "Order not accepted"
+        except Exception as e:
+            order_id, error = None, str(e)
+        latency = round((time.perf_counter() - start) * 1000, 2)
+
+        status = "PLACED" if order_id else "REJECTED"
+        if order_id and self.order_book:
+            status = self._await_status(order_id)
+            if status in FAILED_STATUSES:
+                order = self.order_book.get_order(order_id) or {}
+                error = order.get("status_message") or status
+        return dict(leg, action=action, order_id=order_id, status=status, ok=status not in FAILED_STATUSES,
+                    error=error, latency_ms=latency)
+
+    def _await_status(self, order_id):
+        """
+        Waits (bounded) for the order book mirror to see a terminal status.
+        """
+        deadline = time.monotonic() + self.ack_timeout
+        status = "PLACED"
+        while time.monotonic() < deadline:
+            order = self.order_book.get_order(order_id)
+            status = (order or {}).get("status") or status
+            if status in DONE_STATUSES:
+                break
+            time.sleep(ACK_POLL)
+        return status
+
+    def _place_all(self, legs, priority, action_fn=None):
+        if not legs:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(legs))) as pool:
+            futures = [pool.submit(self._place, leg, priority, action_fn(leg) if action_fn else None) for leg in legs]
+            return [f.result() for f in futures]
+
+    def execute(self, legs, hedge_first=True, all_or_nothing=True, priority=PRIORITY_ORDER):
+        """
+        Places a basket of legs (see make_leg).
+
+        Returns {"status", "legs": [per-leg report], "rollback": [per-leg report],
+                 "open": [legs left in the account], "elapsed_ms"} where status is
+        - FILLED: every leg confirmed COMPLETE
+        - PLACED: every leg accepted, not all confirmed filled
+        - ROLLED_BACK: a leg failed and every filled leg was reversed
+        - PARTIAL: a leg failed and some legs are still open (see "open")
+        """
+        start = time.perf_counter()
+        if hedge_first:
+            waves = [[l for l in legs if l["action"] == "BUY"], [l for l in legs if l["action"] != "BUY"]]
+        else:
+            waves = [list(legs)]
+
+        reports = []
+        failed = False
+        for wave in waves:
+            results = self._place_all(wave, priority)
+            reports.extend(results)
+            if any(not r["ok"] for r in results):
+                failed = True
+                break # never send shorts without their hedges
+
+        rollback = []
+        unwound = []
+        if failed and all_or_nothing:
+            # Only confirmed fills are reversed
+            filled = [r for r in reports if r["status"] == FILLED_STATUS]
+            # Unwind shorts first so the position is never short and unhedged
+            shorts = [r for r in filled if r["action"] == "SELL"]
+            longs = [r for r in filled if r["action"] != "SELL"]
+            for group in (shorts, longs):
+                results = self._place_all(group, PRIORITY_EXIT, lambda r: _reverse(r["action"]))
+                rollback.extend(results)
+                unwound.extend(r for r, rb in zip(group, results) if rb["ok"])
+
+        open_legs = [r for r in reports if r["ok"] and not any(r is u for u in unwound)]
+
+        if not failed:
+            status = "FILLED" if all(r["status"] == FILLED_STATUS for r in reports) else "PLACED"
+        else:
+            status = "PARTIAL" if open_legs else "ROLLED_BACK"
+
+        elapsed = round((time.perf_counter() - start) * 1000, 2)
+        for r in reports:
+            logger.info(f"[Basket] {r['action']} {r['qty']} x {r['symbol']}: {r['status']} ({r['latency_ms']}ms)"
+                        + (f" - {r['error']}" if r['error'] else ""))
+        if rollback:
+            logger.warning(f"[Basket] Rolled back {len(rollback)} leg(s): " + ", ".join(f"{r['symbol']} {r['status']}" for r in rollback))
+        logger.info(f"[Basket] {status} in {elapsed}ms ({len(legs)} legs)")
+
+        return {"status": status, "legs": reports, "rollback": rollback, "open": open_legs, "elapsed_ms": elapsed}
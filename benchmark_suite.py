@@ -0,0 +1,348 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import fnmatch
+import logging
+import argparse
+import datetime
+import platform
+import tempfile
+import statistics
+import contextlib
+
+# ------------------------------------------------------------------------
+# BENCHMARK SUITE
+# ------------------------------------------------------------------------
+# Microbenchmarks of the hot engine functions plus end-to-end scans
+# (suggest_trade, get_advice_report) against offline_kite.OfflineKite, so
+# results do not depend on the network, the market or the account.
+#
+#   python benchmark_suite.py run --save benchmarks/baseline.json
+#   python benchmark_suite.py run --compare benchmarks/baseline.json
+#   python benchmark_suite.py compare benchmarks/baseline.json benchmarks/new.json
+#
+# Everything runs inside a scratch directory (journal DB, trailing-stop
+# book, logs never touch the real ones), Telegram is switched off and
+# the Kite rate-limit buckets are lifted unless --real-limits is given
+# (the 1/s quote bucket would otherwise be all an end-to-end run
+# measures). A benchmark is one median over --repeat samples; compare
+# flags any benchmark whose median grew by more than --threshold.
+
+DEFAULT_REPEAT = 7
+DEFAULT_THRESHOLD = 0.10    # +10% median = regression
+JOURNAL_TRADES = 20000      # size of the synthetic journal for the feedback benchmarks
+BENCH_CAPITAL = 50000
+
+BENCHMARKS = [] # (name, number of calls per sample, setup(env) -> callable)
+
+def benchmark(name, number=1):
+    def register(setup):
+        BENCHMARKS.append((name, number, setup))
+        return setup
+    return register
+
+class QuietLogger:
+    """
+    SimpleLogger stand-in that keeps nothing and never reaches Telegram.
+    """
+    def log(self, message):
+        pass
+
+    def get_logs(self):
+        return ""
+
+    def clear(self):
+        pass
+
+    def flush_to_telegram(self):
+        pass
+
+# ------------------------------------------------------------------------
+# FIXTURES
+# ------------------------------------------------------------------------
+def write_journal_csv(path, trades, seed=11):
+    """
+    Synthetic legacy journal (migrated into the scratch DB on first open).
+    """
+    import journal_store
+    rng = random.Random(seed)
+    # 8 trades a day, ending yesterday (today's count would trip the DNT max-trades gate)
+    start = datetime.datetime.combine(datetime.date.today() - datetime.timedelta(days=trades // 8 + 1), datetime.time(9, 20))
+    reasons = ["Trend Breakout", "Mean Reversion", "OI Buildup", "Momentum", "Expiry Scalp"]
+    regimes = ["TRENDING_UP", "TRENDING_DOWN", "SIDEWAYS", "HIGH_VOL"]
+    strategies = ["BUY_CE", "BUY_PE", "BULL_SPREAD", "BEAR_SPREAD"]
+    with open(path, "w") as f:
+        f.write(",".join(h for h, _ in journal_store.COLUMNS) + "\n")
+        for i in range(trades):
+            ts = start + datetime.timedelta(days=i // 8, minutes=(i % 8) * 45)
+            entry = round(rng.uniform(40, 250), 2)
+            exit_ = round(max(entry * rng.gauss(1.02, 0.25), 0.05), 2)
+            f.write(",".join(str(v) for v in [
+                ts.strftime("%Y-%m-%d %H:%M:%S"), f"NIFTY{ts:%y%b}".upper() + f"{22000 + 50 * rng.randint(-10, 10)}CE",
+                22000, rng.choice(["WEEKLY", "MONTHLY"]), entry, exit_, round((exit_ - entry) * 75, 2),
+                rng.choice(reasons), rng.choice(["TARGET", "SL", "TIME"]), rng.choice(regimes),
+                rng.choice(strategies), rng.randint(0, 9), rng.choice(["LOW", "MEDIUM", "HIGH"])
+            ]) + "\n")
+
+def lift_rate_limits():
+    from rate_limiter import kite_limiter
+    for bucket in kite_limiter.buckets.values():
+        bucket.rate = bucket.burst = bucket.tokens = 1e9
+
+def make_env(args):
+    """
+    Offline Kite and shared fixtures for every benchmark.
+    """
+    write_journal_csv("trade_journal.csv", args.journal_trades)
+
+    import config
+    import kite_data
+    import offline_kite
+    config.TELEGRAM_BOT_TOKEN = "" # never message the real chat from a benchmark
+    if not args.real_limits:
+        lift_rate_limits()
+
+    kite = offline_kite.OfflineKite(seed=args.seed)
+    kite_data.set_kite(kite)
+    kite_data.ensure_tokens_loaded(kite)
+    return {"kite": kite, "positions": open_sample_book(kite)}
+
+def open_sample_book(kite):
+    """
+    Buys a small book of near-the-money options for the advisor; returns
+    kite.positions()["net"].
+    """
+    import offline_kite
+    for name, offset, otype in (("NIFTY", 2, "CE"), ("NIFTY", -2, "PE"), ("BANKNIFTY", 3, "CE")):
+        gap = offline_kite.get_strike_gap(name)
+        expiry = min(i["expiry"] for i in kite.nfo if i["name"] == name)
+        strike = (round(kite.spot(name) / gap) + offset) * gap
+        symbol = offline_kite.expiry_engine.get_option_symbol(name, expiry, strike, otype)
+        kite.place_order(kite.VARIETY_REGULAR, "NFO", symbol, "BUY", offline_kite.UNDERLYINGS[name][2],
+                         kite.PRODUCT_NRML, kite.ORDER_TYPE_MARKET)
+    return kite.positions()["net"]
+
+# ------------------------------------------------------------------------
+# BENCHMARKS
+# ------------------------------------------------------------------------
+@benchmark("greeks.get_greeks", number=2000)
+def _greeks(env):
+    import greeks_engine
+    return lambda: greeks_engine.get_greeks(22150, 22300, 7 / 365, greeks_engine.RISK_FREE_RATE, 0.14, "CE")
+
+@benchmark("greeks.get_implied_volatility", number=500)
+def _implied_vol(env):
+    import greeks_engine
+    T = 7 / 365
+    price = float(greeks_engine.bs_price_vectorized(22150, 22300, T, greeks_engine.RISK_FREE_RATE, 0.16, True))
+    return lambda: greeks_engine.get_implied_volatility(price, 22150, 22300, T, greeks_engine.RISK_FREE_RATE, "CE")
+
+@benchmark("auto_symbol_selector.calculate_indicators", number=50)
+def _indicators(env):
+    import pandas as pd
+    import auto_symbol_selector
+    now = datetime.datetime.now()
+    candles = env["kite"].historical_data(256265, now - datetime.timedelta(days=30), now, "5minute")
+    df = pd.DataFrame(candles)
+    return lambda: auto_symbol_selector.calculate_indicators(df.copy())
+
+@benchmark("market_regime_engine.get_market_metrics", number=10)
+def _market_metrics(env):
+    import market_regime_engine
+    return lambda: market_regime_engine.get_market_metrics("NIFTY")
+
+@benchmark("expected_move_engine.evaluate_expectancy", number=2000)
+def _expectancy(env):
+    import expected_move_engine
+    candidate = {"premium": 120.0, "type": "CE", "strike": 22300}
+    metrics = {"atr": 180.0, "avg_atr": 160.0, "spot_price": 22150.0, "iv_rank": 45}
+    greeks = {"delta": 0.42, "theta": -9.5, "iv": 14.2}
+    return lambda: expected_move_engine.evaluate_expectancy(candidate, metrics, greeks, 60)
+
+@benchmark("performance_engine.get_feedback", number=200)
+def _feedback(env):
+    import performance_engine
+    performance_engine.get_feedback() # first call folds the migrated journal into the cube
+    context = {"Regime": "SIDEWAYS", "Strategy": "Momentum", "DTE": 0, "Time": "14:05"}
+    return lambda: performance_engine.get_feedback(context)
+
+@benchmark("performance_cube.sync", number=50)
+def _cube_sync(env):
+    import journal_store
+    import performance_cube
+    store = journal_store.get_journal_store()
+    cube = performance_cube.get_cube()
+    # Dated in the past, so the e2e scans' daily trade count is unchanged
+    trade = {"Timestamp": "2020-01-02 10:05:00", "Symbol": "NIFTY20JAN12000CE", "ExpiryType": "WEEKLY",
+             "Entry": 100.0, "Exit": 110.0, "PnL": 750.0, "EntryReason": "Momentum", "Regime": "SIDEWAYS", "DTE": 2}
+    def run():
+        store.add(trade)
+        cube.sync()
+    return run
+
+@benchmark("e2e.suggest_trade")
+def _suggest(env):
+    import suggestion_engine
+    def run():
+        suggestion_engine.suggest_trade(BENCH_CAPITAL, BENCH_CAPITAL, kite=env["kite"], logger=QuietLogger())
+    return run
+
+@benchmark("e2e.get_advice_report")
+def _advice(env):
+    import position_advisor_engine
+    return lambda: position_advisor_engine.get_advice_report(env["kite"], env["positions"])
+
+# ------------------------------------------------------------------------
+# RUNNER
+# ------------------------------------------------------------------------
+def time_one(fn, number, repeat):
+    fn() # warm-up (imports, caches, first-call allocations)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return samples
+
+def run_suite(args):
+    selected = [b for b in BENCHMARKS if not args.only or any(fnmatch.fnmatch(b[0], p) for p in args.only)]
+    if not selected:
+        sys.exit(f"No benchmark matches {args.only}")
+    home = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix="bench-")
+    os.chdir(scratch)
+    results = {}
+    logging.disable(logging.CRITICAL)
+    try:
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            env = make_env(args)
+        for name, number, setup in selected:
+            with contextlib.redirect_stdout(open(os.devnull, "w")):
+                fn = setup(env)
+                before = sum(env["kite"].calls.values())
+                samples = time_one(fn, number, args.repeat)
+                api_calls = (sum(env["kite"].calls.values()) - before) / (number * (args.repeat + 1))
+            results[name] = {
+                "median_s": statistics.median(samples),
+                "min_s": min(samples),
+                "mean_s": statistics.fmean(samples),
+                "stdev_s": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+                "number": number,
+                "repeat": args.repeat,
+                "api_calls": round(api_calls, 2)
+            }
+            print(f"{name:<45} {fmt_seconds(results[name]['median_s']):>10}  "
+                  f"(min {fmt_seconds(results[name]['min_s'])}, {api_calls:g} API calls)")
+    finally:
+        logging.disable(logging.NOTSET)
+        os.chdir(home)
+        shutil.rmtree(scratch, ignore_errors=True)
+    return {"meta": meta(args), "results": results}
+
+def meta(args):
+    import numpy
+    import pandas
+    return {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} cpus)",
+        "journal_trades": args.journal_trades,
+        "real_limits": args.real_limits,
+        "seed": args.seed
+    }
+
+def fmt_seconds(s):
+    if s < 1e-3:
+        return f"{s * 1e6:.1f}us"
+    if s < 1:
+        return f"{s * 1e3:.2f}ms"
+    return f"{s:.3f}s"
+
+# ------------------------------------------------------------------------
+# BASELINES
+# ------------------------------------------------------------------------
+def save(report, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[*] Saved {len(report['results'])} results to {path}")
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Prints a median-vs-median table. Returns the names that regressed
+    by more than threshold (benchmarks missing on either side are listed
+    but never count as regressions).
+    """
+    regressions = []
+    print(f"{'benchmark':<45} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name in sorted(set(baseline["results"]) | set(current["results"])):
+        old, new = baseline["results"].get(name), current["results"].get(name)
+        if not old or not new:
+            print(f"{name:<45} {'-' if not old else fmt_seconds(old['median_s']):>10} "
+                  f"{'-' if not new else fmt_seconds(new['median_s']):>10} {'n/a':>8}")
+            continue
+        change = new["median_s"] / old["median_s"] - 1 if old["median_s"] else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{name:<45} {fmt_seconds(old['median_s']):>10} {fmt_seconds(new['median_s']):>10} {change:>+8.1%}{flag}")
+    if regressions:
+        print(f"[!] {len(regressions)} regression(s) beyond {threshold:.0%}: {', '.join(regressions)}")
+    else:
+        print(f"[*] No regressions beyond {threshold:.0%}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Engine microbenchmarks and offline end-to-end scans")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run the suite")
+    run.add_argument("--only", nargs="+", metavar="PATTERN", help="glob(s) over benchmark names")
+    run.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    run.add_argument("--save", metavar="FILE", help="write the results as a JSON baseline")
+    run.add_argument("--compare", metavar="BASELINE", help="compare against a saved baseline")
+    run.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    run.add_argument("--journal-trades", type=int, default=JOURNAL_TRADES)
+    run.add_argument("--seed", type=int, default=7)
+    run.add_argument("--real-limits", action="store_true", help="keep the Kite rate-limit buckets")
+
+    cmp = sub.add_parser("compare", help="compare two saved results")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    sub.add_parser("list", help="list benchmark names")
+
+    args = parser.parse_args(argv)
+    if args.command == "list":
+        for name, number, _ in BENCHMARKS:
+            print(f"{name}  (x{number} per sample)")
+        return 0
+    if args.command == "compare":
+        return 1 if compare(load(args.baseline), load(args.current), args.threshold) else 0
+
+    # Paths are resolved before the suite moves into its scratch directory
+    save_path = os.path.abspath(args.save) if args.save else None
+    baseline = load(os.path.abspath(args.compare)) if args.compare else None
+    report = run_suite(args)
+    if save_path:
+        save(report, save_path)
+    if baseline:
+        return 1 if compare(baseline, report, args.threshold) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -22,7 +22,7 @@ class BrokerInterface(ABC):
         
     @abstractmethod
     def place_order(self, transaction_type: str, exchange: str, symbol_token: str, qty: int, order_type: str, price: float = 0):
-        """Places a buy/sell order."""
+        """Places a buy/sell order. Implementations accept priority=rate_limiter.PRIORITY_* (exits jump the order queue)."""
         pass
         
     @abstractmethod
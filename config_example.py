@@ -10,3 +10,20 @@ TELEGRAM_CHAT_ID = "YOUR_CHAT_ID_HERE"
 # Trading Settings
 CAPITAL = 50000  # Default Capital
 RISK_PER_TRADE = 0.02 # 2% risk
+
+# Compare the local margin estimate of each trade plan with kite.basket_order_margins
+# (one extra API call per plan; sizing never waits on it)
+MARGIN_BROKER_CHECK = False
+
+# Instrumentation (telemetry.py): stage spans + Kite latency histograms
+TELEMETRY_ENABLED = False
+TELEMETRY_DIR = "telemetry"
+
+# Broker endpoints (None = live Kite REST API / live KiteTicker websocket).
+# Point both at kite_simulator.py to run without a broker:
+# KITE_ROOT = "http://127.0.0.1:8765", KITE_TICKER_ROOT = "ws://127.0.0.1:8766"
+KITE_ROOT = None
+KITE_TICKER_ROOT = None
+
+# Mock broker: no ticker websocket is opened; prices are polled over REST
+USE_MOCK_BROKER = False
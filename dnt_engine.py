@@ -1,8 +1,11 @@
 
 import datetime
-import os
-import csv
 import config
+import journal_store
+
+# SYSTEM CONSTANTS
+MAX_TRADES_PER_DAY = 5
+MAX_DAILY_LOSS = -2000 # Example
 
 def check_dnt(market_context):
     """
@@ -26,17 +29,17 @@ def check_dnt(market_context):
     }
     """
     
-    # SYSTEM CONSTANTS
-    MAX_TRADES_PER_DAY = 5
-    MAX_DAILY_LOSS = -2000 # Example
-    
-    result = {
-        "do_not_trade": False,
-        "primary_reason": "",
-        "risk_category": "",
-        "notes": ""
-    }
-    
+    journal_res = check_dnt_journal()
+    if journal_res['do_not_trade']:
+        return journal_res
+
+    return check_dnt_market(market_context)
+
+def check_dnt_journal():
+    """
+    The journal-only half of check_dnt (Overtrading / Fatigue).
+    Needs no market data, so it can run before any network fetch.
+    """
     # ----------------------------------------------------------------
     # 1. OVERTRADING / FATIGUE PROTECTION
     # ----------------------------------------------------------------
@@ -47,7 +50,14 @@ def check_dnt(market_context):
         
     if stats['consecutive_losses'] >= 2:
          return _dnt("Consecutive Losses", "FATIGUE", "2 consecutive losses detected. Take a break.")
-    
+
+    return _clear()
+
+def check_dnt_market(market_context):
+    """
+    The market half of check_dnt (Theta Bleed / No-Edge).
+    Needs regime, volatility and IV rank in market_context.
+    """
     # ----------------------------------------------------------------
     # 2. THETA BLEED ENVIRONMENT (Time Based)
     # ----------------------------------------------------------------
@@ -75,7 +85,15 @@ def check_dnt(market_context):
     if "SIDEWAYS" in regime and vol_state == "LOW" and iv_rank < 20:
          return _dnt("Low Vol Range", "NO_EDGE", "Sideways market with Low IV. Option Sellers only.")
          
-    return result
+    return _clear()
+
+def _clear():
+    return {
+        "do_not_trade": False,
+        "primary_reason": "",
+        "risk_category": "",
+        "notes": ""
+    }
 
 def _dnt(reason, category, notes):
     return {
@@ -87,34 +105,22 @@ def _dnt(reason, category, notes):
 
 def _get_daily_stats():
     """
-    Reads trade_journal.csv to count today's trades and PnL.
+    Today's trade count and losing streak from the journal store
+    (indexed by date, so cost does not grow with history).
     """
     count = 0
     consecutive_losses = 0
-    today_str = datetime.datetime.now().strftime("%Y-%m-%d")
     
-    if not os.path.exists("trade_journal.csv"):
-        return {'count': 0, 'consecutive_losses': 0}
-        
     try:
-        with open("trade_journal.csv", "r") as f:
-            reader = csv.DictReader(f)
-            # Find today's trades
-            trades = []
-            for row in reader:
-                if row['Timestamp'].startswith(today_str):
-                    trades.append(row)
-            
-            count = len(trades)
-            
-            # Check last 2 for losses
-            # Assumes chronological order
-            if count >= 2:
-                last_1 = float(trades[-1]['PnL'])
-                last_2 = float(trades[-2]['PnL'])
-                if last_1 < 0 and last_2 < 0:
-                    consecutive_losses = 2
-                    
+        store = journal_store.get_journal_store()
+        count = store.count_on()
+        
+        # Check last 2 for losses
+        if count >= 2:
+            last_1, last_2 = store.last_pnls(2, date=datetime.date.today().isoformat())
+            if last_1 is not None and last_2 is not None and last_1 < 0 and last_2 < 0:
+                consecutive_losses = 2
+                
     except Exception as e:
         print(f"[DNT] Error reading journal: {e}")
         
@@ -1,5 +1,5 @@
 
-import math
+import numpy as np
 
 def evaluate_expectancy(candidate, market_metrics, greeks, holding_minutes=60):
     """
@@ -22,89 +22,110 @@ def evaluate_expectancy(candidate, market_metrics, greeks, holding_minutes=60):
     }
     """
     
-    # 1. EXTRACT DATA
-    atr = market_metrics.get('atr', 0)
-    spot = market_metrics.get('spot_price', 0)
+    premium = candidate['premium']
+    batch = evaluate_expectancy_batch(
+        [premium], [abs(greeks.get('delta', 0.5))], [greeks.get('theta', 0)],
+        [greeks.get('iv', 0)], market_metrics, [holding_minutes]
+    )
+
+    # Defaults
+    if batch["data_missing"]:
+        return _allow("Data Missing (ATR/Spot)", 0, 0, 0, 999)
+
+    expected_spot_move = float(batch["expected_spot_move"][0, 0])
+    expected_option_gain = float(batch["expected_option_gain"][0, 0])
+    total_expected_cost = float(batch["expected_cost"][0, 0])
+    edge_ratio = float(batch["edge_ratio"][0, 0])
     
-    delta = abs(greeks.get('delta', 0.5))
-    theta = abs(greeks.get('theta', 0))
-    iv = greeks.get('iv', 0) / 100.0 # Convert to decimal
+    if batch["allowed"][0, 0]:
+        return _allow(f"Positive Expectancy ({edge_ratio:.2f})", expected_spot_move, expected_option_gain, total_expected_cost, edge_ratio)
+    else:
+        reason = f"Low Edge ({edge_ratio:.2f}). ExpMove {expected_spot_move:.1f}pts < Cost."
+        return _block(reason, expected_spot_move, expected_option_gain, total_expected_cost, edge_ratio)
+
+def evaluate_expectancy_batch(premium, delta, theta, iv, market_metrics, holding_minutes=(60,)):
+    """
+    Array version of evaluate_expectancy: N candidates x H holding horizons
+    in one call, unrounded.
     
-    premium = candidate['premium']
+    Inputs:
+    - premium, delta, theta, iv: length-N arrays (iv in percent, like greeks['iv'])
+    - market_metrics: {atr, spot_price, regime}
+    - holding_minutes: length-H array of horizons
     
-    # Defaults
+    Returns dict of (N, H) arrays "expected_spot_move", "expected_option_gain",
+    "expected_cost", "edge_ratio", "allowed" plus "required_edge" and
+    "data_missing" (ATR/spot unavailable: everything allowed, edge 999).
+    """
+    premium = np.asarray(premium, dtype=float)[:, None]
+    delta = np.abs(np.asarray(delta, dtype=float))[:, None]
+    theta = np.abs(np.asarray(theta, dtype=float))[:, None]
+    iv = np.asarray(iv, dtype=float)[:, None] / 100.0 # Convert to decimal
+    minutes = np.asarray(holding_minutes, dtype=float)[None, :]
+    shape = (premium.shape[0], minutes.shape[1])
+
+    # 1. EXTRACT DATA
+    atr = market_metrics.get('atr', 0)
+    spot = market_metrics.get('spot_price', 0)
+
+    # Adjust Buffer based on Regime
+    # IF regime == RANGE (Sideways/Slow) -> 1.5
+    # ELSE -> 1.2
+    regime = market_metrics.get('regime', "SIDEWAYS")
+    required_edge = 1.2 # Default for Trending/Volatile
+    if "SIDEWAYS" in regime or "SLOW" in regime:
+        required_edge = 1.5
+
     if atr == 0 or spot == 0:
-        return _allow("Data Missing (ATR/Spot)", 0, 0, 0, 999)
+        zeros = np.zeros(shape)
+        return {"expected_spot_move": zeros, "expected_option_gain": zeros, "expected_cost": zeros,
+                "edge_ratio": np.full(shape, 999.0), "allowed": np.ones(shape, dtype=bool),
+                "required_edge": required_edge, "data_missing": True}
 
     # 2. CALCULATE EXPECTED SPOT MOVE
-    # Method 1: ATR Based
-    # Normalized for holding period
+    # Method 1: ATR Based, normalized for holding period
     # Session minutes = 375 (9:15 to 3:30)
     session_minutes = 375
-    move_atr = atr * math.sqrt(holding_minutes / session_minutes)
-    
-    # Method 2: IV Based
-    # Move = Spot * IV * sqrt(days / 365)
-    # Convert holding mins to years? 
-    # holding_hours / (24*365)? Or trading hours?
-    # Standard: IV is annualized. T = minutes / (252 * 375) approx for trading time?
-    # Let's use simplified: T = holding_minutes / (365 * 1440) for calendar time decay logic 
-    # but for volatility usually we use trading days.
-    # Let's stick to user formula approximation if provided, or standard:
-    # User formula: Spot * IV * sqrt(holding_window / trading_days??) -> "trading_days" unit?
-    # Let's assume standard annualized IV projection for the specific window.
+    move_atr = atr * np.sqrt(minutes / session_minutes)
+
+    # Method 2: IV Based (annualized IV projected over the window)
     # T_years = holding_minutes / (365 * 24 * 60)
-    T_years = holding_minutes / 525600.0
-    move_iv = spot * iv * math.sqrt(T_years)
-    
+    T_years = minutes / 525600.0
+    move_iv = spot * iv * np.sqrt(T_years)
+
     # Conservative Estimate (Lower of two)
     # Sometimes IV implies much less than ATR in dull regimes.
-    expected_spot_move = min(move_atr, move_iv) if move_iv > 0 else move_atr
-    
+    expected_spot_move = np.where(move_iv > 0, np.minimum(move_atr, move_iv), move_atr)
+
     # 3. EXPECTED OPTION GAIN
     expected_option_gain = expected_spot_move * delta
-    
+
     # 4. TOTAL EXPECTED COST (Risk + Decay + Trans)
-    # User Formula: premium_paid + theta_cost + trans
-    # We interpreted "premium_paid" as "Risked Amount" (Stop Loss) for Buy trades.
-    # Let's assume 20% Stop Loss Risk on Premium.
-    
+    # "premium_paid" is the Risked Amount (20% Stop Loss on Premium) for Buy trades.
     risk_amount = premium * 0.20
-    
-    # Theta Cost for holding period
-    # Theta is usually daily decay.
-    # Cost = Theta * (minutes / minutes_in_day?) or minutes_in_session?
-    # Theta is per calendar day usually.
-    theta_cost = theta * (holding_minutes / (24 * 60)) # Fraction of day?
-    # Actually theta is often linear per day passing.
-    # Let's assume proportional decay.
-    theta_cost = theta * (holding_minutes / 1440.0)
-    if theta_cost < 0.1: theta_cost = 0.5 # Minimum decay floor
-    
+
+    # Theta is per calendar day; assume proportional decay.
+    theta_cost = theta * (minutes / 1440.0)
+    theta_cost = np.where(theta_cost < 0.1, 0.5, theta_cost) # Minimum decay floor
+
     trans_cost = 2.0 # Brokerage + Slippage est per lot unit
-    
+
     total_expected_cost = risk_amount + theta_cost + trans_cost
-    
+
     # 5. DECISION GATE
-    # Gain >= 1.2 * Cost
-    edge_ratio = expected_option_gain / total_expected_cost if total_expected_cost > 0 else 0
-    
-    # Adjust Buffer based on Regime
-    # If Range/Sideways, require higher edge
-    # Adjust Buffer based on Regime
-    # IF regime == RANGE (Sideways/Slow) -> 1.5
-    # ELSE -> 1.2
-    regime = market_metrics.get('regime', "SIDEWAYS")
-    required_edge = 1.2 # Default for Trending/Volatile
-    
-    if "SIDEWAYS" in regime or "SLOW" in regime:
-        required_edge = 1.5
-    
-    if edge_ratio >= required_edge:
-        return _allow(f"Positive Expectancy ({edge_ratio:.2f})", expected_spot_move, expected_option_gain, total_expected_cost, edge_ratio)
-    else:
-        reason = f"Low Edge ({edge_ratio:.2f}). ExpMove {expected_spot_move:.1f}pts < Cost."
-        return _block(reason, expected_spot_move, expected_option_gain, total_expected_cost, edge_ratio)
+    # Gain >= required_edge * Cost
+    safe_cost = np.where(total_expected_cost > 0, total_expected_cost, 1.0)
+    edge_ratio = np.where(total_expected_cost > 0, expected_option_gain / safe_cost, 0.0)
+
+    return {
+        "expected_spot_move": np.broadcast_to(expected_spot_move, shape),
+        "expected_option_gain": np.broadcast_to(expected_option_gain, shape),
+        "expected_cost": np.broadcast_to(total_expected_cost, shape),
+        "edge_ratio": edge_ratio,
+        "allowed": edge_ratio >= required_edge,
+        "required_edge": required_edge,
+        "data_missing": False
+    }
 
 def _allow(reason, em, og, cost, ratio):
     return {
@@ -0,0 +1,88 @@
+import time
+import threading
+import telemetry
+
+# ------------------------------------------------------------------------
+# COST CLASSES
+# ------------------------------------------------------------------------
+# Relative price of producing a gate input. A chain-wide PCR fetch is
+# dozens of quote batches plus the NFO instrument dump; a regime lookup is
+# one historical download; a journal read never leaves the machine.
+COST_LOCAL = "LOCAL"
+COST_QUOTE = "QUOTE"
+COST_HISTORICAL = "HISTORICAL"
+COST_CHAIN = "CHAIN"
+
+COST_WEIGHTS = {
+    COST_LOCAL: 1,
+    COST_QUOTE: 10,
+    COST_HISTORICAL: 40,
+    COST_CHAIN: 200
+}
+
+DEFAULT_VETO_RATE = 0.5 # Prior before a gate has any history
+VETO_RATE_DECAY = 0.1   # EWMA weight of the newest verdict
+MIN_VETO_RATE = 0.02    # Keeps never-vetoing gates orderable
+
+class Gate:
+    """
+    One blocking check in the scan.
+
+    check(ctx) returns None to pass or a WAIT result dict to stop.
+    needs maps the ScanContext keys the check reads to the cost class of
+    fetching them; keys already memoized in the context cost nothing.
+    It may also be a function of ctx, for checks whose fetches depend on
+    values already known (e.g. a check that can pass without fetching).
+    """
+    def __init__(self, name, check, needs=None):
+        self.name = name
+        self.check = check
+        self.needs = needs or {}
+
+    def cost(self, ctx):
+        needs = self.needs(ctx) if callable(self.needs) else self.needs
+        return COST_WEIGHTS[COST_LOCAL] + sum(
+            COST_WEIGHTS[cls] for key, cls in needs.items() if not ctx.has(key)
+        )
+
+class GateScheduler:
+    """
+    Orders gates by expected cost per rejection (cost / recent veto rate)
+    and stops at the first WAIT. Cheap, high-rejection gates run first;
+    the order is re-evaluated after every gate because a gate's fetches
+    make later gates that share those inputs free.
+    """
+    def __init__(self, gates):
+        self.gates = list(gates)
+        self.veto_rates = {g.name: DEFAULT_VETO_RATE for g in self.gates}
+        self.lock = threading.Lock()
+
+    def record(self, name, vetoed):
+        with self.lock:
+            rate = self.veto_rates.get(name, DEFAULT_VETO_RATE)
+            self.veto_rates[name] = rate + VETO_RATE_DECAY * ((1.0 if vetoed else 0.0) - rate)
+
+    def priority(self, gate, ctx):
+        rate = max(self.veto_rates.get(gate.name, DEFAULT_VETO_RATE), MIN_VETO_RATE)
+        return gate.cost(ctx) / rate
+
+    def run(self, ctx):
+        """
+        Runs every gate (cheapest-per-veto first) until one returns WAIT.
+        Per-gate timings land in ctx.timings as "gate:<name>" (ms).
+        """
+        pending = list(self.gates)
+        while pending:
+            gate = min(pending, key=lambda g: self.priority(g, ctx))
+            pending.remove(gate)
+
+            start = time.perf_counter()
+            with telemetry.span(f"gate:{gate.name}"):
+                verdict = gate.check(ctx)
+            ctx.timings[f"gate:{gate.name}"] = round((time.perf_counter() - start) * 1000, 2)
+
+            self.record(gate.name, verdict is not None)
+            if verdict is not None:
+                verdict.setdefault("gate", gate.name)
+                return verdict
+        return None
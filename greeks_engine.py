@@ -134,6 +134,118 @@ def calculate_time_to_expiry(expiry_date):
     total_years = (days + seconds / 86400.0) / 365.0
     return max(0, total_years)
 
+# ------------------------------------------------------------------------
+# VECTORIZED (ARRAY) VERSIONS - one call for a whole book / chain
+# ------------------------------------------------------------------------
+def _as_arrays(S, K, T, sigma, is_call):
+    S, K, T, sigma = np.broadcast_arrays(
+        np.asarray(S, dtype=float), np.asarray(K, dtype=float),
+        np.asarray(T, dtype=float), np.asarray(sigma, dtype=float)
+    )
+    is_call = np.broadcast_to(np.asarray(is_call, dtype=bool), S.shape)
+    return S, K, T, sigma, is_call
+
+def bs_price_vectorized(S, K, T, r, sigma, is_call):
+    """
+    Black-Scholes price for arrays of contracts (broadcastable inputs).
+    is_call: bool array (True = CE). Expired / invalid rows price at intrinsic.
+    """
+    S, K, T, sigma, is_call = _as_arrays(S, K, T, sigma, is_call)
+    valid = (S > 0) & (K > 0) & (T > 0) & (sigma > 0)
+
+    T_ = np.where(valid, np.maximum(T, 0.0001), 1.0)
+    sig = np.where(valid, np.maximum(sigma, 0.001), 1.0)
+    S_ = np.where(valid, S, 1.0)
+    K_ = np.where(valid, K, 1.0)
+
+    sqrt_t = np.sqrt(T_)
+    d1 = (np.log(S_ / K_) + (r + 0.5 * sig**2) * T_) / (sig * sqrt_t)
+    d2 = d1 - sig * sqrt_t
+    disc = K_ * np.exp(-r * T_)
+
+    call = S_ * norm.cdf(d1) - disc * norm.cdf(d2)
+    put = disc * norm.cdf(-d2) - S_ * norm.cdf(-d1)
+    price = np.where(is_call, call, put)
+
+    intrinsic = np.where(is_call, np.maximum(S - K, 0.0), np.maximum(K - S, 0.0))
+    return np.where(valid, price, intrinsic)
+
+def get_greeks_vectorized(S, K, T, r, sigma, is_call, rounded=True):
+    """
+    Array version of get_greeks. Returns dict of arrays
+    {delta, gamma, theta (daily), vega (per 1% IV)} with the same
+    rounding; rows with invalid inputs are all zero, like get_greeks.
+    rounded=False keeps full precision (for aggregating large books).
+    """
+    S, K, T, sigma, is_call = _as_arrays(S, K, T, sigma, is_call)
+    valid = (S > 0) & (K > 0) & (T > 0) & (sigma > 0)
+
+    T_ = np.where(valid, np.maximum(T, 0.0001), 1.0)
+    sig = np.where(valid, np.maximum(sigma, 0.001), 1.0)
+    S_ = np.where(valid, S, 1.0)
+    K_ = np.where(valid, K, 1.0)
+
+    sqrt_t = np.sqrt(T_)
+    d1 = (np.log(S_ / K_) + (r + 0.5 * sig**2) * T_) / (sig * sqrt_t)
+    d2 = d1 - sig * sqrt_t
+
+    pdf_d1 = norm.pdf(d1)
+    cdf_d1 = norm.cdf(d1)
+    cdf_d2 = norm.cdf(d2)
+    carry = r * K_ * np.exp(-r * T_)
+    decay = -(S_ * pdf_d1 * sig) / (2 * sqrt_t)
+
+    delta = np.where(is_call, cdf_d1, cdf_d1 - 1)
+    theta_annual = np.where(is_call, decay - carry * cdf_d2, decay + carry * (1 - cdf_d2))
+    gamma = pdf_d1 / (S_ * sig * sqrt_t)
+    vega = S_ * sqrt_t * pdf_d1 * 0.01
+
+    theta = theta_annual / 365.0
+    if rounded:
+        delta, gamma, theta, vega = np.round(delta, 3), np.round(gamma, 5), np.round(theta, 2), np.round(vega, 2)
+
+    zero = np.zeros_like(S)
+    return {
+        "delta": np.where(valid, delta, zero),
+        "gamma": np.where(valid, gamma, zero),
+        "theta": np.where(valid, theta, zero),
+        "vega": np.where(valid, vega, zero)
+    }
+
+def get_implied_volatility_vectorized(market_price, S, K, T, r, is_call, tol=0.001, max_iter=100):
+    """
+    Newton-Raphson IV for arrays of contracts, all solved together.
+    Returns IV in percent like get_implied_volatility (0 for invalid rows).
+    """
+    market_price = np.asarray(market_price, dtype=float)
+    S, K, T, market_price, is_call = _as_arrays(S, K, T, market_price, is_call)
+    valid = (market_price > 0) & (S > 0) & (K > 0) & (T > 0)
+
+    sigma = np.full(S.shape, 0.3) # Initial guess (30%)
+    active = valid.copy()
+
+    for i in range(max_iter):
+        if not active.any():
+            break
+        sig = np.maximum(sigma, 0.001)
+        T_ = np.where(valid, np.maximum(T, 0.0001), 1.0)
+        S_ = np.where(valid, S, 1.0)
+        K_ = np.where(valid, K, 1.0)
+
+        theo = bs_price_vectorized(S_, K_, T_, r, sig, is_call)
+        diff = theo - market_price
+
+        d1 = (np.log(S_ / K_) + (r + 0.5 * sig**2) * T_) / (sig * np.sqrt(T_))
+        vega = S_ * np.sqrt(T_) * norm.pdf(d1)
+
+        converged = np.abs(diff) < tol
+        stuck = vega == 0
+        step = np.where(active & ~converged & ~stuck, diff / np.where(stuck, 1.0, vega), 0.0)
+        sigma = sigma - step
+        active = active & ~converged & ~stuck
+
+    return np.where(valid, np.round(sigma * 100, 2), 0.0)
+
 if __name__ == "__main__":
     # Test
     S = 21500
@@ -0,0 +1,179 @@
+import os
+import csv
+import sqlite3
+import datetime
+import threading
+
+# ------------------------------------------------------------------------
+# EMBEDDED TRADE JOURNAL
+# ------------------------------------------------------------------------
+# Trades live in one SQLite file, indexed on date, timestamp, symbol,
+# regime and strategy. "Today's trades" is an index range on date and
+# "last N PnLs" walks the rowid backwards, so neither read depends on how
+# many years of history the journal holds. The old trade_journal.csv is
+# imported once on first open and left on disk untouched.
+
+JOURNAL_DB = "trade_journal.db"
+LEGACY_CSV = "trade_journal.csv"
+
+# CSV header name -> column (readers that expect the CSV layout get these names back)
+COLUMNS = [
+    ("Timestamp", "ts"), ("Symbol", "symbol"), ("Strike", "strike"), ("ExpiryType", "expiry_type"),
+    ("Entry", "entry"), ("Exit", "exit"), ("PnL", "pnl"), ("EntryReason", "entry_reason"),
+    ("ExitReason", "exit_reason"), ("Regime", "regime"), ("Strategy", "strategy"), ("DTE", "dte"),
+    ("Confidence", "confidence")
+]
+NUMERIC = ("entry", "exit", "pnl")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts TEXT NOT NULL,
+    date TEXT NOT NULL,
+    symbol TEXT, strike TEXT, expiry_type TEXT,
+    entry REAL, exit REAL, pnl REAL,
+    entry_reason TEXT, exit_reason TEXT,
+    regime TEXT, strategy TEXT, dte TEXT, confidence TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_trades_date ON trades(date);
+CREATE INDEX IF NOT EXISTS idx_trades_ts ON trades(ts);
+CREATE INDEX IF NOT EXISTS idx_trades_symbol ON trades(symbol);
+CREATE INDEX IF NOT EXISTS idx_trades_regime ON trades(regime);
+CREATE INDEX IF NOT EXISTS idx_trades_strategy ON trades(strategy);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+def _num(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+class JournalStore:
+    def __init__(self, path=JOURNAL_DB, legacy_csv=LEGACY_CSV):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+        self.migrate_csv(legacy_csv)
+
+    # --------------------------------------------------------------------
+    # WRITE
+    # --------------------------------------------------------------------
+    def add(self, trade):
+        """
+        Appends one trade. trade: dict keyed by CSV header names
+        (Timestamp defaults to now). Returns the row id.
+        """
+        row = self._row(trade)
+        with self.lock, self.conn:
+            cur = self._insert(row)
+        return cur.lastrowid
+
+    def migrate_csv(self, csv_path=LEGACY_CSV):
+        """
+        One-time import of the legacy CSV journal. Returns rows imported.
+        """
+        if not csv_path or not os.path.exists(csv_path):
+            return 0
+        with self.lock:
+            done = self.conn.execute("SELECT value FROM meta WHERE key = 'csv_migrated'").fetchone()
+            if done:
+                return 0
+            try:
+                with open(csv_path, "r", newline="") as f:
+                    rows = [self._row(r) for r in csv.DictReader(f) if r.get("Timestamp")]
+            except Exception as e:
+                print(f"[Journal] CSV migration failed: {e}")
+                return 0
+            with self.conn:
+                for row in rows:
+                    self._insert(row)
+                self.conn.execute("INSERT INTO meta (key, value) VALUES ('csv_migrated', ?)",
+                                  (datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),))
+        print(f"[Journal] Migrated {len(rows)} trades from {csv_path} to {self.path}")
+        return len(rows)
+
+    # --------------------------------------------------------------------
+    # READ
+    # --------------------------------------------------------------------
+    def trades_on(self, date=None):
+        """
+        Trades of one day (default today), oldest first.
+        """
+        date = date or datetime.date.today().isoformat()
+        return self._query("SELECT * FROM trades WHERE date = ? ORDER BY id", (date,))
+
+    def count_on(self, date=None):
+        date = date or datetime.date.today().isoformat()
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM trades WHERE date = ?", (date,)).fetchone()[0]
+
+    def last_pnls(self, n, date=None):
+        """
+        PnL of the last n trades (optionally of one day), most recent first.
+        """
+        if date:
+            rows = self._query("SELECT pnl FROM trades WHERE date = ? ORDER BY id DESC LIMIT ?", (date, n))
+        else:
+            rows = self._query("SELECT pnl FROM trades ORDER BY id DESC LIMIT ?", (n,))
+        return [r["pnl"] for r in rows]
+
+    def trades_since(self, after_id=0):
+        """
+        Trades with id > after_id, oldest first (for incremental consumers).
+        """
+        return self._query("SELECT * FROM trades WHERE id > ? ORDER BY id", (after_id,))
+
+    def all_trades(self):
+        return self.trades_since(0)
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
+
+    def export_csv(self, csv_path):
+        """
+        Writes the whole journal in the legacy CSV layout (for spreadsheets).
+        """
+        rows = self.all_trades()
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow([h for h, _ in COLUMNS])
+            for r in rows:
+                writer.writerow([r[c] for _, c in COLUMNS])
+        return len(rows)
+
+    # --------------------------------------------------------------------
+    # INTERNALS
+    # --------------------------------------------------------------------
+    def _row(self, trade):
+        row = {col: trade.get(header) for header, col in COLUMNS}
+        row["ts"] = row["ts"] or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        row["date"] = str(row["ts"])[:10]
+        for col in NUMERIC:
+            row[col] = _num(row[col])
+        return row
+
+    def _insert(self, row):
+        cols = ["ts", "date"] + [c for _, c in COLUMNS if c != "ts"]
+        return self.conn.execute(f"INSERT INTO trades ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                                 [row[c] for c in cols])
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return [dict(r) for r in self.conn.execute(sql, params).fetchall()]
+
+# Process-wide store (opened lazily so importing never touches disk)
+_store = None
+_store_lock = threading.Lock()
+
+def get_journal_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = JournalStore()
+        return _store
@@ -1,6 +1,9 @@
 from kiteconnect import KiteConnect
 import config
 import logging
+import telemetry
+from rate_limiter import kite_limiter, endpoint_of, HISTORICAL, PRIORITY_ANALYTICS
+import threading
 
 # Logger
 logging.basicConfig(level=logging.INFO)
@@ -12,12 +15,26 @@ def get_kite():
     global _kite
     if _kite is None:
         try:
-            _kite = KiteConnect(api_key=config.API_KEY)
-            _kite.set_access_token(config.ACCESS_TOKEN)
+            kite = KiteConnect(api_key=config.API_KEY, root=getattr(config, "KITE_ROOT", None)) # None = api.kite.trade
+            kite.set_access_token(config.ACCESS_TOKEN)
+            _kite = telemetry.instrument(kite) # REST latency per endpoint when telemetry is on
         except Exception as e:
             logger.error(f"Error initializing Kite: {e}")
     return _kite
 
+def set_kite(kite):
+    """
+    Replaces the process-wide Kite client (e.g. offline_kite.OfflineKite)
+    and drops the instrument caches loaded from the previous one.
+    """
+    global _kite, OPTION_TOKENS
+    _kite = telemetry.instrument(kite)
+    with _TOKENS_LOCK:
+        OPTION_TOKENS = {}
+        LOT_SIZE_CACHE.clear()
+        INSTRUMENT_DETAILS.clear()
+    return _kite
+
 # --- 1. INDEX TOKENS (FIX SPOT PRICE SOURCE) ---
 INDEX_TOKENS = {
     "NIFTY": 256265,
@@ -25,6 +42,13 @@ INDEX_TOKENS = {
     "FINNIFTY": 257801
 }
 
+# Quote-API names of the index spots (kite.quote takes EXCHANGE:NAME)
+INDEX_QUOTE_SYMBOLS = {
+    "NIFTY": "NSE:NIFTY 50",
+    "BANKNIFTY": "NSE:NIFTY BANK",
+    "FINNIFTY": "NSE:NIFTY FIN SERVICE"
+}
+
 # --- 2. ADD OPTION TOKEN LOOKUP (MANDATORY) ---
 OPTION_TOKENS = {}
 # Global cache for lot sizes (Underlying -> Lot Size)
@@ -32,13 +56,22 @@ LOT_SIZE_CACHE = {}
 # Global cache for Instrument Details (Symbol -> {expiry, strike, lot_size})
 INSTRUMENT_DETAILS = {}
 
+def _call(kite, method, *args):
+    """
+    Calls kite.<method> behind an analytics-priority kite_limiter token,
+    unless kite already takes its own (scan_context.ScanKite).
+    """
+    if not getattr(kite, "rate_limited", False):
+        kite_limiter.acquire(endpoint_of(method), PRIORITY_ANALYTICS)
+    return getattr(kite, method)(*args)
+
 def load_option_tokens(kite):
     global LOT_SIZE_CACHE, INSTRUMENT_DETAILS
     tokens = {}
     print("[*] Loading Option Tokens & Lot Sizes... (This may take a moment)")
     try:
         # Fetch detailed instrument list for NFO
-        instruments = kite.instruments("NFO")
+        instruments = _call(kite, "instruments", "NFO")
         for inst in instruments:
             ts = inst["tradingsymbol"]
             tokens[ts] = inst["instrument_token"]
@@ -67,10 +100,22 @@ def get_instrument_detail(symbol):
 def get_cached_lot_size(name):
      return LOT_SIZE_CACHE.get(name, None)
 
+_TOKENS_LOCK = threading.Lock() # Parallel candidate scans must not load the dump N times
+
+def bare_symbol(symbol):
+    """
+    "NFO:NIFTY24JAN21500CE" -> "NIFTY24JAN21500CE" (the tradingsymbol order and
+    margin APIs expect, and the key of OPTION_TOKENS).
+    """
+    return str(symbol).split(":", 1)[-1]
+
 def ensure_tokens_loaded(kite):
     global OPTION_TOKENS
-    if not OPTION_TOKENS:
-        OPTION_TOKENS = load_option_tokens(kite)
+    if OPTION_TOKENS:
+        return
+    with _TOKENS_LOCK:
+        if not OPTION_TOKENS:
+            OPTION_TOKENS = load_option_tokens(kite)
 
 # --- 3. FIX LTP FETCHING (STRICT - NO FALLBACKS) ---
 def get_ltp(symbol, kite):
@@ -79,7 +124,7 @@ def get_ltp(symbol, kite):
     if symbol in INDEX_TOKENS:
         try:
             token = INDEX_TOKENS[symbol]
-            data = kite.ltp(token)
+            data = _call(kite, "ltp", token)
             return data[str(token)]["last_price"]
         except Exception as e:
             print(f"Error fetching Index Spot {symbol}: {e}")
@@ -106,7 +151,7 @@ def get_ltp(symbol, kite):
     
     try:
         # 1. STRICT FETCH
-        data = kite.ltp(symbol)
+        data = _call(kite, "ltp", symbol)
         
         if symbol not in data:
             return None
@@ -138,7 +183,7 @@ def get_real_option_data(symbol, kite):
         full_symbol = symbol
         
     try:
-        q = kite.quote(full_symbol)
+        q = _call(kite, "quote", full_symbol)
         if full_symbol not in q:
             return None
             
@@ -153,6 +198,29 @@ def get_real_option_data(symbol, kite):
         print(f"Error fetching real option data for {symbol}: {e}")
         return None
 
+# --- 5. BATCH QUOTE SNAPSHOT ---
+QUOTE_BATCH_SIZE = 500 # Kite quote API limit per request
+
+def get_quote_snapshot(kite, symbols):
+    """
+    Quotes many instruments in as few requests as possible.
+    symbols: iterable of "EXCHANGE:TRADINGSYMBOL" (bare names get "NFO:").
+    Returns {full_symbol: quote_dict}; failed batches are simply missing.
+    """
+    full = []
+    for sym in symbols:
+        if ":" not in sym: sym = "NFO:" + sym
+        if sym not in full: full.append(sym)
+        
+    snapshot = {}
+    for i in range(0, len(full), QUOTE_BATCH_SIZE):
+        batch = full[i:i+QUOTE_BATCH_SIZE]
+        try:
+            snapshot.update(_call(kite, "quote", batch))
+        except Exception as e:
+            print(f"Error fetching quote snapshot ({len(batch)} symbols): {e}")
+    return snapshot
+
 # Indices Token Map (For Historical Data wrapper if needed later)
 TOKEN_MAP = INDEX_TOKENS.copy()
 TOKEN_MAP.update({
@@ -187,6 +255,8 @@ def get_historical_data(symbol, interval="5m", days=30):
         elif interval == "1H": z_interval = "60minute"
         elif interval == "1d": z_interval = "day"
         
+        # Regime / selector downloads share the historical bucket behind orders
+        kite_limiter.acquire(HISTORICAL, PRIORITY_ANALYTICS)
         candles = kite.historical_data(token, from_date, to_date, z_interval)
         return candles
         
@@ -206,7 +276,7 @@ def fetch_option_chain(kite, underlying):
     # Kite instruments usually have 'name' as 'NIFTY', 'BANKNIFTY', 'RELIANCE', etc.
     print(f"[*] Fetching Option Chain for {underlying}...")
     try:
-        instruments = kite.instruments("NFO")
+        instruments = _call(kite, "instruments", "NFO")
         chain = []
         for inst in instruments:
             if inst["name"] == underlying and inst["segment"] == "NFO-OPT":
@@ -225,7 +295,7 @@ def get_iv_value(kite, symbol):
     """
     if not symbol.startswith("NFO:"): symbol = "NFO:" + symbol
     try:
-        q = kite.quote(symbol)
+        q = _call(kite, "quote", symbol)
         data = q.get(symbol, {})
         iv = data.get("iv", None)
         
@@ -258,7 +328,7 @@ def get_iv_value(kite, symbol):
              # Ideally get_iv_value should be efficient.
              # Let's assume we can fetch it.
              try:
-                 qs = kite.ltp(idx_token)
+                 qs = _call(kite, "ltp", idx_token)
                  S = qs[str(idx_token)]['last_price']
              except: return 0
         else:
@@ -287,7 +357,7 @@ def valid_liquidity(kite, symbol):
     """
     if not symbol.startswith("NFO:"): symbol = "NFO:" + symbol
     try:
-        q = kite.quote(symbol)
+        q = _call(kite, "quote", symbol)
         data = q.get(symbol, {})
 
         volume = data.get("volume", 0)
@@ -315,7 +385,7 @@ def get_quote_spread(symbol, kite):
     """
     if not symbol.startswith("NFO:"): symbol = "NFO:" + symbol
     try:
-        q = kite.quote(symbol)
+        q = _call(kite, "quote", symbol)
         if symbol not in q: return None
         
         d = q[symbol]['depth']
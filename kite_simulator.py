@@ -0,0 +1,555 @@
+import re
+import sys
+import json
+import time
+import base64
+import struct
+import random
+import socket
+import hashlib
+import argparse
+import datetime
+import threading
+import socketserver
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import offline_kite
+from rate_limiter import endpoint_of, QUOTE, HISTORICAL, ORDERS, OTHERS
+
+# ------------------------------------------------------------------------
+# LOCAL KITE SIMULATOR
+# ------------------------------------------------------------------------
+# Serves the Kite Connect REST endpoints the bot uses and a KiteTicker
+# websocket (binary tick packets, JSON subscribe/mode messages, order
+# postbacks) from an offline_kite.OfflineKite, using only the stdlib.
+# The unmodified kiteconnect client talks to it through the config:
+#
+#   KITE_ROOT = "http://127.0.0.1:8765"        (kite_data, ZerodhaAdapter)
+#   KITE_TICKER_ROOT = "ws://127.0.0.1:8766"   (stream_engine)
+#
+# Faults are injected per REST request: fixed latency plus jitter, a
+# random error rate (Kite's error envelopes, so the client raises the
+# usual kiteconnect exceptions) and, optionally, the exchange rate caps
+# answered with 429. The tick feed can advance the price path on every
+# tick and drop connections to exercise reconnects.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_WS_PORT = 8766
+TICK_INTERVAL = 1.0     # seconds between tick broadcasts (Kite: ~1/s)
+
+# Requests per second Kite accepts per endpoint class (enforce_limits)
+KITE_CAPS = {QUOTE: 1, HISTORICAL: 3, ORDERS: 10, OTHERS: 10}
+
+# (HTTP status, kiteconnect exception name, message) drawn for injected errors
+INJECTED_ERRORS = [
+    (429, "NetworkException", "Too many requests"),
+    (500, "GeneralException", "Something went wrong"),
+    (503, "NetworkException", "Service unavailable"),
+    (504, "NetworkException", "Gateway timed out")
+]
+
+# (method, path pattern, handler name)
+ROUTES = [
+    ("GET", r"/instruments/historical/(?P<token>\d+)/(?P<interval>\w+)", "historical_data"),
+    ("GET", r"/instruments(?:/(?P<exchange>\w+))?", "instruments"),
+    ("GET", r"/quote/ltp", "ltp"),
+    ("GET", r"/quote/ohlc", "ohlc"),
+    ("GET", r"/quote", "quote"),
+    ("GET", r"/orders/(?P<order_id>\d+)", "order_history"),
+    ("GET", r"/orders", "orders"),
+    ("POST", r"/orders/(?P<variety>\w+)", "place_order"),
+    ("GET", r"/trades", "trades"),
+    ("GET", r"/portfolio/positions", "positions"),
+    ("GET", r"/user/margins(?:/(?P<segment>\w+))?", "margins"),
+    ("GET", r"/user/profile", "profile"),
+    ("POST", r"/margins/basket", "basket_order_margins"),
+    ("POST", r"/session/token", "generate_session")
+]
+ROUTES = [(method, re.compile(pattern + "$"), name) for method, pattern, name in ROUTES]
+
+def _json_default(value):
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S") # kiteconnect parses 19-char timestamps
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return str(value)
+
+class FaultInjector:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, enforce_limits=False, seed=7):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.enforce_limits = enforce_limits
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.windows = {name: deque() for name in KITE_CAPS} # endpoint class -> request times (last second)
+        self.injected = Counter()
+        self.throttled = Counter()
+
+    def delay(self):
+        with self.lock:
+            seconds = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def fault(self, method):
+        """
+        (status, error_type, message) if this request should fail, else None.
+        """
+        endpoint = endpoint_of(method)
+        with self.lock:
+            if self.enforce_limits:
+                now = time.monotonic()
+                window = self.windows[endpoint]
+                while window and now - window[0] >= 1.0:
+                    window.popleft()
+                if len(window) >= KITE_CAPS[endpoint]:
+                    self.throttled[endpoint] += 1
+                    return 429, "NetworkException", "Too many requests"
+                window.append(now)
+            if self.error_rate and self.rng.random() < self.error_rate:
+                error = self.rng.choice(INJECTED_ERRORS)
+                self.injected[method] += 1
+                return error
+        return None
+
+# ------------------------------------------------------------------------
+# REST
+# ------------------------------------------------------------------------
+class RestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, as the kiteconnect session expects
+    server_version = "KiteSimulator"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method):
+        sim = self.server.sim
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        for route_method, pattern, name in ROUTES:
+            match = pattern.match(url.path)
+            if match and route_method == method:
+                break
+        else:
+            return self._error(404, "GeneralException", f"Route not found: {method} {url.path}")
+
+        sim.count(name)
+        sim.faults.delay()
+        fault = sim.faults.fault(name)
+        if fault:
+            return self._error(*fault)
+        try:
+            data = getattr(self, "_" + name)(sim, match.groupdict(), query, body)
+        except (ValueError, KeyError, TypeError) as e:
+            return self._error(400, "InputException", str(e))
+        if isinstance(data, str):
+            return self._send(200, "text/csv", data.encode())
+        self._send(200, "application/json", json.dumps({"status": "success", "data": data}, default=_json_default).encode())
+
+    def _send(self, status, content_type, payload):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status, error_type, message):
+        payload = json.dumps({"status": "error", "error_type": error_type, "message": message, "data": None})
+        self._send(status, "application/json", payload.encode())
+
+    # --------------------------------------------------------------------
+    # ENDPOINTS (args, query, body) -> data (str = CSV)
+    # --------------------------------------------------------------------
+    def _instruments(self, sim, args, query, body):
+        fields = ["instrument_token", "exchange_token", "tradingsymbol", "name", "last_price", "expiry", "strike",
+                  "tick_size", "lot_size", "instrument_type", "segment", "exchange"]
+        rows = [",".join(fields)]
+        for inst in sim.kite.instruments(args.get("exchange")):
+            rows.append(",".join(str(_json_default(inst[f]) if f == "expiry" else inst[f]) for f in fields))
+        return "\n".join(rows) + "\n"
+
+    def _quote(self, sim, args, query, body):
+        return sim.kite.quote(query.get("i", []))
+
+    def _ltp(self, sim, args, query, body):
+        return sim.kite.ltp(query.get("i", []))
+
+    def _ohlc(self, sim, args, query, body):
+        return sim.kite.ohlc(query.get("i", []))
+
+    def _historical_data(self, sim, args, query, body):
+        parse = lambda v: datetime.datetime.strptime(v[:19], "%Y-%m-%d %H:%M:%S") if len(v) > 10 else \
+            datetime.datetime.strptime(v, "%Y-%m-%d")
+        candles = sim.kite.historical_data(int(args["token"]), parse(query["from"][0]), parse(query["to"][0]),
+                                           args["interval"])
+        return {"candles": [[c["date"].strftime("%Y-%m-%dT%H:%M:%S+0530"), c["open"], c["high"], c["low"],
+                             c["close"], c["volume"]] for c in candles]}
+
+    def _orders(self, sim, args, query, body):
+        return sim.kite.orders()
+
+    def _order_history(self, sim, args, query, body):
+        return sim.kite.order_history(args["order_id"])
+
+    def _trades(self, sim, args, query, body):
+        return sim.kite.trades()
+
+    def _place_order(self, sim, args, query, body):
+        form = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+        order_id = sim.kite.place_order(
+            variety=args["variety"], exchange=form["exchange"], tradingsymbol=form["tradingsymbol"],
+            transaction_type=form["transaction_type"], quantity=int(form["quantity"]), product=form["product"],
+            order_type=form["order_type"], price=float(form["price"]) if form.get("price") else None,
+            validity=form.get("validity"), tag=form.get("tag"))
+        sim.publish_order(order_id)
+        return {"order_id": order_id}
+
+    def _positions(self, sim, args, query, body):
+        return sim.kite.positions()
+
+    def _margins(self, sim, args, query, body):
+        return sim.kite.margins(args.get("segment"))
+
+    def _profile(self, sim, args, query, body):
+        return sim.kite.profile()
+
+    def _basket_order_margins(self, sim, args, query, body):
+        return sim.kite.basket_order_margins(json.loads(body or b"[]"))
+
+    def _generate_session(self, sim, args, query, body):
+        return dict(sim.kite.generate_session(None), api_key="offline", public_token="offline")
+
+# ------------------------------------------------------------------------
+# TICKER (RFC 6455 over a plain TCP server)
+# ------------------------------------------------------------------------
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x1, 0x2, 0x8, 0x9, 0xA
+INDEX_SEGMENT = 9
+
+def ws_frame(opcode, payload):
+    header = bytes([0x80 | opcode])
+    n = len(payload)
+    if n < 126:
+        header += bytes([n])
+    elif n < 1 << 16:
+        header += bytes([126]) + struct.pack(">H", n)
+    else:
+        header += bytes([127]) + struct.pack(">Q", n)
+    return header + payload
+
+def _paise(price):
+    return max(int(round(price * 100)), 0)
+
+def tick_packet(token, quote, mode):
+    """
+    One KiteTicker binary packet (layouts as parsed by KiteTicker._parse_binary).
+    """
+    ltp = _paise(quote["last_price"])
+    if mode == "ltp":
+        return struct.pack(">II", token, ltp)
+    ohlc = quote["ohlc"]
+    stamp = int(quote["timestamp"].timestamp())
+    if token & 0xff == INDEX_SEGMENT:
+        packet = struct.pack(">7I", token, ltp, _paise(ohlc["high"]), _paise(ohlc["low"]), _paise(ohlc["open"]),
+                             _paise(ohlc["close"]), 0)
+        return packet + struct.pack(">I", stamp) if mode == "full" else packet
+    packet = struct.pack(">11I", token, ltp, quote["last_quantity"], _paise(quote["average_price"]), quote["volume"],
+                         quote["buy_quantity"], quote["sell_quantity"], _paise(ohlc["open"]), _paise(ohlc["high"]),
+                         _paise(ohlc["low"]), _paise(ohlc["close"]))
+    if mode != "full":
+        return packet
+    packet += struct.pack(">5I", stamp, quote["oi"], quote["oi_day_high"], quote["oi_day_low"], stamp)
+    for side in ("buy", "sell"):
+        for level in quote["depth"][side][:5]:
+            packet += struct.pack(">IIHxx", level["quantity"], _paise(level["price"]), level["orders"])
+    return packet
+
+class TickerClient:
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.modes = {} # token -> ltp / quote / full
+        self.send_lock = threading.Lock()
+        self.open = True
+
+    def send(self, opcode, payload):
+        with self.send_lock:
+            try:
+                self.sock.sendall(ws_frame(opcode, payload))
+                return True
+            except OSError:
+                self.open = False
+                return False
+
+    def close(self):
+        self.open = False
+        try:
+            self.send(OP_CLOSE, struct.pack(">H", 1000))
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+class TickerHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        sim = self.server.sim
+        rfile = self.request.makefile("rb")
+        if not self._handshake(rfile):
+            return
+        client = TickerClient(self.request, self.client_address)
+        sim.add_client(client)
+        try:
+            while client.open:
+                frame = self._read_frame(rfile)
+                if frame is None:
+                    break
+                opcode, payload = frame
+                if opcode == OP_CLOSE:
+                    client.send(OP_CLOSE, payload[:2])
+                    break
+                if opcode == OP_PING:
+                    client.send(OP_PONG, payload)
+                elif opcode == OP_TEXT:
+                    sim.on_ticker_message(client, payload)
+        finally:
+            client.open = False
+            sim.remove_client(client)
+
+    def _handshake(self, rfile):
+        request = rfile.readline().decode("latin-1")
+        headers = {}
+        while True:
+            line = rfile.readline().decode("latin-1").strip()
+            if not line:
+                break
+            key, _, value = line.partition(":")
+            headers[key.strip().lower()] = value.strip()
+        key = headers.get("sec-websocket-key")
+        if not request.startswith("GET") or not key:
+            self.request.sendall(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            return False
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        self.request.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                              f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        return True
+
+    def _read_frame(self, rfile):
+        """
+        (opcode, payload) of the next frame (fragments joined), None on EOF.
+        """
+        message, opcode = b"", None
+        while True:
+            head = rfile.read(2)
+            if len(head) < 2:
+                return None
+            fin, op = head[0] & 0x80, head[0] & 0x0F
+            masked, n = head[1] & 0x80, head[1] & 0x7F
+            if n == 126:
+                n = struct.unpack(">H", rfile.read(2))[0]
+            elif n == 127:
+                n = struct.unpack(">Q", rfile.read(8))[0]
+            mask = rfile.read(4) if masked else b""
+            payload = rfile.read(n)
+            if masked:
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+            if op >= OP_CLOSE:
+                return op, payload # control frames are never fragmented
+            opcode = opcode or op
+            message += payload
+            if fin:
+                return opcode, message
+
+class _TickerServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+# ------------------------------------------------------------------------
+# SIMULATOR
+# ------------------------------------------------------------------------
+class KiteSimulator:
+    def __init__(self, kite=None, host=DEFAULT_HOST, port=DEFAULT_PORT, ws_port=DEFAULT_WS_PORT, latency=0.0,
+                 jitter=0.0, error_rate=0.0, enforce_limits=False, tick_interval=TICK_INTERVAL, replay_speed=0,
+                 ws_drop_rate=0.0, seed=7):
+        """
+        kite: the OfflineKite to serve (a fresh one by default).
+        port / ws_port: 0 picks a free port (see root / ws_root after start()).
+        replay_speed: path minutes advanced per tick broadcast (0 = frozen prices).
+        ws_drop_rate: chance per broadcast that a ticker connection is dropped.
+        """
+        self.kite = kite or offline_kite.OfflineKite(seed=seed, replay=bool(replay_speed))
+        self.host = host
+        self.port = port
+        self.ws_port = ws_port
+        self.faults = FaultInjector(latency, jitter, error_rate, enforce_limits, seed)
+        self.tick_interval = tick_interval
+        self.replay_speed = replay_speed
+        self.ws_drop_rate = ws_drop_rate
+        self.rng = random.Random(seed)
+        self.requests = Counter()
+        self.clients = []
+        self.lock = threading.Lock()
+        self.ticks_sent = 0
+        self.drops = 0
+        self._stop = threading.Event()
+        self._threads = []
+
+    @property
+    def root(self):
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def ws_root(self):
+        return f"ws://{self.host}:{self.ws_port}"
+
+    def start(self):
+        self.rest = ThreadingHTTPServer((self.host, self.port), RestHandler)
+        self.rest.daemon_threads = True
+        self.rest.sim = self
+        self.port = self.rest.server_address[1]
+        self.ticker = _TickerServer((self.host, self.ws_port), TickerHandler)
+        self.ticker.sim = self
+        self.ws_port = self.ticker.server_address[1]
+        for name, target in (("KiteSimREST", self.rest.serve_forever), ("KiteSimTicker", self.ticker.serve_forever),
+                             ("KiteSimFeed", self._broadcast)):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for client in list(self.clients):
+            client.close()
+        self.rest.shutdown()
+        self.ticker.shutdown()
+        self.rest.server_close()
+        self.ticker.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def count(self, route):
+        with self.lock:
+            self.requests[route] += 1
+
+    def stats(self):
+        with self.lock:
+            return {"requests": dict(self.requests), "injected_errors": dict(self.faults.injected),
+                    "throttled": dict(self.faults.throttled), "ticker_clients": len(self.clients),
+                    "ticks_sent": self.ticks_sent, "ticker_drops": self.drops, "now": self.kite.now()}
+
+    # --------------------------------------------------------------------
+    # TICK FEED
+    # --------------------------------------------------------------------
+    def add_client(self, client):
+        with self.lock:
+            self.clients.append(client)
+
+    def remove_client(self, client):
+        with self.lock:
+            if client in self.clients:
+                self.clients.remove(client)
+
+    def on_ticker_message(self, client, payload):
+        try:
+            message = json.loads(payload)
+            action, value = message.get("a"), message.get("v")
+        except (ValueError, AttributeError):
+            return
+        with self.lock:
+            if action == "subscribe":
+                for token in value:
+                    client.modes.setdefault(int(token), "quote") # Kite's default mode
+            elif action == "unsubscribe":
+                for token in value:
+                    client.modes.pop(int(token), None)
+            elif action == "mode" and len(value) == 2:
+                mode, tokens = value
+                for token in tokens:
+                    client.modes[int(token)] = mode
+
+    def publish_order(self, order_id):
+        """
+        Order postback to every ticker connection (KiteTicker on_order_update).
+        """
+        with self.kite.lock:
+            order = next((dict(o) for o in self.kite.order_list if o["order_id"] == order_id), None)
+        if order is None:
+            return
+        payload = json.dumps({"type": "order", "data": order}, default=_json_default).encode()
+        for client in list(self.clients):
+            client.send(OP_TEXT, payload)
+
+    def _broadcast(self):
+        while not self._stop.wait(self.tick_interval):
+            if self.replay_speed:
+                self.kite.advance(self.replay_speed)
+            with self.lock:
+                clients = [(c, dict(c.modes)) for c in self.clients if c.open]
+            quotes = {}
+            for client, modes in clients:
+                if self.ws_drop_rate and self.rng.random() < self.ws_drop_rate:
+                    self.drops += 1
+                    client.close()
+                    continue
+                packets = []
+                for token, mode in modes.items():
+                    if token not in quotes:
+                        quotes[token] = self.kite.quote_by_token(token)
+                    if quotes[token]:
+                        packets.append(tick_packet(token, quotes[token], mode))
+                if not packets:
+                    client.send(OP_BINARY, b"\x00") # heartbeat
+                    continue
+                message = struct.pack(">H", len(packets)) + b"".join(struct.pack(">H", len(p)) + p for p in packets)
+                if client.send(OP_BINARY, message):
+                    self.ticks_sent += len(packets)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local Kite Connect REST + ticker simulator")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--ws-port", type=int, default=DEFAULT_WS_PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every REST request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra uniform 0..jitter seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of REST requests failed")
+    parser.add_argument("--enforce-limits", action="store_true", help="answer 429 above Kite's per-endpoint caps")
+    parser.add_argument("--tick-interval", type=float, default=TICK_INTERVAL)
+    parser.add_argument("--replay-speed", type=int, default=0, help="path minutes per tick (0 = frozen)")
+    parser.add_argument("--ws-drop-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    sim = KiteSimulator(host=args.host, port=args.port, ws_port=args.ws_port, latency=args.latency,
+                        jitter=args.jitter, error_rate=args.error_rate, enforce_limits=args.enforce_limits,
+                        tick_interval=args.tick_interval, replay_speed=args.replay_speed,
+                        ws_drop_rate=args.ws_drop_rate, seed=args.seed).start()
+    print(f"[*] Kite simulator: REST {sim.root} | ticker {sim.ws_root} | {len(sim.kite.nfo)} NFO instruments")
+    print(f'    config.py: KITE_ROOT = "{sim.root}"  KITE_TICKER_ROOT = "{sim.ws_root}"')
+    try:
+        while True:
+            time.sleep(60)
+            s = sim.stats()
+            print(f"[*] {sum(s['requests'].values())} requests | {s['ticker_clients']} ticker clients | "
+                  f"{s['ticks_sent']} ticks | errors {sum(s['injected_errors'].values())} | "
+                  f"throttled {sum(s['throttled'].values())} | now {s['now']:%Y-%m-%d %H:%M}")
+    except KeyboardInterrupt:
+        sim.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
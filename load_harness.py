@@ -0,0 +1,284 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+import contextlib
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# ------------------------------------------------------------------------
+# CONCURRENT SCAN LOAD HARNESS
+# ------------------------------------------------------------------------
+# Runs batches of concurrent suggest_trade(capital, margin) scans over
+# several capital/margin profiles, mixed with get_advice_report calls,
+# at increasing concurrency levels. It reports per-level latency
+# percentiles, throughput and Kite API calls per scan, and names the
+# level where throughput stops growing.
+#
+#   python load_harness.py --concurrency 1 2 4 8 16 --scans 40
+#   python load_harness.py --backend simulator --latency 0.05 --error-rate 0.01
+#
+# The data source is offline_kite.OfflineKite, called in-process
+# ("offline") or over HTTP through kite_simulator ("simulator", with
+# latency and error injection). The process-wide rate limiter keeps the
+# real Kite limits unless --no-limits is given. Each level starts with
+# fresh buckets, so the quote bucket shows up as the bottleneck exactly
+# as it would in production. API calls are attributed through the scan
+# id telemetry sets on every scan, including calls made from worker
+# threads.
+
+PROFILES = [(25000, 25000), (50000, 50000), (100000, 60000), (200000, 150000)] # (capital, margin)
+DEFAULT_CONCURRENCY = [1, 2, 4, 8]
+DEFAULT_SCANS = 24          # scans per concurrency level
+ADVICE_SHARE = 0.25         # fraction of scans that are get_advice_report
+SATURATION_GAIN = 0.10      # a level adding < 10% scans/s over the previous one is saturated
+BACKENDS = ("offline", "simulator")
+
+class ScanCallCounter:
+    """
+    KiteConnect proxy counting API calls per scan id
+    (telemetry.current_scan_id(); None = outside any scan).
+    """
+    def __init__(self, kite):
+        object.__setattr__(self, "_kite", kite)
+        object.__setattr__(self, "_lock", threading.Lock())
+        object.__setattr__(self, "counts", Counter())
+
+    def __getattr__(self, name):
+        import telemetry
+        attr = getattr(self._kite, name)
+        if name not in telemetry.API_METHODS:
+            return attr
+        def counted(*args, **kwargs):
+            with self._lock:
+                self.counts[telemetry.current_scan_id()] += 1
+            return attr(*args, **kwargs)
+        return counted
+
+    def __setattr__(self, name, value):
+        setattr(self._kite, name, value)
+
+    def take(self):
+        """
+        Returns and resets the per-scan counts.
+        """
+        with self._lock:
+            counts = Counter(self.counts)
+            self.counts.clear()
+        return counts
+
+def reset_limiter(lift):
+    """
+    Fresh buckets for the process-wide limiter (lifted = effectively unlimited).
+    """
+    import rate_limiter
+    rate_limiter.kite_limiter.buckets = rate_limiter.RateLimiter().buckets
+    if lift:
+        import benchmark_suite
+        benchmark_suite.lift_rate_limits()
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+# ------------------------------------------------------------------------
+# SETUP
+# ------------------------------------------------------------------------
+def make_backend(args):
+    """
+    Installs the scans' Kite client; returns (open positions, simulator or None).
+    """
+    import config
+    import kite_data
+    import offline_kite
+    import benchmark_suite
+    config.TELEGRAM_BOT_TOKEN = "" # never message the real chat from a load test
+
+    if args.backend == "offline":
+        kite = offline_kite.OfflineKite(seed=args.seed, latency=args.latency)
+        positions = benchmark_suite.open_sample_book(kite)
+        client, sim = kite, None
+    else:
+        import kite_simulator
+        from kiteconnect import KiteConnect
+        sim = kite_simulator.KiteSimulator(port=0, ws_port=0, latency=args.latency, error_rate=args.error_rate,
+                                           seed=args.seed).start()
+        benchmark_suite.open_sample_book(sim.kite)
+        # Pooled connections for every scan thread and its candidate workers
+        client = KiteConnect(api_key="load", access_token="load", root=sim.root,
+                             pool={"pool_connections": 4, "pool_maxsize": max(args.concurrency) * 4})
+        positions = client.positions()["net"]
+
+    counter = ScanCallCounter(client)
+    kite_data.set_kite(counter)
+    kite_data.ensure_tokens_loaded(kite_data.get_kite())
+    return positions, sim
+
+def make_jobs(n, advice_share=ADVICE_SHARE):
+    """
+    n jobs, advice spread evenly through the batch, profiles round-robin.
+    """
+    jobs = []
+    every = round(1 / advice_share) if advice_share > 0 else 0
+    for i in range(n):
+        if every and i % every == every - 1:
+            jobs.append(("advice", None))
+        else:
+            jobs.append(("suggest_trade", PROFILES[i % len(PROFILES)]))
+    return jobs
+
+def run_job(job, positions):
+    import kite_data
+    import suggestion_engine
+    import position_advisor_engine
+    import benchmark_suite
+    kind, profile = job
+    start = time.perf_counter()
+    error = None
+    try:
+        if kind == "advice":
+            position_advisor_engine.get_advice_report(kite_data.get_kite(), positions)
+        else:
+            result = suggestion_engine.suggest_trade(*profile, logger=benchmark_suite.QuietLogger())
+            if str(result.get("reason", "")).startswith("Crash"):
+                error = result["reason"]
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return kind, time.perf_counter() - start, error
+
+# ------------------------------------------------------------------------
+# RUN
+# ------------------------------------------------------------------------
+def run_level(concurrency, jobs, positions, lift):
+    import kite_data
+    import rate_limiter
+    reset_limiter(lift)
+    kite_data.get_kite().take()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="load") as pool:
+        outcomes = list(pool.map(lambda job: run_job(job, positions), jobs))
+    wall = time.perf_counter() - start
+
+    latencies = defaultdict(list)
+    errors = Counter()
+    for kind, seconds, error in outcomes:
+        latencies[kind].append(seconds)
+        if error:
+            errors[error] += 1
+    counts = kite_data.get_kite().take()
+    api = defaultdict(list) # kind -> calls per scan
+    for scan_id, n in counts.items():
+        if scan_id:
+            api[scan_id.rsplit("-", 3)[0]].append(n)
+    everything = [s for values in latencies.values() for s in values]
+    quote_wait = rate_limiter.kite_limiter.bucket(rate_limiter.QUOTE).metrics()
+
+    return {
+        "concurrency": concurrency,
+        "scans": len(jobs),
+        "errors": sum(errors.values()),
+        "error_samples": [e for e, _ in errors.most_common(3)],
+        "wall_s": round(wall, 3),
+        "scans_per_s": round(len(jobs) / wall, 3),
+        "p50_ms": round(percentile(everything, 50) * 1000, 1),
+        "p95_ms": round(percentile(everything, 95) * 1000, 1),
+        "p99_ms": round(percentile(everything, 99) * 1000, 1),
+        "by_kind": {kind: {"scans": len(values),
+                           "p50_ms": round(percentile(values, 50) * 1000, 1),
+                           "p95_ms": round(percentile(values, 95) * 1000, 1),
+                           "p99_ms": round(percentile(values, 99) * 1000, 1),
+                           "api_calls_per_scan": round(float(np.mean(api.get(kind) or [0])), 2)}
+                    for kind, values in latencies.items()},
+        "api_calls_outside_scans": counts.get(None, 0),
+        "quote_wait_p95_ms": quote_wait["p95_wait_ms"]
+    }
+
+def find_saturation(levels, gain=SATURATION_GAIN):
+    """
+    The last level that still raised throughput by more than gain over
+    the one before it, if a later level did not; None if throughput kept
+    scaling through the sweep.
+    """
+    for prev, cur in zip(levels, levels[1:]):
+        if cur["scans_per_s"] < prev["scans_per_s"] * (1 + gain):
+            return prev
+    return None
+
+def print_level(level):
+    kinds = level["by_kind"]
+    api = " ".join(f"{k}={v['api_calls_per_scan']:g}" for k, v in sorted(kinds.items()))
+    print(f"{level['concurrency']:>5} {level['scans']:>6} {level['errors']:>6} {level['scans_per_s']:>8.2f} "
+          f"{level['p50_ms']:>9.1f} {level['p95_ms']:>9.1f} {level['p99_ms']:>9.1f} {level['quote_wait_p95_ms']:>11.1f}  {api}")
+    for sample in level["error_samples"]:
+        print(f"      ! {sample}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent suggest_trade / advisor load test against a local Kite stand-in")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--scans", type=int, default=DEFAULT_SCANS, help="scans per concurrency level")
+    parser.add_argument("--advice-share", type=float, default=ADVICE_SHARE)
+    parser.add_argument("--backend", choices=BACKENDS, default="offline")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every Kite call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="simulator backend: fraction of failed requests")
+    parser.add_argument("--no-limits", action="store_true", help="lift the Kite rate-limit buckets")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", metavar="FILE", help="write the results as JSON")
+    args = parser.parse_args(argv)
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    home = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix="load-")
+    os.chdir(scratch) # journal DB, trailing-stop book and logs stay out of the real ones
+    logging.disable(logging.CRITICAL)
+    sim = None
+    levels = []
+    try:
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            positions, sim = make_backend(args)
+            # Warm-up: imports, instrument caches, first-call allocations
+            for job in make_jobs(2, 0.5):
+                run_job(job, positions)
+
+        print(f"[*] Backend {args.backend} | latency {args.latency * 1000:g}ms | "
+              f"limits {'lifted' if args.no_limits else 'Kite'} | {args.scans} scans per level "
+              f"({args.advice_share:.0%} advice) | profiles {', '.join(f'{c}/{m}' for c, m in PROFILES)}")
+        print(f"{'conc':>5} {'scans':>6} {'errors':>6} {'scans/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+              f"{'quote wait':>11}  API calls/scan")
+        for concurrency in args.concurrency:
+            jobs = make_jobs(args.scans, args.advice_share)
+            with contextlib.redirect_stdout(open(os.devnull, "w")):
+                level = run_level(concurrency, jobs, positions, args.no_limits)
+            levels.append(level)
+            print_level(level)
+    finally:
+        logging.disable(logging.NOTSET)
+        if sim:
+            stats = sim.stats()
+            print(f"[*] Simulator served {sum(stats['requests'].values())} requests, injected "
+                  f"{sum(stats['injected_errors'].values())} errors (scans absorb them; 'errors' counts crashes)")
+            sim.stop()
+        os.chdir(home)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    knee = find_saturation(levels)
+    if knee:
+        after = levels[levels.index(knee) + 1:]
+        print(f"[!] Throughput saturates at ~{knee['concurrency']} concurrent scans ({knee['scans_per_s']:.2f} scans/s); "
+              f"beyond it p95 goes {knee['p95_ms']:.0f}ms -> {max(l['p95_ms'] for l in after):.0f}ms")
+    elif levels:
+        print(f"[*] Throughput still scaling at {levels[-1]['concurrency']} concurrent scans")
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump({"args": vars(args), "levels": levels,
+                       "saturation_concurrency": knee["concurrency"] if knee else None}, f, indent=2)
+        print(f"[*] Saved results to {json_path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
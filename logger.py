@@ -1,12 +1,14 @@
 class SimpleLogger:
-    def __init__(self):
+    def __init__(self, echo=True):
         self.logs = []
+        self.echo = echo # False = buffer only (e.g. parallel candidate scans)
 
     def log(self, message):
         """
         Prints to console and appends to the internal log list.
         """
-        print(message)
+        if self.echo:
+            print(message)
         self.logs.append(str(message))
 
     def get_logs(self):
@@ -32,8 +34,8 @@ class SimpleLogger:
         # Join logs
         full_msg = "\n".join(self.logs)
         
-        # Send via Wrapper (handles splitting if needed, though interface handles simple send)
-        # We wrap in code block for better formatting in Telegram
+        # Queued for background delivery (the interface splits at 4096 chars,
+        # keeping the code block intact). We wrap in code block for better formatting in Telegram
         formatted_msg = f"```\n{full_msg}\n```"
         
         telegram_interface.send_telegram_message(formatted_msg)
@@ -1,7 +1,9 @@
 from suggestion_engine import suggest_trade
 import kite_data
+import order_book
 import market_regime_engine
 import greeks_engine
+import profiler
 import datetime
 import time
 
@@ -11,30 +13,16 @@ import time
 class HoldTimeAdvisor:
     def __init__(self):
         self.kite = kite_data.get_kite()
-        # Cache for order times to avoid repetitive API calls
-        self.entry_time_cache = {} 
+        # Local order/trade mirror (loaded once, kept current by order updates)
+        self.order_book = order_book.get_order_book(self.kite)
+        self.order_book.start() # Periodic reconciliation poll (idempotent)
         
     def get_entry_time(self, symbol):
         """
-        Attempts to find the latest filled order time for this symbol.
+        Returns when the currently open position in symbol was entered
+        (first fill since it was last flat), else the latest COMPLETE order.
         """
-        if symbol in self.entry_time_cache:
-            return self.entry_time_cache[symbol]
-            
-        try:
-            orders = self.kite.orders()
-            # Sort by time desc
-            # Find last COMPLETED order for this symbol
-            for o in reversed(orders):
-                if o['tradingsymbol'] == symbol and o['status'] == 'COMPLETE':
-                    # Store as object
-                    limit_time = o['order_timestamp']
-                    self.entry_time_cache[symbol] = limit_time
-                    return limit_time
-        except Exception as e:
-            print(f"[!] Error fetching orders: {e}")
-            
-        return None
+        return self.order_book.first_fill_time(symbol) or self.order_book.last_complete_time(symbol)
 
     def analyze_position(self, pos):
         """
@@ -237,7 +225,8 @@ def main():
     while True:
         print("\n1. Suggest New Trade (Scanner)")
         print("2. Analyze Open Positions (Hold-Time Advisor)")
-        print("3. Exit")
+        print("3. Profile Next Scans (sampling profiler)")
+        print("4. Exit")
         
         choice = input("Select Option: ")
         
@@ -254,6 +243,15 @@ def main():
             advisor.run_report()
             
         elif choice == "3":
+            try:
+                scans = int(input("Number of scans to profile [1]: ") or 1)
+                fmt = input("Format (collapsed/speedscope) [collapsed]: ").strip() or "collapsed"
+                armed = profiler.arm(scans, fmt)
+                print(f"[+] Next {armed['remaining']} scan(s) will be profiled to {armed['directory']}/ ({armed['format']})")
+            except ValueError as e:
+                print(f"[!] Invalid input: {e}")
+            
+        elif choice == "4":
             print("Exiting...")
             break
         else:
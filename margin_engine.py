@@ -1,3 +1,9 @@
+import functools
+import numpy as np
+import greeks_engine
+import kite_data
+from rate_limiter import kite_limiter, endpoint_of, PRIORITY_ANALYTICS
+
 def estimate_short_margin(symbol, strike, premium, lot_size=None):
     """
     Estimates margin required for a Short Option position.
@@ -47,3 +53,203 @@ def choose_strategy_based_on_margin(margin, capital, intended_strategy_type="ANY
         return "ALL_ALLOWED" # Selling allowed
         
     return "BUY_ONLY"
+
+# ------------------------------------------------------------------------
+# LOCAL SPAN-STYLE PORTFOLIO MARGIN
+# ------------------------------------------------------------------------
+# Approximates exchange SPAN: every leg of an underlying is repriced over
+# the 16 standard risk scenarios (price moves of 0, 1/3, 2/3 and 3/3 of the
+# price scan range, each with volatility up and down, plus two extreme
+# moves at 35% weight). The worst portfolio loss is the SPAN requirement,
+# so hedged legs offset naturally. Exposure margin is added on the
+# notional of short options and futures.
+
+RISK_FREE_RATE = greeks_engine.RISK_FREE_RATE
+DEFAULT_SIGMA = 0.15  # When a leg carries no IV
+DEFAULT_T = 7 / 365.0 # When a leg carries no expiry
+
+SCAN_PRICE_FRACTIONS = np.array([0, 0, 1/3, 1/3, -1/3, -1/3, 2/3, 2/3, -2/3, -2/3, 1, 1, -1, -1, 2, -2])
+SCAN_VOL_DIRECTIONS = np.array([1, -1, 1, -1, 1, -1, 1, -1, 1, -1, 1, -1, 1, -1, 0, 0])
+SCAN_WEIGHTS = np.array([1.0] * 14 + [0.35, 0.35])
+
+@functools.lru_cache(maxsize=None)
+def get_contract_params(underlying):
+    """
+    Risk parameters per underlying (cached): price scan range (fraction
+    of spot), volatility scan (absolute sigma shift), exposure margin
+    (fraction of notional) and the short-option minimum (fraction of
+    notional per short leg).
+    """
+    if underlying in ("NIFTY", "FINNIFTY", "MIDCPNIFTY"):
+        return {"price_scan": 0.06, "vol_scan": 0.04, "exposure": 0.02, "short_min": 0.0075}
+    if underlying == "BANKNIFTY":
+        return {"price_scan": 0.07, "vol_scan": 0.04, "exposure": 0.02, "short_min": 0.0075}
+    # Single-stock derivatives
+    return {"price_scan": 0.10, "vol_scan": 0.06, "exposure": 0.035, "short_min": 0.0125}
+
+def get_lot_size(underlying):
+    """
+    Contract lot size; underlying may be a display name (NIFTY 50, NIFTY BANK).
+    """
+    underlying = _normalize_underlying(underlying)
+    size = kite_data.get_cached_lot_size(underlying)
+    if size: return size
+    return 15 if underlying == "BANKNIFTY" else 50 # Fallback (as estimate_short_margin)
+
+def _normalize_underlying(name):
+    """
+    NIFTY 50 -> NIFTY, NIFTY BANK -> BANKNIFTY (same rule as expiry_engine).
+    """
+    if "BANKNIFTY" in name or "NIFTY BANK" in name: return "BANKNIFTY"
+    if "FINNIFTY" in name or "NIFTY FIN" in name: return "FINNIFTY"
+    if "MIDCPNIFTY" in name: return "MIDCPNIFTY"
+    if name.startswith("NIFTY"): return "NIFTY"
+    return name
+
+def _underlying(leg):
+    if leg.get("underlying"): return _normalize_underlying(leg["underlying"])
+    symbol = kite_data.bare_symbol(leg.get("symbol", ""))
+    detail = kite_data.get_instrument_detail(symbol)
+    return detail.get("name") or _normalize_underlying(symbol)
+
+def _leg_arrays(legs, spots):
+    """
+    legs: [{"symbol"|"underlying", "type": CE/PE/FUT, "strike", "qty" (signed:
+    +long, -short), optional "sigma" (decimal), "expiry" or "T"}].
+    Missing strike/expiry are filled from the loaded instrument details.
+    """
+    n = len(legs)
+    arr = {"S": np.zeros(n), "K": np.zeros(n), "T": np.full(n, DEFAULT_T), "sigma": np.full(n, DEFAULT_SIGMA),
+           "qty": np.zeros(n), "is_call": np.zeros(n, dtype=bool), "is_option": np.zeros(n, dtype=bool)}
+    for i, leg in enumerate(legs):
+        symbol = kite_data.bare_symbol(leg.get("symbol", ""))
+        detail = kite_data.get_instrument_detail(symbol) if symbol else {}
+        kind = leg.get("type") or ("FUT" if "FUT" in symbol else "CE" if symbol.endswith("CE") else "PE")
+        strike = leg.get("strike") or detail.get("strike", 0) or 0
+        u = _underlying(leg)
+        arr["S"][i] = spots.get(u) or strike
+        arr["K"][i] = strike
+        arr["qty"][i] = leg["qty"]
+        arr["is_call"][i] = kind == "CE"
+        arr["is_option"][i] = kind in ("CE", "PE") and strike > 0
+        if leg.get("T") is not None:
+            arr["T"][i] = leg["T"]
+        elif leg.get("expiry") or detail.get("expiry"):
+            arr["T"][i] = max(greeks_engine.calculate_time_to_expiry(leg.get("expiry") or detail.get("expiry")), 1 / 365.0)
+        if leg.get("sigma"):
+            arr["sigma"][i] = leg["sigma"]
+    return arr
+
+def _scan_losses(arr, params):
+    """
+    Portfolio loss (positive = loss) in each of the 16 scenarios, all legs at once.
+    """
+    S = arr["S"][:, None]
+    K = arr["K"][:, None]
+    T = arr["T"][:, None]
+    sigma = arr["sigma"][:, None]
+    is_call = arr["is_call"][:, None]
+
+    S_scn = S * (1 + params["price_scan"] * SCAN_PRICE_FRACTIONS[None, :])
+    sig_scn = np.maximum(sigma + params["vol_scan"] * SCAN_VOL_DIRECTIONS[None, :], 0.01)
+
+    base = greeks_engine.bs_price_vectorized(S, K, T, RISK_FREE_RATE, sigma, is_call)
+    scn = greeks_engine.bs_price_vectorized(S_scn, K, T, RISK_FREE_RATE, sig_scn, is_call)
+
+    # Options reprice; futures move one-for-one with spot
+    change = np.where(arr["is_option"][:, None], scn - base, S_scn - S)
+    pnl = (change * arr["qty"][:, None]).sum(axis=0) * SCAN_WEIGHTS
+    return -pnl
+
+def _underlying_margin(arr, underlying):
+    params = get_contract_params(underlying)
+    if not len(arr["qty"]):
+        return {"span": 0.0, "exposure": 0.0}
+    scan_risk = max(float(_scan_losses(arr, params).max()), 0.0)
+
+    short = arr["qty"] < 0
+    sold = short & arr["is_option"]
+    short_min = float((np.abs(arr["qty"][sold]) * arr["S"][sold]).sum() * params["short_min"])
+    span = max(scan_risk, short_min)
+
+    # Exposure on the notional of short options and all futures
+    futures = ~arr["is_option"]
+    exposure_notional = (np.abs(arr["qty"]) * arr["S"])[sold | futures].sum()
+    exposure = float(exposure_notional * params["exposure"])
+    return {"span": round(span, 2), "exposure": round(exposure, 2)}
+
+def estimate_portfolio_margin(legs, spots=None, standalone=True):
+    """
+    Local SPAN + exposure margin for a multi-leg portfolio (no API call).
+    spots: {underlying: spot}; defaults to each leg's strike as a proxy.
+
+    Returns {"span", "exposure", "total", "hedge_benefit", "by_underlying"}.
+    hedge_benefit = sum of standalone leg margins - portfolio margin.
+    Long options need no margin (premium is paid upfront).
+    """
+    spots = {_normalize_underlying(u): v for u, v in (spots or {}).items()}
+    groups = {}
+    for leg in legs:
+        if leg.get("qty"):
+            groups.setdefault(_underlying(leg), []).append(leg)
+
+    by_underlying = {}
+    span = exposure = standalone_total = 0.0
+    for u, group in groups.items():
+        arr = _leg_arrays(group, spots)
+        m = _underlying_margin(arr, u)
+        m["total"] = round(m["span"] + m["exposure"], 2)
+        by_underlying[u] = m
+        span += m["span"]
+        exposure += m["exposure"]
+
+        if standalone:
+            for i in range(len(group)):
+                single = {k: v[i:i + 1] for k, v in arr.items()}
+                sm = _underlying_margin(single, u)
+                standalone_total += sm["span"] + sm["exposure"]
+
+    total = round(span + exposure, 2)
+    return {
+        "span": round(span, 2),
+        "exposure": round(exposure, 2),
+        "total": total,
+        "hedge_benefit": round(max(standalone_total - total, 0.0), 2) if standalone else 0.0,
+        "by_underlying": by_underlying
+    }
+
+def margin_per_lot(underlying, strike, option_type, spot=None, sigma=None, expiry=None, lot_size=None):
+    """
+    Local margin for ONE short lot (sizing helper).
+    """
+    lot_size = lot_size or get_lot_size(underlying)
+    leg = {"underlying": underlying, "strike": strike, "type": option_type,
+           "qty": -lot_size, "sigma": sigma, "expiry": expiry}
+    return estimate_portfolio_margin([leg], {underlying: spot} if spot else None, standalone=False)["total"]
+
+def verify_with_broker(legs, kite, spots=None, product="NRML"):
+    """
+    Compares the local estimate with kite.basket_order_margins for the same
+    legs (needs "symbol" on every leg; an "NFO:" prefix is stripped).
+    Returns {"local", "broker", "diff_pct"} or None if the API call fails.
+    """
+    local = estimate_portfolio_margin(legs, spots, standalone=False)["total"]
+    orders = [{
+        "exchange": "NFO",
+        "tradingsymbol": kite_data.bare_symbol(leg["symbol"]),
+        "transaction_type": "BUY" if leg["qty"] > 0 else "SELL",
+        "variety": "regular",
+        "product": product,
+        "order_type": "MARKET",
+        "quantity": abs(leg["qty"]),
+        "price": 0
+    } for leg in legs if leg.get("qty")]
+    try:
+        kite_limiter.acquire(endpoint_of("basket_order_margins"), PRIORITY_ANALYTICS)
+        res = kite.basket_order_margins(orders, consider_positions=False, mode="compact")
+        broker = float(res.get("final", res.get("initial", {})).get("total", 0))
+    except Exception as e:
+        print(f"[Margin] Broker margin check failed: {e}")
+        return None
+    diff = (local - broker) / broker * 100 if broker else 0.0
+    return {"local": local, "broker": round(broker, 2), "diff_pct": round(diff, 2)}
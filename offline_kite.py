@@ -0,0 +1,459 @@
+import os
+import time
+import datetime
+import threading
+import itertools
+from collections import Counter
+import numpy as np
+import greeks_engine
+import expiry_engine
+from otm_engine import get_strike_gap
+
+# ------------------------------------------------------------------------
+# OFFLINE KITE STAND-IN
+# ------------------------------------------------------------------------
+# A KiteConnect-shaped object that needs no network or session: spot
+# paths come from the NIFTY 1-minute bars in nifty_data_yahoo.csv (older
+# history is bootstrapped from the same returns), and option chains
+# around every underlying are priced with greeks_engine on a simple
+# smile. Everything is seeded, so two instances with the same arguments
+# answer identically. Orders fill at the quote immediately.
+#
+# Plug it in with kite_data.set_kite(OfflineKite()); benchmark_suite,
+# kite_simulator and load_harness all run on it.
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+PATH_CSV = os.path.join(PACKAGE_DIR, "nifty_data_yahoo.csv")
+
+BARS_PER_DAY = 375          # 09:15 - 15:30 in minutes
+HISTORY_DAYS = 130          # daily history available before the CSV window
+CHAIN_STRIKES = 30          # strikes listed each side of the spot
+BASE_IV = 0.14
+SMILE = 1.5                 # sigma += SMILE * log-moneyness^2
+SKEW = 0.10                 # sigma -= SKEW * log-moneyness (puts richer)
+OI_PEAK = 2_000_000
+VOLUME_PEAK = 5_000_000
+
+# name -> (spot, volatility vs NIFTY, lot size, instrument token, quote symbol)
+UNDERLYINGS = {
+    "NIFTY": (None, 1.0, 75, 256265, "NSE:NIFTY 50"),
+    "BANKNIFTY": (55000.0, 1.2, 35, 260105, "NSE:NIFTY BANK"),
+    "FINNIFTY": (26000.0, 1.1, 65, 257801, "NSE:NIFTY FIN SERVICE"),
+    "MIDCPNIFTY": (13000.0, 1.3, 140, 288009, "NSE:NIFTY MID SELECT"),
+    "RELIANCE": (1400.0, 1.4, 500, 738561, "NSE:RELIANCE"),
+    "HDFCBANK": (1700.0, 1.2, 550, 341249, "NSE:HDFCBANK"),
+    "ICICIBANK": (1300.0, 1.3, 700, 1270529, "NSE:ICICIBANK"),
+    "SBIN": (800.0, 1.5, 750, 779521, "NSE:SBIN"),
+    "TCS": (4100.0, 1.2, 175, 2953217, "NSE:TCS"),
+    "INFY": (1800.0, 1.4, 400, 408065, "NSE:INFY"),
+}
+
+INTERVAL_MINUTES = {"minute": 1, "3minute": 3, "5minute": 5, "10minute": 10, "15minute": 15,
+                    "30minute": 30, "60minute": 60, "day": BARS_PER_DAY}
+
+def load_path_returns(path=PATH_CSV):
+    """
+    1-minute closes and log returns of the CSV underlying.
+    """
+    closes = []
+    with open(path) as f:
+        next(f)
+        for line in f:
+            parts = line.strip().split(",")
+            try:
+                closes.append(float(parts[4]))
+            except (IndexError, ValueError):
+                continue # ticker row / blanks
+    closes = np.array(closes)
+    return closes, np.diff(np.log(closes))
+
+def _trading_days(end, n):
+    """
+    The n weekdays ending at end (inclusive), oldest first.
+    """
+    days = []
+    day = end
+    while len(days) < n:
+        if day.weekday() < 5:
+            days.append(day)
+        day -= datetime.timedelta(days=1)
+    return days[::-1]
+
+class OfflineKite:
+    # KiteConnect constants used by the adapters
+    VARIETY_REGULAR = "regular"
+    TRANSACTION_TYPE_BUY = "BUY"
+    TRANSACTION_TYPE_SELL = "SELL"
+    PRODUCT_MIS = "MIS"
+    PRODUCT_NRML = "NRML"
+    ORDER_TYPE_MARKET = "MARKET"
+    ORDER_TYPE_LIMIT = "LIMIT"
+    VALIDITY_DAY = "DAY"
+    EXCHANGE_NFO = "NFO"
+    EXCHANGE_NSE = "NSE"
+
+    def __init__(self, seed=7, base_iv=BASE_IV, latency=0.0, today=None, chain_strikes=CHAIN_STRIKES, replay=False):
+        """
+        latency: seconds added to every call (emulates the network).
+        replay: start "now" at the first bar of the CSV window (advance()
+        walks through it) instead of at its last bar.
+        """
+        self.seed = seed
+        self.base_iv = base_iv
+        self.latency = latency
+        self.chain_strikes = chain_strikes
+        self.today = today or datetime.date.today()
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+        closes, returns = load_path_returns()
+        rng = np.random.default_rng(seed)
+        history = HISTORY_DAYS * BARS_PER_DAY
+        self.minutes = history + len(closes)
+        self.days = _trading_days(self.today, -(-self.minutes // BARS_PER_DAY))
+        # The path ends on the last bar of today's session
+        session = np.arange(len(self.days) * BARS_PER_DAY)[-self.minutes:]
+        self.day_of_minute = session // BARS_PER_DAY
+        self.minute_of_day = session % BARS_PER_DAY
+
+        # Per underlying: bootstrapped history + the CSV path, scaled to its spot
+        self.paths = {}
+        for name, (spot, vol, _, _, _) in UNDERLYINGS.items():
+            past = rng.choice(returns, size=history) * vol
+            recent = returns * vol
+            log_path = np.concatenate([[0.0], np.cumsum(np.concatenate([past, recent]))])
+            anchor = closes[0] if spot is None else spot
+            # The CSV window starts at the anchor price
+            self.paths[name] = anchor * np.exp(log_path - log_path[history])
+        self.cursor = history if replay else self.minutes - 1 # "now"
+
+        self._build_instruments()
+        self._order_ids = itertools.count(250000000000001)
+        self._trade_ids = itertools.count(1)
+        self.order_list = []
+        self.trade_list = []
+        self.net = {} # tradingsymbol -> position
+
+    # --------------------------------------------------------------------
+    # CLOCK
+    # --------------------------------------------------------------------
+    def advance(self, minutes=1):
+        """
+        Moves "now" forward along the path (stops at its end).
+        """
+        with self.lock:
+            self.cursor = min(self.cursor + minutes, self.minutes - 1)
+        return self.cursor
+
+    def now(self):
+        return self._bar_time(self.cursor)
+
+    def _bar_time(self, i):
+        day = self.days[self.day_of_minute[i]]
+        return datetime.datetime.combine(day, datetime.time(9, 15)) + datetime.timedelta(minutes=int(self.minute_of_day[i]))
+
+    def spot(self, name):
+        return float(self.paths[name][self.cursor])
+
+    # --------------------------------------------------------------------
+    # INSTRUMENTS
+    # --------------------------------------------------------------------
+    def _build_instruments(self):
+        self.nfo = []
+        self.by_symbol = {}     # tradingsymbol -> instrument
+        self.by_token = {}      # token -> instrument (NFO and underlyings)
+        exchange_token = itertools.count(35001)
+        for name, (_, _, lot, utoken, quote_symbol) in UNDERLYINGS.items():
+            self.by_token[utoken] = {"tradingsymbol": quote_symbol.split(":", 1)[1], "name": name,
+                                     "instrument_token": utoken, "exchange": "NSE", "underlying": name}
+            gap = get_strike_gap(name)
+            expiries = [expiry_engine.get_expiry(name, self.today)["date"]]
+            expiries.append(expiry_engine.get_expiry(name, expiries[0] + datetime.timedelta(days=1))["date"])
+            spot = self.spot(name)
+            atm = round(spot / gap) * gap
+            for expiry in expiries:
+                fut = f"{name}{expiry:%y}{expiry.strftime('%b').upper()}FUT"
+                self._add_nfo(next(exchange_token), fut, name, expiry, 0.0, lot, "FUT", "NFO-FUT")
+                for i in range(-self.chain_strikes, self.chain_strikes + 1):
+                    strike = atm + i * gap
+                    for otype in ("CE", "PE"):
+                        ts = expiry_engine.get_option_symbol(name, expiry, strike, otype)
+                        self._add_nfo(next(exchange_token), ts, name, expiry, float(strike), lot, otype, "NFO-OPT")
+
+    def _add_nfo(self, exchange_token, ts, name, expiry, strike, lot, itype, segment):
+        # Kite tokens carry the segment in the low byte (2 = NFO); KiteTicker decodes prices by it
+        token = (exchange_token << 8) | 2
+        inst = {"instrument_token": token, "exchange_token": str(exchange_token), "tradingsymbol": ts, "name": name,
+                "last_price": 0.0, "expiry": expiry, "strike": strike, "tick_size": 0.05, "lot_size": lot,
+                "instrument_type": itype, "segment": segment, "exchange": "NFO"}
+        self.nfo.append(inst)
+        self.by_symbol[ts] = inst
+        self.by_token[token] = inst
+
+    def _resolve(self, key):
+        """
+        "NFO:SYM" / "NSE:NIFTY 50" / token (int or str) -> (instrument, quote key).
+        """
+        k = str(key)
+        if k.isdigit():
+            return self.by_token.get(int(k)), k
+        if k.startswith("NFO:"):
+            return self.by_symbol.get(k[4:]), k
+        for name, (_, _, _, utoken, quote_symbol) in UNDERLYINGS.items():
+            if k == quote_symbol or k == f"NSE:{name}":
+                return self.by_token[utoken], k
+        return self.by_symbol.get(k), k
+
+    # --------------------------------------------------------------------
+    # PRICING
+    # --------------------------------------------------------------------
+    def price(self, inst):
+        """
+        (last price, iv) of an instrument at the current cursor.
+        """
+        if "underlying" in inst:
+            return self.spot(inst["name"]), 0.0
+        spot = self.spot(inst["name"])
+        if inst["instrument_type"] == "FUT":
+            T = greeks_engine.calculate_time_to_expiry(inst["expiry"])
+            return round(spot * np.exp(greeks_engine.RISK_FREE_RATE * T) * 20) / 20, 0.0
+        m = np.log(inst["strike"] / spot)
+        sigma = self.base_iv * UNDERLYINGS[inst["name"]][1] + SMILE * m * m - SKEW * m
+        T = max(greeks_engine.calculate_time_to_expiry(inst["expiry"]), 1e-4)
+        px = float(greeks_engine.bs_price_vectorized(spot, inst["strike"], T, greeks_engine.RISK_FREE_RATE, sigma,
+                                                     inst["instrument_type"] == "CE"))
+        return max(round(px * 20) / 20, 0.05), round(sigma * 100, 2)
+
+    def _activity(self, inst):
+        """
+        Deterministic OI / volume, peaked at the money.
+        """
+        if "underlying" in inst or inst["instrument_type"] == "FUT":
+            return 0, 0
+        m = np.log(inst["strike"] / self.spot(inst["name"]))
+        shape = np.exp(-(m / 0.04) ** 2)
+        jitter = 0.8 + 0.4 * ((inst["instrument_token"] * 2654435761) % 1000) / 1000
+        return int(OI_PEAK * shape * jitter) + 1000, int(VOLUME_PEAK * shape * jitter) + 500
+
+    def _quote(self, inst):
+        last, iv = self.price(inst)
+        oi, volume = self._activity(inst)
+        prev = float(self.paths[inst["name"]][max(self.cursor - BARS_PER_DAY, 0)])
+        tick = 0.05
+        spread = max(tick, round(last * 0.002 / tick) * tick)
+        depth = {
+            "buy": [{"price": round(max(last - spread * (i + 1) / 2, tick), 2), "quantity": 75 * (5 - i), "orders": 5 - i} for i in range(5)],
+            "sell": [{"price": round(last + spread * (i + 1) / 2, 2), "quantity": 75 * (5 - i), "orders": 5 - i} for i in range(5)]
+        }
+        return {
+            "instrument_token": inst["instrument_token"],
+            "timestamp": self.now(),
+            "last_trade_time": self.now(),
+            "last_price": last,
+            "last_quantity": 75,
+            "volume": volume,
+            "average_price": last,
+            "buy_quantity": volume // 10,
+            "sell_quantity": volume // 10,
+            "oi": oi,
+            "oi_day_high": int(oi * 1.05),
+            "oi_day_low": int(oi * 0.95),
+            "net_change": round(last - prev, 2) if "underlying" in inst else 0.0,
+            "lower_circuit_limit": 0.05,
+            "upper_circuit_limit": round(last * 3, 2),
+            "ohlc": {"open": last, "high": last, "low": last, "close": last},
+            "depth": depth
+        }
+
+    def quote_by_token(self, token):
+        """
+        Full quote of one instrument (no API call counted; for tick feeds).
+        """
+        inst = self.by_token.get(token)
+        return self._quote(inst) if inst else None
+
+    # --------------------------------------------------------------------
+    # KITECONNECT API
+    # --------------------------------------------------------------------
+    def _call(self, endpoint):
+        with self.lock:
+            self.calls[endpoint] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    @staticmethod
+    def _keys(instruments):
+        return list(instruments) if isinstance(instruments, (list, tuple, set)) else [instruments]
+
+    def instruments(self, exchange=None):
+        self._call("instruments")
+        return [dict(i) for i in self.nfo] if exchange in (None, "NFO") else []
+
+    def quote(self, *instruments):
+        self._call("quote")
+        keys = self._keys(instruments[0]) if len(instruments) == 1 else list(instruments)
+        out = {}
+        for key in keys:
+            inst, k = self._resolve(key)
+            if inst is not None:
+                out[k] = self._quote(inst)
+        return out
+
+    def ltp(self, *instruments):
+        self._call("ltp")
+        keys = self._keys(instruments[0]) if len(instruments) == 1 else list(instruments)
+        out = {}
+        for key in keys:
+            inst, k = self._resolve(key)
+            if inst is not None:
+                out[k] = {"instrument_token": inst["instrument_token"], "last_price": self.price(inst)[0]}
+        return out
+
+    def ohlc(self, *instruments):
+        return {k: {"instrument_token": q["instrument_token"], "last_price": q["last_price"], "ohlc": q["ohlc"]}
+                for k, q in self.quote(*instruments).items()}
+
+    def historical_data(self, instrument_token, from_date, to_date, interval, continuous=False, oi=False):
+        """
+        Candles of the underlying path ending at the cursor. The span is
+        from_date..to_date counted in trading days (capped by the history).
+        """
+        self._call("historical_data")
+        inst = self.by_token.get(int(instrument_token))
+        if inst is None:
+            raise ValueError(f"invalid token {instrument_token}")
+        step = INTERVAL_MINUTES.get(interval, 5)
+        sessions = int(max((to_date - from_date).days, 1) * 5 / 7) + 1
+        last_day = self.day_of_minute[self.cursor]
+
+        # Whole sessions back from "now"; candles are anchored at 09:15 and never span two sessions
+        end = self.cursor + 1
+        start = int(np.searchsorted(self.day_of_minute, last_day - sessions + 1))
+        keys = self.day_of_minute[start:end] * BARS_PER_DAY + self.minute_of_day[start:end] // step
+        starts = np.nonzero(np.diff(keys, prepend=-1))[0]
+        seg = self.paths[inst["name"]][start:end]
+        opens, closes = seg[starts], seg[np.append(starts[1:], len(seg)) - 1]
+        highs, lows = np.maximum.reduceat(seg, starts), np.minimum.reduceat(seg, starts)
+        lengths = np.diff(np.append(starts, len(seg)))
+        index = inst["name"] in ("NIFTY", "BANKNIFTY", "FINNIFTY", "MIDCPNIFTY")
+
+        candles = []
+        for j, first in enumerate(starts):
+            i = start + first
+            if step == BARS_PER_DAY:
+                ts = datetime.datetime.combine(self.days[self.day_of_minute[i]], datetime.time(0, 0))
+            else:
+                ts = self._bar_time(i)
+            candles.append({"date": ts, "open": float(opens[j]), "high": float(highs[j]), "low": float(lows[j]),
+                            "close": float(closes[j]), "volume": 0 if index else int(lengths[j] * 20000)})
+        return candles
+
+    # --------------------------------------------------------------------
+    # ORDERS / POSITIONS
+    # --------------------------------------------------------------------
+    def place_order(self, variety, exchange, tradingsymbol, transaction_type, quantity, product, order_type,
+                    price=None, validity=None, tag=None, **kwargs):
+        self._call("place_order")
+        inst = self.by_symbol.get(tradingsymbol)
+        if inst is None:
+            raise ValueError(f"Invalid `tradingsymbol` {tradingsymbol}")
+        last = self._quote(inst)
+        fill = last["depth"]["sell"][0]["price"] if transaction_type == "BUY" else last["depth"]["buy"][0]["price"]
+        if order_type == "LIMIT" and price:
+            fill = min(fill, price) if transaction_type == "BUY" else max(fill, price)
+        now = self.now()
+        with self.lock:
+            order_id = str(next(self._order_ids))
+            order = {"order_id": order_id, "status": "COMPLETE", "tradingsymbol": tradingsymbol, "exchange": exchange,
+                     "instrument_token": inst["instrument_token"], "transaction_type": transaction_type,
+                     "quantity": quantity, "filled_quantity": quantity, "pending_quantity": 0, "product": product,
+                     "order_type": order_type, "price": price or 0, "average_price": fill, "variety": variety,
+                     "validity": validity, "tag": tag, "order_timestamp": now, "exchange_timestamp": now,
+                     "status_message": None}
+            self.order_list.append(order)
+            self.trade_list.append({"trade_id": str(next(self._trade_ids)), "order_id": order_id,
+                                    "tradingsymbol": tradingsymbol, "exchange": exchange,
+                                    "instrument_token": inst["instrument_token"], "transaction_type": transaction_type,
+                                    "quantity": quantity, "average_price": fill, "product": product,
+                                    "fill_timestamp": now, "exchange_timestamp": now, "order_timestamp": now})
+            self._book_fill(inst, transaction_type, quantity, fill, product)
+        return order_id
+
+    def _book_fill(self, inst, side, qty, fill, product):
+        pos = self.net.setdefault(inst["tradingsymbol"], {
+            "tradingsymbol": inst["tradingsymbol"], "exchange": "NFO", "instrument_token": inst["instrument_token"],
+            "product": product, "quantity": 0, "buy_quantity": 0, "sell_quantity": 0, "buy_value": 0.0,
+            "sell_value": 0.0, "average_price": 0.0, "multiplier": 1})
+        if side == "BUY":
+            pos["buy_quantity"] += qty
+            pos["buy_value"] += qty * fill
+        else:
+            pos["sell_quantity"] += qty
+            pos["sell_value"] += qty * fill
+        pos["quantity"] = pos["buy_quantity"] - pos["sell_quantity"]
+        if pos["quantity"] > 0:
+            pos["average_price"] = pos["buy_value"] / pos["buy_quantity"]
+        elif pos["quantity"] < 0:
+            pos["average_price"] = pos["sell_value"] / pos["sell_quantity"]
+
+    def orders(self):
+        self._call("orders")
+        with self.lock:
+            return [dict(o) for o in self.order_list]
+
+    def trades(self):
+        self._call("trades")
+        with self.lock:
+            return [dict(t) for t in self.trade_list]
+
+    def order_history(self, order_id):
+        self._call("order_history")
+        return [dict(o) for o in self.order_list if o["order_id"] == order_id]
+
+    def positions(self):
+        self._call("positions")
+        out = []
+        with self.lock:
+            positions = [dict(p) for p in self.net.values()]
+        for p in positions:
+            last = self.price(self.by_symbol[p["tradingsymbol"]])[0]
+            p["last_price"] = last
+            p["pnl"] = round(p["sell_value"] - p["buy_value"] + p["quantity"] * last, 2)
+            out.append(p)
+        return {"net": out, "day": [dict(p) for p in out]}
+
+    def margins(self, segment=None):
+        self._call("margins")
+        equity = {"enabled": True, "net": 500000.0, "available": {"cash": 500000.0, "live_balance": 500000.0},
+                  "utilised": {"debits": 0.0, "span": 0.0, "exposure": 0.0}}
+        return equity if segment == "equity" else {"equity": equity, "commodity": {"enabled": False}}
+
+    def basket_order_margins(self, orders, consider_positions=True, mode=None):
+        """
+        Uses the local SPAN-style estimator in place of the broker's.
+        """
+        self._call("basket_order_margins")
+        import margin_engine
+        legs = []
+        for o in orders:
+            inst = self.by_symbol.get(o["tradingsymbol"], {})
+            sign = 1 if o["transaction_type"] == "BUY" else -1
+            legs.append({"symbol": o["tradingsymbol"], "underlying": inst.get("name"), "type": inst.get("instrument_type"),
+                         "strike": inst.get("strike"), "expiry": inst.get("expiry"), "qty": sign * o["quantity"]})
+        est = margin_engine.estimate_portfolio_margin(legs, {n: self.spot(n) for n in UNDERLYINGS})
+        return {"initial": {"span": est["span"], "exposure": est["exposure"], "total": est["total"]},
+                "final": {"span": est["span"], "exposure": est["exposure"], "total": est["total"]}, "orders": []}
+
+    def profile(self):
+        self._call("profile")
+        return {"user_id": "OFFLINE", "user_name": "Offline Kite", "broker": "ZERODHA", "exchanges": ["NSE", "NFO"]}
+
+    # Session plumbing (no-ops offline)
+    def set_access_token(self, access_token):
+        self.access_token = access_token
+
+    def login_url(self):
+        return "offline://login"
+
+    def generate_session(self, request_token, api_secret=None):
+        return {"access_token": "offline", "user_id": "OFFLINE"}
@@ -1,4 +1,5 @@
 import kite_data
+import telemetry
 
 # ------------------------------------------------------------------------
 # 🔥 5️⃣ REAL IV RANK CALCULATION (In-Memory History)
@@ -30,6 +31,7 @@ def calculate_iv_rank(symbol):
 # ------------------------------------------------------------------------
 # 🔥 2️⃣ REAL PCR (Put/Call Ratio) - BATCH FETCH
 # ------------------------------------------------------------------------
+@telemetry.traced()
 def calculate_pcr(kite, underlying):
     """
     Calculates PCR using Real OI from ALL active options of the underlying.
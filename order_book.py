@@ -0,0 +1,270 @@
+import datetime
+import threading
+from collections import defaultdict
+import kite_data
+from rate_limiter import kite_limiter, OTHERS, PRIORITY_NORMAL
+
+# ------------------------------------------------------------------------
+# ORDER / TRADE BOOK MIRROR
+# ------------------------------------------------------------------------
+# One local copy of kite.orders() + kite.trades(), loaded once, kept
+# current by KiteTicker order updates and reconciled by a slow poll.
+# Readers (hold-time advisor, journal, position monitors) query it
+# instead of calling the order API.
+
+RECONCILE_INTERVAL = 60 # seconds between full orders()/trades() polls
+FINAL_STATUSES = ("COMPLETE", "CANCELLED", "REJECTED")
+
+def _ts(value):
+    """
+    Normalizes Kite timestamps (datetime from REST, str from websocket).
+    """
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    try:
+        return datetime.datetime.strptime(str(value), "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+
+def _fill_time(trade):
+    return _ts(trade.get("fill_timestamp")) or _ts(trade.get("exchange_timestamp")) or _ts(trade.get("order_timestamp"))
+
+class OrderBookMirror:
+    def __init__(self, kite=None, reconcile_interval=RECONCILE_INTERVAL):
+        self.kite = kite
+        self.reconcile_interval = reconcile_interval
+        self.lock = threading.RLock()
+        self.orders = {}                    # order_id -> latest order dict
+        self.orders_by_symbol = defaultdict(list) # tradingsymbol -> [order_id] (arrival order)
+        self.fills = {}                     # trade_id -> fill dict
+        self.fills_by_symbol = defaultdict(list)  # tradingsymbol -> [trade_id] (chronological)
+        self.booked = defaultdict(lambda: [0, 0.0]) # order_id -> [quantity, value] already in fills
+        self.loaded = False
+        self.last_sync = None
+        self.sync_lock = threading.Lock() # One REST reload at a time
+        self._pending = None              # Order updates received while a reload is fetching
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --------------------------------------------------------------------
+    # SYNC
+    # --------------------------------------------------------------------
+    def load(self):
+        """
+        Full (re)load from the REST API. Replaces the mirror atomically;
+        order updates that arrive while orders()/trades() are in flight are
+        replayed on top of the new snapshot, so they are not lost to it.
+        """
+        kite = self.kite or kite_data.get_kite()
+        with self.sync_lock:
+            with self.lock:
+                self._pending = []
+            try:
+                kite_limiter.acquire(OTHERS, PRIORITY_NORMAL)
+                orders = kite.orders() or []
+                kite_limiter.acquire(OTHERS, PRIORITY_NORMAL)
+                trades = kite.trades() or []
+            except Exception as e:
+                with self.lock:
+                    self._pending = None
+                print(f"[OrderBook] Sync failed: {e}")
+                return False
+
+            with self.lock:
+                pending, self._pending = self._pending, None
+                self.orders.clear()
+                self.orders_by_symbol.clear()
+                self.fills.clear()
+                self.fills_by_symbol.clear()
+                self.booked.clear()
+                for o in orders:
+                    self._upsert_order(o)
+                for t in trades:
+                    self._add_fill(t)
+                for data in pending:
+                    self._apply_update(data)
+                self.loaded = True
+                self.last_sync = datetime.datetime.now()
+        return True
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def start(self):
+        """
+        Loads the book and starts the background reconciliation poll.
+        """
+        self.ensure_loaded()
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._reconcile_loop, name="OrderBookSync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _reconcile_loop(self):
+        while not self._stop.wait(self.reconcile_interval):
+            self.load()
+
+    def on_order_update(self, ws, data):
+        """
+        KiteTicker on_order_update callback. Upserts the order and, when
+        filled_quantity exceeds what the fills already hold for the order,
+        records the difference as a provisional fill (replaced by the real
+        trade rows at the next reconciliation).
+        """
+        with self.lock:
+            if self._pending is not None:
+                self._pending.append(data)
+            self._apply_update(data)
+
+    def _apply_update(self, data):
+        prev = self.orders.get(data.get("order_id"), {})
+        prev_filled = prev.get("filled_quantity", 0) or 0
+        if (data.get("filled_quantity", 0) or 0) < prev_filled or \
+                (prev.get("status") in FINAL_STATUSES and data.get("status") not in FINAL_STATUSES):
+            return # Older than what the book already holds (e.g. replayed after a reload)
+        self._upsert_order(data)
+
+        # Compared with the fills, not the order snapshot: after a reload,
+        # trades() may already hold rows the orders() snapshot did not count
+        filled = data.get("filled_quantity", 0) or 0
+        booked_qty, booked_value = self.booked[data["order_id"]]
+        if filled > booked_qty:
+            avg = data.get("average_price", 0) or 0
+            qty = filled - booked_qty
+            price = (avg * filled - booked_value) / qty
+            self._add_fill({
+                "trade_id": f"{data['order_id']}:{filled}",
+                "order_id": data["order_id"],
+                "tradingsymbol": data.get("tradingsymbol"),
+                "transaction_type": data.get("transaction_type"),
+                "quantity": qty,
+                "average_price": price,
+                "fill_timestamp": data.get("exchange_update_timestamp") or data.get("exchange_timestamp") or data.get("order_timestamp")
+            })
+
+    def _upsert_order(self, order):
+        oid = order.get("order_id")
+        if oid is None:
+            return
+        if oid not in self.orders:
+            self.orders_by_symbol[order.get("tradingsymbol")].append(oid)
+        self.orders[oid] = dict(order)
+
+    def _add_fill(self, trade):
+        tid = trade.get("trade_id")
+        if tid is None or tid in self.fills:
+            return
+        fill = dict(trade)
+        fill["time"] = _fill_time(trade)
+        self.fills[tid] = fill
+        if trade.get("order_id") is not None:
+            booked = self.booked[trade["order_id"]]
+            booked[0] += trade.get("quantity", 0) or 0
+            booked[1] += (trade.get("quantity", 0) or 0) * (trade.get("average_price", 0) or 0)
+
+        # Keep per-symbol fills chronological (inserts are almost always at the end)
+        ids = self.fills_by_symbol[trade.get("tradingsymbol")]
+        ids.append(tid)
+        i = len(ids) - 1
+        while i > 0 and (self.fills[ids[i - 1]]["time"] or datetime.datetime.min) > (fill["time"] or datetime.datetime.min):
+            ids[i], ids[i - 1] = ids[i - 1], ids[i]
+            i -= 1
+
+    # --------------------------------------------------------------------
+    # QUERIES
+    # --------------------------------------------------------------------
+    def get_order(self, order_id):
+        self.ensure_loaded()
+        with self.lock:
+            return self.orders.get(order_id)
+
+    def get_orders(self, symbol):
+        self.ensure_loaded()
+        with self.lock:
+            return [self.orders[oid] for oid in self.orders_by_symbol.get(symbol, [])]
+
+    def get_fills(self, symbol):
+        self.ensure_loaded()
+        with self.lock:
+            return [self.fills[tid] for tid in self.fills_by_symbol.get(symbol, [])]
+
+    def last_complete_time(self, symbol):
+        """
+        Timestamp of the latest COMPLETE order for symbol (None if none).
+        """
+        for o in reversed(self.get_orders(symbol)):
+            if o.get("status") == "COMPLETE":
+                ts = _ts(o.get("order_timestamp")) or _ts(o.get("exchange_update_timestamp"))
+                if ts:
+                    return ts
+        return None
+
+    def average_price(self, order_id):
+        o = self.get_order(order_id)
+        if o and o.get("average_price"):
+            return o["average_price"]
+        return None
+
+    def open_entry_fills(self, symbol):
+        """
+        The fills that built the currently open position: walks fills in
+        time order, restarting whenever the net quantity returns to zero,
+        and keeps only the fills that increased the position. A fill that
+        flips the position through zero opens the new one with its residual
+        quantity (e.g. long 50, sell 100 -> entries [SELL 50]).
+        """
+        net = 0
+        entries = []
+        for f in self.get_fills(symbol):
+            signed = f.get("quantity", 0) * (1 if f.get("transaction_type") == "BUY" else -1)
+            if net == 0 or (net > 0) == (signed > 0):
+                entries.append(f)
+            new_net = net + signed
+            if new_net == 0:
+                entries = []
+            elif net != 0 and (net > 0) != (new_net > 0):
+                entries = [dict(f, quantity=abs(new_net))]
+            net = new_net
+        return entries
+
+    def first_fill_time(self, symbol):
+        entries = self.open_entry_fills(symbol)
+        return entries[0]["time"] if entries else None
+
+    def average_entry_time(self, symbol):
+        """
+        Quantity-weighted mean fill time of the open position.
+        """
+        entries = [f for f in self.open_entry_fills(symbol) if f["time"]]
+        total = sum(f.get("quantity", 0) for f in entries)
+        if not total:
+            return None
+        base = entries[0]["time"]
+        offset = sum((f["time"] - base).total_seconds() * f.get("quantity", 0) for f in entries) / total
+        return base + datetime.timedelta(seconds=offset)
+
+    def average_entry_price(self, symbol):
+        entries = self.open_entry_fills(symbol)
+        total = sum(f.get("quantity", 0) for f in entries)
+        if not total:
+            return None
+        return sum(f.get("average_price", 0) * f.get("quantity", 0) for f in entries) / total
+
+_book = None
+_book_lock = threading.Lock()
+
+def get_order_book(kite=None):
+    """
+    Process-wide mirror (created and loaded on first use).
+    """
+    global _book
+    with _book_lock:
+        if _book is None:
+            _book = OrderBookMirror(kite)
+    _book.ensure_loaded()
+    return _book
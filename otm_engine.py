@@ -1,6 +1,7 @@
+import numpy as np
 import atm_engine
 import kite_data
-import position_sizing
+import lot_engine
 import expiry_engine
 
 def get_otm_strikes(atm, gap, option_type, count=5):
@@ -16,76 +17,107 @@ def get_otm_strikes(atm, gap, option_type, count=5):
             strikes.append(atm - (i * gap))
     return strikes
 
-def find_affordable_otm(capital, base_symbol, atm, expiry_data, opt_type, kite):
-    """
-    Finds the first OTM strike that allows buying at least 1 lot within capital.
-    Now uses strict 'kite' instance and 'expiry_engine' symbol builder.
-    """
-    # Determine Gap
+# ------------------------------------------------------------------------
+# SEARCH SETTINGS
+# ------------------------------------------------------------------------
+OTM_WINDOW = 10        # OTM strikes quoted per search (was a fixed 5)
+MIN_VOLUME = 5000      # Same thresholds as kite_data.valid_liquidity
+MIN_OI = 10000
+MIN_PREMIUM = 2
+
+# Ranking objectives over the candidates that pass every filter (higher = better).
+# "nearest" reproduces the old first-fit choice (closest affordable OTM strike).
+OBJECTIVES = {
+    "nearest": lambda c: -c["distance"],
+    "max_lots": lambda c: c["lots"] - c["distance"] * 1e-3,
+    "liquidity": lambda c: np.log1p(c["volume"]) + np.log1p(c["oi"]),
+    "cheapest": lambda c: -c["premium"],
+    "budget_fit": lambda c: -c["rem"]
+}
+DEFAULT_OBJECTIVE = "nearest"
+
+def get_strike_gap(base_symbol):
     # Strict Logic for Indices vs Stocks
     if "BANKNIFTY" in base_symbol or "NIFTY BANK" in base_symbol:
-        gap = 100
+        return 100
     elif "FINNIFTY" in base_symbol or "NIFTY FIN" in base_symbol:
-        gap = 50
+        return 50
     elif "NIFTY" in base_symbol and "FIN" not in base_symbol:
-        gap = 50
-    else:
-        gap = 10
-    
-    strikes = get_otm_strikes(atm, gap, opt_type, count=5)
+        return 50
+    return 10
+
+def find_affordable_otm(capital, base_symbol, atm, expiry_data, opt_type, kite, window=OTM_WINDOW, objective=DEFAULT_OBJECTIVE):
+    """
+    Finds the best OTM strike that allows buying at least 1 lot within capital.
+
+    All `window` OTM strikes (plus the deep-OTM fallback) are quoted in ONE
+    batch; liquidity, premium floor and lot affordability are applied as
+    array filters and the survivors are ranked by `objective` (a key of
+    OBJECTIVES or a callable over the candidate arrays).
+    """
+    gap = get_strike_gap(base_symbol)
+    strikes = get_otm_strikes(atm, gap, opt_type, count=window)
+    deep_strike = strikes[-1] + (gap if opt_type == "CE" else -gap)
     
-    print(f"    [OTM Search] Checking {strikes}...")
+    print(f"    [OTM Search] Checking {strikes[0]}..{strikes[-1]} ({len(strikes)} strikes, objective={objective if isinstance(objective, str) else 'custom'})...")
     
     expiry_date = expiry_data['date']
-    
-    for stk in strikes:
-        # Strict Symbol Construction
-        # NFO: prefix required for Kite LTP? 
-        # kite_data.get_ltp handles "NFO:" check, constructing it with "NFO:" is safer if kite_data expects it 
-        # or if we need it for trading.
-        # User's strict logic returned pure valid tradingsymbol "NIFTY24JAN...".
-        # kite_data.get_ltp takes "NIFTY24JAN..." or "NFO:NIFTY24JAN..."
-        # But kite.ltp expects "NFO:SYMBOL" usually? 
-        # Let's verify kite_data.get_ltp logic: "if symbol not in OPTION_TOKENS and 'NFO:' in symbol..."
-        # It implies it handles both?
-        # Standardize on passing "NFO:" + symbol to be safe for API calls.
-        
-        sym_base = expiry_engine.get_option_symbol(base_symbol, expiry_date, stk, opt_type)
-        sym = "NFO:" + sym_base
-        
-        # 🔥 6️⃣ REAL LIQUIDITY FILTER (Using kite_data helper)
-        if not kite_data.valid_liquidity(kite, sym):
-            print(f"       [Skip] Illiquid: {sym_base}")
-            continue
+    # Standardize on "NFO:" + symbol for API calls
+    syms = ["NFO:" + expiry_engine.get_option_symbol(base_symbol, expiry_date, stk, opt_type) for stk in strikes + [deep_strike]]
+
+    try:
+        quotes = kite.quote(syms) or {}
+    except Exception as e:
+        print(f"       [!] Batch quote failed: {e}")
+        quotes = {}
+
+    q = [quotes.get(sym, {}) for sym in syms[:-1]]
+    cand = {
+        "strike": np.array(strikes, dtype=float),
+        "distance": np.arange(1, len(strikes) + 1, dtype=float),
+        "premium": np.array([d.get("last_price", 0) or 0 for d in q], dtype=float),
+        "volume": np.array([d.get("volume", 0) or 0 for d in q], dtype=float),
+        "oi": np.array([d.get("oi", 0) or 0 for d in q], dtype=float)
+    }
+
+    # 🔥 6️⃣ REAL LIQUIDITY FILTER + Affordability (vectorized)
+    lot_size = lot_engine.get_lot_size(base_symbol)
+    cost_per_lot = cand["premium"] * lot_size
+    cand["lots"] = np.where(cost_per_lot > 0, np.floor(capital / np.where(cost_per_lot > 0, cost_per_lot, 1)), 0)
+    cand["cost"] = cand["lots"] * cost_per_lot
+    cand["rem"] = capital - cand["cost"]
 
-        # If valid, check Affordability
-        ltp = kite_data.get_ltp(sym, kite)
-        
-        if ltp is None: continue
+    liquid = (cand["volume"] >= MIN_VOLUME) & (cand["oi"] >= MIN_OI) & (cand["premium"] >= MIN_PREMIUM)
+    ok = liquid & (cand["lots"] >= 1)
 
-        lots, qty, cost, rem = position_sizing.calculate_lot_size(capital, ltp, base_symbol)
-        
-        if lots >= 1:
-            return {
-                "strike": stk,
-                "symbol": sym,
-                "premium": ltp,
-                "lots": lots,
-                "qty": qty,
-                "cost": cost,
-                "rem": rem,
-                "is_fallback": False
-            }
+    skipped = [syms[i].replace("NFO:", "") for i in np.flatnonzero(~liquid)]
+    if skipped:
+        print(f"       [Skip] Illiquid: {', '.join(skipped)}")
+
+    if ok.any():
+        score_fn = OBJECTIVES[objective] if isinstance(objective, str) else objective
+        score = np.where(ok, score_fn(cand), -np.inf)
+        order = [int(i) for i in np.argsort(-score, kind="stable") if ok[i]]
+        best = order[0]
+        return {
+            "strike": strikes[best],
+            "symbol": syms[best],
+            "premium": float(cand["premium"][best]),
+            "lots": int(cand["lots"][best]),
+            "qty": int(cand["lots"][best]) * lot_size,
+            "cost": float(cand["cost"][best]),
+            "rem": float(cand["rem"][best]),
+            "is_fallback": False,
+            "ranked": [{"strike": strikes[i], "symbol": syms[i], "premium": float(cand["premium"][i]),
+                        "lots": int(cand["lots"][i])} for i in order]
+        }
             
-    # Fallback to Deep OTM (Last resort)
-    deep_strike = strikes[-1] + gap
-    sym_base = expiry_engine.get_option_symbol(base_symbol, expiry_date, deep_strike, opt_type)
-    sym = "NFO:" + sym_base
-    
-    ltp = kite_data.get_ltp(sym, kite)
+    # Fallback to Deep OTM (Last resort) - already in the batch
+    ltp = quotes.get(syms[-1], {}).get("last_price")
+    if ltp is not None and ltp < MIN_PREMIUM: ltp = None
     return {
         "strike": deep_strike,
-        "symbol": sym,
+        "symbol": syms[-1],
         "premium": ltp if ltp else 0.0,
         "lots": 1, 
         "qty": 50, # Mock qty if affordable logic fails
@@ -0,0 +1,167 @@
+import threading
+import journal_store
+
+# ------------------------------------------------------------------------
+# PERFORMANCE CUBE
+# ------------------------------------------------------------------------
+# Running win/loss aggregates per (dimension, value), kept next to the
+# trades in the journal DB. Each journal row is folded in exactly once
+# (the cube remembers the last trade id it applied), so logging a trade
+# costs O(dimensions) and reading a cell is a dict lookup, however long
+# the journal gets.
+
+# Dimension name -> function(trade row) -> value (None = not recorded)
+def _text(col):
+    def value(trade):
+        v = trade.get(col)
+        return None if v is None or v == "" else str(v)
+    return value
+
+def dte_bucket(trade):
+    try:
+        dte = float(trade.get("dte"))
+    except (TypeError, ValueError):
+        return None
+    if dte < 1: return "0"
+    if dte <= 2: return "1-2"
+    if dte <= 7: return "3-7"
+    return "8+"
+
+def time_bucket(trade):
+    hhmm = str(trade.get("ts") or "")[11:16]
+    if not hhmm: return None
+    if hhmm < "10:30": return "OPEN"
+    if hhmm < "13:30": return "MID"
+    return "LATE"
+
+def dte_time_bucket(trade):
+    dte, tod = dte_bucket(trade), time_bucket(trade)
+    return f"{dte}|{tod}" if dte and tod else None
+
+DIMENSIONS = {
+    "ExpiryType": _text("expiry_type"),
+    "EntryReason": _text("entry_reason"),
+    "Regime": _text("regime"),
+    "Strategy": _text("strategy"),
+    "DTEBucket": dte_bucket,
+    "TimeBucket": time_bucket,
+    "DTETime": dte_time_bucket,
+    "ALL": lambda trade: "ALL"
+}
+
+STATS = ["count", "wins", "losses", "sum_win", "sum_loss", "pnl"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS performance_cube (
+    dim TEXT NOT NULL, value TEXT NOT NULL,
+    count INTEGER, wins INTEGER, losses INTEGER,
+    sum_win REAL, sum_loss REAL, pnl REAL,
+    PRIMARY KEY (dim, value)
+);
+"""
+
+class PerformanceCube:
+    def __init__(self, store=None):
+        self.store = store or journal_store.get_journal_store()
+        self.lock = threading.RLock()
+        self.cells = {dim: {} for dim in DIMENSIONS} # dim -> value -> [count, wins, losses, sum_win, sum_loss, pnl]
+        self.last_id = 0
+        with self.store.lock, self.store.conn:
+            self.store.conn.executescript(SCHEMA)
+        self._load()
+        self.sync()
+
+    def _load(self):
+        with self.store.lock:
+            rows = self.store.conn.execute(f"SELECT dim, value, {', '.join(STATS)} FROM performance_cube").fetchall()
+            last = self.store.conn.execute("SELECT value FROM meta WHERE key = 'cube_last_id'").fetchone()
+        for r in rows:
+            if r[0] in self.cells:
+                self.cells[r[0]][r[1]] = list(r)[2:]
+        self.last_id = int(last[0]) if last else 0
+
+    def sync(self):
+        """
+        Folds journal rows logged since the last sync into the cube and
+        persists the touched cells. Returns the number of trades applied.
+        """
+        with self.lock:
+            trades = self.store.trades_since(self.last_id)
+            if not trades:
+                return 0
+            touched = set()
+            for trade in trades:
+                touched.update(self._apply(trade))
+            self.last_id = trades[-1]["id"]
+            self._persist(touched)
+        return len(trades)
+
+    def _apply(self, trade):
+        pnl = trade.get("pnl")
+        touched = []
+        for dim, fn in DIMENSIONS.items():
+            value = fn(trade)
+            if value is None:
+                continue
+            cell = self.cells[dim].setdefault(value, [0, 0, 0, 0.0, 0.0, 0.0])
+            cell[0] += 1
+            if pnl is not None:
+                if pnl > 0:
+                    cell[1] += 1
+                    cell[3] += pnl
+                else:
+                    cell[2] += 1
+                    cell[4] += pnl
+                cell[5] += pnl
+            touched.append((dim, value))
+        return touched
+
+    def _persist(self, touched):
+        rows = [(dim, value, *self.cells[dim][value]) for dim, value in touched]
+        with self.store.lock, self.store.conn:
+            self.store.conn.executemany(
+                f"INSERT OR REPLACE INTO performance_cube (dim, value, {', '.join(STATS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.store.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('cube_last_id', ?)", (str(self.last_id),))
+
+    # --------------------------------------------------------------------
+    # READ
+    # --------------------------------------------------------------------
+    def metrics(self, dim, value):
+        """
+        {count, win_rate, avg_win, avg_loss, expectancy} for one cell, or None.
+        """
+        with self.lock:
+            cell = self.cells.get(dim, {}).get(value)
+            return _metrics(cell) if cell else None
+
+    def dimension(self, dim):
+        """
+        {value: metrics} for every value seen on one dimension.
+        """
+        with self.lock:
+            return {value: _metrics(cell) for value, cell in self.cells.get(dim, {}).items()}
+
+    def total(self):
+        return self.metrics("ALL", "ALL") or {"count": 0, "win_rate": 0, "avg_win": 0, "avg_loss": 0, "expectancy": 0}
+
+def _metrics(cell):
+    count, wins, losses, sum_win, sum_loss, pnl = cell
+    if count == 0: return None
+    return {
+        "count": count,
+        "win_rate": (wins / count) * 100,
+        "avg_win": sum_win / wins if wins else 0,
+        "avg_loss": sum_loss / losses if losses else 0,
+        "expectancy": pnl / count
+    }
+
+# Process-wide cube over the process-wide journal store
+_cube = None
+_cube_lock = threading.Lock()
+
+def get_cube():
+    global _cube
+    with _cube_lock:
+        if _cube is None:
+            _cube = PerformanceCube()
+        return _cube
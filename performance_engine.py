@@ -1,9 +1,8 @@
-import pandas as pd
-import os
-import datetime
+import journal_store
+import performance_cube
 
-JOURNAL_FILE = "trade_journal.csv"
 MIN_TRADES_FOR_INSIGHT = 20
+FEEDBACK_DIMENSIONS = ['ExpiryType', 'EntryReason', 'Regime', 'DTETime']
 
 class BehaviorFeedback:
     def __init__(self):
@@ -24,50 +23,11 @@ class BehaviorFeedback:
             "preferred_conditions": self.preferred_conditions
         }
 
-def load_journal():
-    if not os.path.exists(JOURNAL_FILE):
-        return pd.DataFrame()
-    try:
-        df = pd.read_csv(JOURNAL_FILE)
-        # Ensure numeric columns
-        cols = ['Entry', 'Exit', 'PnL']
-        for c in cols:
-            if c in df.columns:
-                df[c] = pd.to_numeric(df[c], errors='coerce')
-        return df
-    except Exception as e:
-        print(f"[Performance] Error loading journal: {e}")
-        return pd.DataFrame()
-
-def calculate_metrics(df_group):
-    count = len(df_group)
-    if count == 0: return None
-    
-    wins = df_group[df_group['PnL'] > 0]
-    losses = df_group[df_group['PnL'] <= 0]
-    
-    win_rate = (len(wins) / count) * 100
-    avg_win = wins['PnL'].mean() if not wins.empty else 0
-    avg_loss = losses['PnL'].mean() if not losses.empty else 0
-    total_pnl = df_group['PnL'].sum()
-    expectancy = total_pnl / count
-    
-    return {
-        "count": count,
-        "win_rate": win_rate,
-        "avg_win": avg_win,
-        "avg_loss": avg_loss,
-        "expectancy": expectancy
-    }
-
-def analyze_group(df, group_col, feedback_obj):
-    if group_col not in df.columns:
-        return
-
-    groups = df.groupby(group_col)
-    
-    for name, group in groups:
-        metrics = calculate_metrics(group)
+def analyze_group(cube, group_col, feedback_obj):
+    """
+    Flags mistakes / successes among the values of one cube dimension.
+    """
+    for name, metrics in cube.dimension(group_col).items():
         if not metrics or metrics['count'] < MIN_TRADES_FOR_INSIGHT:
             continue
             
@@ -92,27 +52,19 @@ def analyze_group(df, group_col, feedback_obj):
 
 def get_feedback(current_context=None):
     """
-    Main entry point. Analyzes journal and returns feedback.
-    current_context: dict (optional) with keys like 'Regime', 'Strategy' 
-                     to tailor immediate feedback (e.g. sizing).
+    Main entry point. Reads the performance cube and returns feedback.
+    current_context: dict (optional) with keys like 'Regime', 'Strategy',
+                     'DTE', 'Time' ("HH:MM") to tailor immediate feedback (e.g. sizing).
     """
-    df = load_journal()
+    cube = performance_cube.get_cube()
     feedback = BehaviorFeedback()
     
-    if df.empty or len(df) < MIN_TRADES_FOR_INSIGHT:
+    if cube.total()['count'] < MIN_TRADES_FOR_INSIGHT:
         return feedback.to_dict()
         
-    # Analyze Dimensions
-    # We assume columns might exist from parsed EntryReason or new columns
-    # For V1, we will look for specific columns if we added them.
-    # If not, we might need to extract them. 
-    # Let's try to analyze 'EntryReason' as a proxy for Strategy if 'Strategy' col missing
-    
-    analyze_group(df, 'ExpiryType', feedback)
-    analyze_group(df, 'EntryReason', feedback) # Often contains Strategy info
-    
-    if 'Regime' in df.columns:
-        analyze_group(df, 'Regime', feedback)
+    # Analyze Dimensions (EntryReason often carries the Strategy info)
+    for dim in FEEDBACK_DIMENSIONS:
+        analyze_group(cube, dim, feedback)
     
     # Calculate Impact on Current Context
     if current_context:
@@ -132,9 +84,13 @@ def get_feedback(current_context=None):
             
         # Check Expiry
         # Logic: 0 DTE after 1:30 PM
-        # This is a specific rule requested.
-        # "If 0 DTE trades after 13:30 have net negative expectancy" -> We need granular parsing.
-        # Implemented simplified version: if '0 DTE' category is a mistake overall.
+        # "If 0 DTE trades after 13:30 have net negative expectancy"
+        slot = performance_cube.dte_time_bucket({
+            "dte": current_context.get('DTE'),
+            "ts": "0000-00-00 " + str(current_context.get('Time', ""))
+        })
+        if slot and f"DTETime:{slot}" in feedback.active_mistakes:
+            penalty_count += 1
         
         # Apply Sizing Logic
         if penalty_count > 0:
@@ -0,0 +1,144 @@
+import numpy as np
+import greeks_engine
+import position_advisor_engine
+
+# ------------------------------------------------------------------------
+# PORTFOLIO RISK: NET GREEKS + SPOT x IV SCENARIO GRID
+# ------------------------------------------------------------------------
+RISK_FREE_RATE = greeks_engine.RISK_FREE_RATE
+
+# Default grid: spot -5%..+5% in 1% steps, IV -30%..+30% (relative) in 10% steps
+SPOT_SHOCKS = np.round(np.linspace(-0.05, 0.05, 11), 4)
+IV_SHOCKS = np.round(np.linspace(-0.30, 0.30, 7), 4)
+
+def build_book(snapshot):
+    """
+    Flattens a position_advisor_engine.fetch_portfolio_snapshot into
+    per-leg arrays. Futures (and legs without instrument details) are
+    modelled as delta-one on the underlying.
+    """
+    legs = [leg for leg in snapshot["legs"] if leg["position"]["quantity"] != 0]
+    n = len(legs)
+
+    book = {
+        "symbol": [leg["symbol"] for leg in legs],
+        "underlying": np.array([leg["underlying"] for leg in legs], dtype=object),
+        "qty": np.array([leg["position"]["quantity"] for leg in legs], dtype=float),
+        "S": np.array([snapshot["spots"].get(leg["underlying"], 0) for leg in legs], dtype=float),
+        "K": np.zeros(n),
+        "T": np.zeros(n),
+        "sigma": np.zeros(n),
+        "is_call": np.array(["CE" in leg["symbol"] for leg in legs], dtype=bool),
+        "is_option": np.zeros(n, dtype=bool)
+    }
+
+    for i, leg in enumerate(legs):
+        details = leg["details"]
+        if not details or "FUT" in leg["symbol"]:
+            continue
+        book["K"][i] = details.get("strike", 0) or 0
+        book["T"][i] = greeks_engine.calculate_time_to_expiry(details.get("expiry"))
+        book["sigma"][i] = leg["sigma"]
+        book["is_option"][i] = book["K"][i] > 0
+
+    return book
+
+def aggregate_greeks(book):
+    """
+    Net position greeks per underlying (quantity-weighted, full precision):
+    {underlying: {"delta", "gamma", "theta", "vega", "legs"}}
+    """
+    g = greeks_engine.get_greeks_vectorized(
+        book["S"], book["K"], book["T"], RISK_FREE_RATE, book["sigma"], book["is_call"], rounded=False
+    )
+    opt = book["is_option"]
+    qty = book["qty"]
+
+    # Futures / unknown legs: delta one, nothing else
+    delta = np.where(opt, g["delta"], 1.0) * qty
+    gamma = np.where(opt, g["gamma"], 0.0) * qty
+    theta = np.where(opt, g["theta"], 0.0) * qty
+    vega = np.where(opt, g["vega"], 0.0) * qty
+
+    result = {}
+    for u in sorted(set(book["underlying"])):
+        mask = book["underlying"] == u
+        result[u] = {
+            "delta": round(float(delta[mask].sum()), 2),
+            "gamma": round(float(gamma[mask].sum()), 4),
+            "theta": round(float(theta[mask].sum()), 2),
+            "vega": round(float(vega[mask].sum()), 2),
+            "legs": int(mask.sum())
+        }
+    return result
+
+def scenario_grid(book, spot_shocks=SPOT_SHOCKS, iv_shocks=IV_SHOCKS, horizon_days=0):
+    """
+    P&L of every leg under every (spot shock, IV shock) pair in ONE
+    broadcast pricing pass: legs x spot x iv = (L, M, N).
+    Shocks are relative (0.05 = +5% spot, 0.30 = IV x 1.3).
+    horizon_days also rolls time forward (theta over the horizon).
+
+    Returns {underlying: (M, N) P&L array, "TOTAL": (M, N)}.
+    """
+    spot_shocks = np.asarray(spot_shocks, dtype=float)
+    iv_shocks = np.asarray(iv_shocks, dtype=float)
+    opt = book["is_option"]
+
+    S = book["S"][:, None, None]
+    K = book["K"][:, None, None]
+    T = book["T"][:, None, None]
+    sigma = book["sigma"][:, None, None]
+    is_call = book["is_call"][:, None, None]
+
+    S_shock = S * (1 + spot_shocks[None, :, None])
+    sig_shock = sigma * (1 + iv_shocks[None, None, :])
+    T_shock = np.maximum(T - horizon_days / 365.0, 0.0)
+
+    base = greeks_engine.bs_price_vectorized(S, K, T, RISK_FREE_RATE, sigma, is_call)
+    shocked = greeks_engine.bs_price_vectorized(S_shock, K, T_shock, RISK_FREE_RATE, sig_shock, is_call)
+
+    # Options: model repricing. Futures: spot move one-for-one.
+    per_unit = np.where(opt[:, None, None], shocked - base, S_shock - S)
+    pnl = per_unit * book["qty"][:, None, None]
+
+    grid = {}
+    for u in sorted(set(book["underlying"])):
+        grid[u] = pnl[book["underlying"] == u].sum(axis=0)
+    grid["TOTAL"] = pnl.sum(axis=0) if len(pnl) else np.zeros((len(spot_shocks), len(iv_shocks)))
+    return grid
+
+def get_portfolio_risk(positions, kite=None, spot_shocks=SPOT_SHOCKS, iv_shocks=IV_SHOCKS, horizon_days=0, snapshot=None):
+    """
+    Net greeks per underlying + scenario P&L grid for a list of positions.
+    Uses one batched snapshot (no regime download) unless one is passed in.
+    """
+    positions = [p for p in positions if position_advisor_engine._is_derivative(p['tradingsymbol'])]
+    if snapshot is None:
+        snapshot = position_advisor_engine.fetch_portfolio_snapshot(positions, kite, with_regime=False)
+
+    book = build_book(snapshot)
+    return {
+        "greeks": aggregate_greeks(book),
+        "grid": scenario_grid(book, spot_shocks, iv_shocks, horizon_days),
+        "spot_shocks": list(np.asarray(spot_shocks, dtype=float)),
+        "iv_shocks": list(np.asarray(iv_shocks, dtype=float))
+    }
+
+def format_risk_report(risk, grid_key="TOTAL"):
+    """
+    Text block: net greeks per underlying + the P&L grid (rows = spot, cols = IV).
+    """
+    lines = ["📐 **Portfolio Risk**"]
+    for u, g in risk["greeks"].items():
+        lines.append(f"   {u}: Δ {g['delta']:.1f} | Γ {g['gamma']:.4f} | Θ {g['theta']:.0f}/day | V {g['vega']:.0f}/1% ({g['legs']} legs)")
+
+    grid = risk["grid"].get(grid_key)
+    if grid is None or not risk["greeks"]:
+        return "\n".join(lines)
+
+    lines.append(f"\n   P&L grid ({grid_key}) - rows: spot, cols: IV")
+    lines.append("   " + "Spot\\IV".rjust(8) + "".join(f"{iv:+.0%}".rjust(9) for iv in risk["iv_shocks"]))
+    for i, ds in enumerate(risk["spot_shocks"]):
+        lines.append("   " + f"{ds:+.0%}".rjust(8) + "".join(f"{v:9.0f}" for v in grid[i]))
+    return "\n".join(lines)
@@ -3,11 +3,36 @@ import market_regime_engine
 import oi_analysis_engine
 import datetime
 import greeks_engine
+import trailing_sl_engine
+import telemetry
+import profiler
+from scan_context import ScanKite
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 # ------------------------------------------------------------------------
 # CORE ADVISORY LOGIC
 # ------------------------------------------------------------------------
 
+def _underlying_of(symbol):
+    # Check underlying (NIFTY/BANKNIFTY) - simple heuristic
+    underlying = "NIFTY"
+    if "BANKNIFTY" in symbol: underlying = "BANKNIFTY"
+    elif "FINNIFTY" in symbol: underlying = "FINNIFTY"
+    return underlying
+
+def _data_error(symbol):
+    return {
+        "symbol": symbol,
+        "decision": "DATA_ERROR",
+        "confidence": "LOW",
+        "pnl_pct": 0.0,
+        "primary_reason": "Live Price Unavailable",
+        "supporting_factors": [],
+        "risk_flags": ["Could not fetch LTP."],
+        "ltp": 0
+    }
+
 def analyze_position(position_data, kite=None):
     """
     Analyzes a SINGLE position and returns an advisory dict.
@@ -20,48 +45,22 @@ def analyze_position(position_data, kite=None):
         "average_price": 100.0,
         "product": "NRML"
     }
+
+    For more than one position use analyze_portfolio (batched fetches).
     """
     if kite is None:
         kite = kite_data.get_kite()
 
     symbol = position_data["tradingsymbol"]
-    qty = position_data["quantity"]
-    avg_price = position_data["average_price"]
-    
-    # 1. basic Info
-    is_long = qty > 0
-    qty_abs = abs(qty)
-    
-    # Check underlying (NIFTY/BANKNIFTY) - simple heuristic
-    underlying = "NIFTY"
-    if "BANKNIFTY" in symbol: underlying = "BANKNIFTY"
-    elif "FINNIFTY" in symbol: underlying = "FINNIFTY"
-    
-    # Check Option Type
-    is_ce = "CE" in symbol
-    is_pe = "PE" in symbol
-    option_type = "CE" if is_ce else "PE"
+    underlying = _underlying_of(symbol)
+    option_type = "CE" if "CE" in symbol else "PE"
     
     # 2. Fetch Live Data
     ltp = kite_data.get_ltp(symbol, kite)
     
     # Handle Data Fetch Breakdown
     if ltp is None or ltp == 0:
-        return {
-        "symbol": symbol,
-        "decision": "DATA_ERROR",
-        "confidence": "LOW",
-        "pnl_pct": 0.0,
-        "primary_reason": "Live Price Unavailable",
-        "supporting_factors": [],
-        "risk_flags": ["Could not fetch LTP."],
-        "ltp": 0
-    }
-
-    pnl = (ltp - avg_price) * qty
-    pnl_pct = 0
-    if avg_price > 0:
-        pnl_pct = ((ltp - avg_price) / avg_price) * 100 if is_long else ((avg_price - ltp) / avg_price) * 100
+        return _data_error(symbol)
 
     # 3. Market Context & Greeks
     regime = market_regime_engine.get_market_regime(underlying)  # TRENDING_UP, TRENDING_DOWN, SIDEWAYS
@@ -84,14 +83,129 @@ def analyze_position(position_data, kite=None):
         
         greeks = greeks_engine.get_greeks(S, K, T, 0.07, sigma, option_type)
         
-    # 4. Underlying Trend Check
-    u_ltp = kite_data.get_ltp(underlying, kite)
-    # oi_signal = oi_analysis_engine.interpret_oi_signal(..., ...) 
-    # For simplicity, we compare Regime.
+    return _build_advice(position_data, ltp, regime, greeks)
+
+# ------------------------------------------------------------------------
+# BATCHED PORTFOLIO ANALYSIS
+# ------------------------------------------------------------------------
+def _is_derivative(symbol):
+    return "CE" in symbol or "PE" in symbol or "FUT" in symbol
+
+@telemetry.traced()
+def fetch_portfolio_snapshot(positions, kite=None, with_regime=True):
+    """
+    Fetches everything a book needs in one pass:
+    - ONE batched quote for every leg and every underlying spot
+    - the regime once per underlying (concurrently; skipped if not with_regime)
+    - IV and greeks for all legs in one vectorized call
+
+    Returns {"legs": [...], "regimes": {...}, "spots": {...}} where each leg is
+    {"position", "symbol", "underlying", "ltp", "details", "iv", "greeks"}
+    (ltp None = unavailable, greeks {} = no instrument details).
+    """
+    if kite is None:
+        kite = kite_data.get_kite()
+
+    kite_data.ensure_tokens_loaded(kite)
+
+    underlyings = sorted({_underlying_of(p['tradingsymbol']) for p in positions})
+    quote_syms = ["NFO:" + p['tradingsymbol'] for p in positions]
+    quote_syms += [kite_data.INDEX_QUOTE_SYMBOLS[u] for u in underlyings]
+    snapshot = kite_data.get_quote_snapshot(kite, quote_syms)
+
+    spots = {}
+    for u in underlyings:
+        spots[u] = snapshot.get(kite_data.INDEX_QUOTE_SYMBOLS[u], {}).get("last_price", 0) or 0
+
+    regimes = {}
+    if underlyings and with_regime:
+        with ThreadPoolExecutor(max_workers=len(underlyings)) as pool:
+            regimes = dict(zip(underlyings, pool.map(telemetry.bind(market_regime_engine.get_market_regime), underlyings)))
+
+    legs = []
+    for pos in positions:
+        symbol = pos['tradingsymbol']
+        quote = snapshot.get("NFO:" + symbol, {})
+        ltp = quote.get("last_price")
+        # Same rule as kite_data.get_ltp: sub-2 premiums are stale/invalid
+        if ltp is None or ltp < 2: ltp = None
+        legs.append({
+            "position": pos,
+            "symbol": symbol,
+            "underlying": _underlying_of(symbol),
+            "ltp": ltp,
+            "details": kite_data.get_instrument_detail(symbol),
+            "quote_iv": quote.get("iv") or 0,
+            "iv": 0,
+            "sigma": 0,
+            "greeks": {}
+        })
+
+    # Vectorized IV + greeks for every leg with instrument details
+    priced = [leg for leg in legs if leg["details"]]
+    if priced:
+        S = np.array([spots[leg["underlying"]] for leg in priced], dtype=float)
+        K = np.array([leg["details"].get("strike", 0) or 0 for leg in priced], dtype=float)
+        T = np.array([greeks_engine.calculate_time_to_expiry(leg["details"].get("expiry")) for leg in priced])
+        ltp = np.array([leg["ltp"] or 0 for leg in priced], dtype=float)
+        is_call = np.array(["CE" in leg["symbol"] for leg in priced])
+        quote_iv = np.array([leg["quote_iv"] for leg in priced], dtype=float)
+
+        # Quote IV when the API has it, else solve it from the LTP
+        solved_iv = greeks_engine.get_implied_volatility_vectorized(ltp, S, K, T, 0.07, is_call)
+        iv = np.where(quote_iv > 0, quote_iv, solved_iv)
+        sigma = np.where(iv > 0, iv / 100.0, 0.20) # Default fallback 20%
+
+        g = greeks_engine.get_greeks_vectorized(S, K, T, 0.07, sigma, is_call)
+        for i, leg in enumerate(priced):
+            leg["iv"] = float(iv[i])
+            leg["sigma"] = float(sigma[i])
+            leg["greeks"] = {name: float(values[i]) for name, values in g.items()}
+
+    return {"legs": legs, "regimes": regimes, "spots": spots, "underlyings": underlyings}
+
+@telemetry.traced()
+def analyze_portfolio(positions, kite=None, snapshot=None):
+    """
+    Batched analyze_position for a whole book: same advisory dicts,
+    in the same order, from a single fetch_portfolio_snapshot
+    (pass snapshot to reuse one already fetched).
+    """
+    positions = [p for p in positions if _is_derivative(p['tradingsymbol'])]
+    if not positions:
+        return []
+
+    snap = snapshot or fetch_portfolio_snapshot(positions, kite)
+    advices = []
+    for leg in snap["legs"]:
+        if leg["ltp"] is None:
+            advices.append(_data_error(leg["symbol"]))
+            continue
+        regime = snap["regimes"].get(leg["underlying"], "SIDEWAYS")
+        advices.append(_build_advice(leg["position"], leg["ltp"], regime, leg["greeks"]))
+    return advices
+
+def _build_advice(position_data, ltp, regime, greeks):
+    """
+    Pure decision logic shared by analyze_position and analyze_portfolio.
+    """
+    symbol = position_data["tradingsymbol"]
+    qty = position_data["quantity"]
+    avg_price = position_data["average_price"]
     
-    # 5. Volatility / IV
-    # iv = kite_data.get_iv_value(kite, symbol)
+    # 1. basic Info
+    is_long = qty > 0
+    qty_abs = abs(qty)
     
+    # Check Option Type
+    is_ce = "CE" in symbol
+    is_pe = "PE" in symbol
+
+    pnl = (ltp - avg_price) * qty
+    pnl_pct = 0
+    if avg_price > 0:
+        pnl_pct = ((ltp - avg_price) / avg_price) * 100 if is_long else ((avg_price - ltp) / avg_price) * 100
+
     # --- DECISION LOGIC ---
     decision = "HOLD"
     confidence = "MEDIUM"
@@ -190,28 +304,56 @@ def analyze_position(position_data, kite=None):
         
     return result
 
+def update_trailing_stops(snapshot):
+    """
+    Ratchets the persistent trailing stops of every long leg in the
+    snapshot in one batch update, drops closed positions and checkpoints.
+    The snapshot may cover only some positions: a stop is dropped only
+    when its symbol is in it and no longer long, never for being absent.
+    Returns {symbol: {"sl", "hit"}}.
+    """
+    book = trailing_sl_engine.get_trailing_book()
+    longs = {leg["symbol"]: leg for leg in snapshot["legs"] if leg["position"]["quantity"] > 0}
+    closed = {leg["symbol"] for leg in snapshot["legs"] if leg["position"]["quantity"] <= 0}
+
+    for symbol in [s for s in book.symbols if s in closed]:
+        book.remove(symbol)
+    for symbol, leg in longs.items():
+        book.add(symbol, leg["position"].get("average_price", 0) or 0)
+
+    hits = set(book.update({s: leg["ltp"] for s, leg in longs.items() if leg["ltp"]}))
+    book.checkpoint()
+    return {s: {"sl": book.get(s)["sl"], "hit": s in hits} for s in longs}
+
 def get_advice_report(kite=None, positions=None):
     """
     Generates a full text report for all positions.
     """
+    # One scan id for the report (telemetry spans, API timings, profiles)
+    with telemetry.scan("advice") as scan_id, profiler.profile_scan(scan_id):
+        return _advice_report(kite, positions)
+
+def _advice_report(kite, positions):
     if not positions:
         return "No open positions to analyze."
         
     report = ["🛡️ **Position Advisor Report**"]
+    # One cached, rate-limited client for the whole report
+    kite = kite or kite_data.get_kite()
+    if not isinstance(kite, ScanKite):
+        kite = ScanKite(kite)
     
-    for pos in positions:
-        # Filter for Options/Futures only (ignore equity holdings for now if mixed)
-        if "CE" not in pos['tradingsymbol'] and "PE" not in pos['tradingsymbol'] and "FUT" not in pos['tradingsymbol']:
-             continue
-             
-        advice = analyze_position(pos, kite)
-        
+    # Filter for Options/Futures only (ignore equity holdings for now if mixed)
+    positions = [p for p in positions if _is_derivative(p['tradingsymbol'])]
+    snapshot = fetch_portfolio_snapshot(positions, kite) if positions else None
+    stops = update_trailing_stops(snapshot) if snapshot else {}
+    for advice in analyze_portfolio(positions, kite, snapshot=snapshot):
         icon = "🟢" if advice['decision'] == "HOLD" else "Mj" if advice['decision'] == "CAUTION" else "🔴"
         if advice['decision'] == "CAUTION": icon = "⚠️"
         if advice['decision'] == "DATA_ERROR": icon = "❓"
         
         block = [
-            f"{icon} **{advice['decision']}** | {pos['tradingsymbol']}",
+            f"{icon} **{advice['decision']}** | {advice['symbol']}",
             f"   PnL: {advice['pnl_pct']}% | Conf: {advice['confidence']}",
             f"   Reason: {advice['primary_reason']}"
         ]
@@ -220,6 +362,10 @@ def get_advice_report(kite=None, positions=None):
         if "greeks" in advice:
              g = advice["greeks"]
              block.append(f"   📊 Greeks: Δ {g['delta']:.2f} | Θ {g['theta']:.2f}")
+
+        stop = stops.get(advice['symbol'])
+        if stop:
+            block.append(f"   🪜 Trail SL: {stop['sl']:.2f}" + (" (PRICE BELOW STOP - EXIT)" if stop['hit'] else ""))
              
         if advice['risk_flags']:
             # Make risks cleaner
@@ -227,6 +373,12 @@ def get_advice_report(kite=None, positions=None):
                 block.append(f"   🚩 {r}")
             
         report.append("\n".join(block))
+
+    # Net greeks per underlying from the same snapshot (no extra fetch)
+    if snapshot:
+        import portfolio_risk
+        risk = portfolio_risk.get_portfolio_risk(positions, snapshot=snapshot)
+        report.append(portfolio_risk.format_risk_report(risk))
         
     return "\n\n".join(report)
 
@@ -0,0 +1,224 @@
+import threading
+import time
+from stream_engine import stream_bot
+from trigger_book import TriggerBook, ABOVE, BELOW
+import trailing_sl_engine
+
+# ------------------------------------------------------------------------
+# EVENT-DRIVEN POSITION MONITOR
+# ------------------------------------------------------------------------
+# Legs are subscribed to the tick stream; their stop-loss, target and
+# trailing-step levels live in a TriggerBook, so a tick only touches the
+# triggers it crossed and fires on_exit from the tick thread. Legs that
+# are ticking live need no REST polling; stale() lists the ones that do
+# (no tick yet, ticks stopped, or no stream at all). Trailing stops are
+# kept in trailing_sl_engine's TrailingStopBook and checkpointed, so a
+# re-watch after a restart resumes from the persisted stop.
+
+STALE_TICK_SECONDS = 3 # a leg without a tick for this long is polled over REST
+
+def _token_key(token):
+    """
+    KiteTicker ticks carry integer instrument tokens; callers often hold strings.
+    """
+    try:
+        return int(token)
+    except (TypeError, ValueError):
+        return token
+
+class PositionMonitor:
+    def __init__(self, stream=None, on_exit=None, book=None, stops=None):
+        self.stream = stream or stream_bot
+        self.on_exit = on_exit # callback(symbol, leg, ltp, reason)
+        self.book = book or TriggerBook()
+        self._stop_book = stops # TrailingStopBook (process-wide one on first use)
+        self.lock = threading.Lock()
+        self.legs = {}        # symbol -> leg dict
+        self.by_token = {}    # instrument_token -> set(symbol)
+        self.last_price = {}  # instrument_token -> (ltp, time)
+
+    def watch(self, symbol, token, entry, sl, target, qty, side="SELL", trailing=False, **extra):
+        """
+        Starts monitoring one leg. For SELL legs the stop is above entry and
+        the target below; for BUY legs the other way round.
+        trailing (BUY legs) arms trailing_sl_engine.TRAIL_STEPS: crossing a
+        step moves the stop up in place. Its stop is registered in the
+        trailing stop book; if the book already holds a stop for this
+        symbol and entry (restart), the higher of the two is used.
+        """
+        key = _token_key(token)
+        short = side == "SELL"
+        trailing = trailing and not short
+        if trailing:
+            sl = self._restore_stop(symbol, entry, sl)
+        leg = dict(extra, symbol=symbol, token=token, entry=entry, sl=sl, target=target,
+                   qty=qty, side=side, trailing=trailing, triggers={})
+
+        # Same lock as on_tick: a tick sees either the old leg with its own
+        # triggers or the new leg with its triggers, never a mix
+        with self.lock:
+            self._detach(symbol, keep_stop=trailing)
+            leg['triggers']['SL'] = self.book.add(key, sl, ABOVE if short else BELOW, (symbol, "SL"))
+            leg['triggers']['TARGET'] = self.book.add(key, target, BELOW if short else ABOVE, (symbol, "TARGET"))
+            if trailing:
+                for move_pct, _ in trailing_sl_engine.TRAIL_STEPS:
+                    leg['triggers'][f"TRAIL_{move_pct}"] = self.book.add(key, entry * move_pct, ABOVE, (symbol, "TRAIL"))
+            self.legs[symbol] = leg
+            first = key not in self.by_token
+            self.by_token.setdefault(key, set()).add(symbol)
+        if first:
+            self.stream.add_tick_listener(key, self.on_tick)
+        if trailing:
+            self.stops().checkpoint()
+        return leg
+
+    def stops(self):
+        if self._stop_book is None:
+            self._stop_book = trailing_sl_engine.get_trailing_book()
+        return self._stop_book
+
+    def _restore_stop(self, symbol, entry, sl):
+        """
+        Registers a trailing leg in the stop book and returns the stop to arm.
+        A persisted row for another entry belongs to an older position and
+        is replaced.
+        """
+        stops = self.stops()
+        state = stops.get(symbol)
+        if state is not None and abs(state['entry'] - entry) > 1e-6 * max(abs(entry), 1):
+            stops.remove(symbol)
+            state = None
+        if state is None:
+            stops.add(symbol, entry, sl)
+            return sl
+        return max(sl, state['sl'])
+
+    def unwatch(self, symbol):
+        with self.lock:
+            leg = self._detach(symbol)
+        if leg and leg['trailing']:
+            self.stops().checkpoint()
+        return leg
+
+    def _detach(self, symbol, keep_stop=False):
+        """
+        Removes a leg, cancels its triggers and drops the tick listener if
+        no other leg shares the token (caller holds the lock). A trailing
+        leg's row leaves the stop book unless keep_stop (re-watch).
+        Returns the leg.
+        """
+        leg = self.legs.pop(symbol, None)
+        if leg is None:
+            return None
+        for tid in leg['triggers'].values():
+            self.book.cancel(tid)
+        if leg['trailing'] and not keep_stop:
+            self.stops().remove(symbol)
+        key = _token_key(leg['token'])
+        symbols = self.by_token.get(key, set())
+        symbols.discard(symbol)
+        if not symbols:
+            self.by_token.pop(key, None)
+            # Never blocks on this monitor: the stream calls listeners outside its lock
+            self.stream.remove_tick_listener(key, self.on_tick)
+        return leg
+
+    def update_levels(self, symbol, sl=None, target=None):
+        """
+        Moves a leg's SL / target triggers in place.
+        """
+        with self.lock:
+            leg = self.legs.get(symbol)
+            if not leg:
+                return
+            if sl is not None:
+                leg['sl'] = sl
+                self.book.move(leg['triggers']['SL'], sl)
+            if target is not None:
+                leg['target'] = target
+                self.book.move(leg['triggers']['TARGET'], target)
+
+    def on_tick(self, tick):
+        """
+        Stream callback: only the triggers crossed by this price are touched.
+        """
+        ltp = tick.get('last_price')
+        if not ltp:
+            return
+        key = tick['instrument_token']
+        exits = []
+        trailed = False
+        with self.lock:
+            self.last_price[key] = (ltp, time.time())
+            for trig in self.book.on_price(key, ltp):
+                symbol, kind = trig['payload']
+                leg = self.legs.get(symbol)
+                if leg is None:
+                    continue # Already exited by an earlier trigger of this tick
+                if kind == "TRAIL":
+                    # The stop book ratchets the stop; the SL trigger follows it
+                    stops = self.stops()
+                    stops.update({symbol: ltp})
+                    state = stops.get(symbol)
+                    if state and state['sl'] > leg['sl']:
+                        leg['sl'] = state['sl']
+                        self.book.move(leg['triggers']['SL'], state['sl'])
+                    trailed = True
+                else:
+                    # Detach under the lock, so the leg fires once and a
+                    # re-watch racing this exit keeps its own triggers
+                    exits.append((symbol, kind, self._detach(symbol)))
+
+        # Checkpoint and exit callbacks run outside the lock
+        if trailed or any(leg['trailing'] for _, _, leg in exits):
+            self.stops().checkpoint()
+        for symbol, reason, leg in exits:
+            if self.on_exit:
+                leg['ltp'] = ltp
+                self.on_exit(symbol, leg, ltp, reason)
+
+    def on_price(self, symbol, ltp):
+        """
+        Feeds a price obtained elsewhere (e.g. a REST poll before the
+        first tick) through the same triggers.
+        """
+        with self.lock:
+            leg = self.legs.get(symbol)
+        if leg:
+            self.on_tick({'instrument_token': _token_key(leg['token']), 'last_price': ltp})
+
+    def ltp(self, token):
+        """
+        Last tick price for token (None before the first tick).
+        """
+        with self.lock:
+            last = self.last_price.get(_token_key(token))
+        return last[0] if last else None
+
+    def stale(self, max_age=STALE_TICK_SECONDS):
+        """
+        Legs not ticking live: every leg while the stream is disconnected,
+        else those without a tick in the last max_age seconds.
+        """
+        live = getattr(self.stream, "is_connected", False)
+        cutoff = time.time() - max_age
+        with self.lock:
+            return [dict(leg) for leg in self.legs.values()
+                    if not live or self.last_price.get(_token_key(leg['token']), (None, 0))[1] < cutoff]
+
+    def mtm(self):
+        """
+        Mark-to-market of the watched legs at their last tick price.
+        """
+        total = 0
+        with self.lock:
+            for leg in self.legs.values():
+                last = self.last_price.get(_token_key(leg['token']))
+                if last is None: continue
+                sign = 1 if leg['side'] == "SELL" else -1
+                total += (leg['entry'] - last[0]) * leg['qty'] * sign
+        return total
+
+    def clear(self):
+        for symbol in list(self.legs):
+            self.unwatch(symbol)
@@ -0,0 +1,188 @@
+import os
+import sys
+import json
+import time
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+# ------------------------------------------------------------------------
+# ON-DEMAND SAMPLING PROFILER
+# ------------------------------------------------------------------------
+# arm(n) profiles the next n scans (suggest_trade / get_advice_report).
+# While a scan runs, a daemon thread snapshots sys._current_frames()
+# every PROFILE_INTERVAL and keeps the stacks of the scan thread and of
+# any thread started during the scan (candidate / advisor pools). Stacks
+# that never enter this package's code (idle pool workers, the ticker,
+# the Telegram sender) are dropped. Output is one file per scan id:
+# collapsed stacks (flamegraph.pl, speedscope, inferno) or a speedscope
+# JSON with one sampled profile per thread.
+
+PROFILE_INTERVAL = 0.005 # seconds between samples
+PROFILE_DIR = "profiles"
+FORMATS = ("collapsed", "speedscope")
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class SamplingProfiler:
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.frames = []            # frame index -> (name, file, line)
+        self._frame_ids = {}        # code object -> frame index
+        self.timeline = defaultdict(list) # thread id -> [stack (tuple of frame indices), ...]
+        self.thread_names = {}
+        self.started = None
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.target = threading.get_ident()
+        # Threads alive before the scan are not part of it
+        self.excluded = {t.ident for t in threading.enumerate()} - {self.target}
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="SamplingProfiler", daemon=True)
+        self._thread.start()
+        self.excluded.add(self._thread.ident)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        for tid, frame in sys._current_frames().items():
+            if tid in self.excluded:
+                continue
+            stack = []
+            in_package = False
+            while frame is not None:
+                code = frame.f_code
+                stack.append(self._frame_id(code))
+                in_package = in_package or code.co_filename.startswith(PACKAGE_DIR)
+                frame = frame.f_back
+            if not in_package:
+                continue
+            if tid not in self.thread_names:
+                self.thread_names[tid] = next((t.name for t in threading.enumerate() if t.ident == tid), str(tid))
+            stack.reverse() # root first
+            self.timeline[tid].append(tuple(stack))
+
+    def _frame_id(self, code):
+        fid = self._frame_ids.get(code)
+        if fid is None:
+            fid = self._frame_ids[code] = len(self.frames)
+            self.frames.append((code.co_name, code.co_filename, code.co_firstlineno))
+        return fid
+
+    # --------------------------------------------------------------------
+    # OUTPUT
+    # --------------------------------------------------------------------
+    def sample_count(self):
+        return sum(len(t) for t in self.timeline.values())
+
+    def _label(self, fid):
+        name, filename, line = self.frames[fid]
+        return f"{name} ({os.path.basename(filename)}:{line})".replace(";", ":")
+
+    def collapsed(self):
+        """
+        Brendan Gregg collapsed stacks: "frame;frame;frame count" per line.
+        """
+        counts = Counter()
+        for stacks in self.timeline.values():
+            counts.update(stacks)
+        return "".join(f"{';'.join(self._label(f) for f in stack)} {n}\n" for stack, n in counts.most_common())
+
+    def speedscope(self, name):
+        """
+        speedscope file format: shared frames, one sampled profile per thread.
+        """
+        weight = round(self.interval * 1000, 3)
+        profiles = []
+        for tid, stacks in self.timeline.items():
+            profiles.append({
+                "type": "sampled",
+                "name": self.thread_names.get(tid, str(tid)),
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(len(stacks) * weight, 3),
+                "samples": [list(s) for s in stacks],
+                "weights": [weight] * len(stacks)
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "profiler.py",
+            "shared": {"frames": [{"name": n, "file": f, "line": l} for n, f, l in self.frames]},
+            "profiles": profiles
+        }
+
+    def write(self, name, fmt="collapsed", directory=PROFILE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        if fmt == "speedscope":
+            path = os.path.join(directory, f"{name}.speedscope.json")
+            with open(path, "w") as f:
+                json.dump(self.speedscope(name), f)
+        else:
+            path = os.path.join(directory, f"{name}.collapsed")
+            with open(path, "w") as f:
+                f.write(self.collapsed())
+        return path
+
+# ------------------------------------------------------------------------
+# ARMING
+# ------------------------------------------------------------------------
+_lock = threading.Lock()
+_armed = {"remaining": 0, "format": "collapsed", "directory": PROFILE_DIR, "interval": PROFILE_INTERVAL}
+_last_paths = []
+
+def arm(scans=1, fmt="collapsed", directory=PROFILE_DIR, interval=PROFILE_INTERVAL):
+    """
+    Profiles the next `scans` scans. Returns the armed settings.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown profile format {fmt!r} (use one of {', '.join(FORMATS)})")
+    with _lock:
+        _armed.update(remaining=max(int(scans), 0), format=fmt, directory=directory, interval=interval)
+        return dict(_armed)
+
+def disarm():
+    with _lock:
+        _armed["remaining"] = 0
+
+def status():
+    with _lock:
+        return dict(_armed, last_paths=list(_last_paths))
+
+def _take():
+    with _lock:
+        if _armed["remaining"] <= 0:
+            return None
+        _armed["remaining"] -= 1
+        return dict(_armed)
+
+@contextmanager
+def profile_scan(scan_id):
+    """
+    Profiles the block if a profile is armed (consuming one); else no-op.
+    """
+    settings = _take()
+    if settings is None:
+        yield None
+        return
+    prof = SamplingProfiler(settings["interval"])
+    prof.start()
+    try:
+        yield prof
+    finally:
+        prof.stop()
+        path = prof.write(scan_id or f"scan-{int(time.time())}", settings["format"], settings["directory"])
+        with _lock:
+            _last_paths.append(path)
+            del _last_paths[:-20]
+        print(f"[Profiler] {prof.sample_count()} samples over {prof.elapsed:.2f}s -> {path}")
@@ -0,0 +1,209 @@
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from collections import deque
+
+# ------------------------------------------------------------------------
+# PER-ENDPOINT RATE LIMITER
+# ------------------------------------------------------------------------
+# Kite Connect limits each endpoint class separately, so each gets its own
+# token bucket: a burst of chain quotes can drain the quote bucket but
+# never touches the one stop-loss orders draw from.
+#
+# Inside a bucket, waiters are served strictly by priority (then arrival).
+# Nobody sleeps while holding the lock: a waiter computes how long until
+# its turn, releases the lock and waits (Condition.wait for threads,
+# asyncio.sleep for coroutines).
+
+QUOTE = "quote"
+HISTORICAL = "historical"
+ORDERS = "orders"
+OTHERS = "others"
+
+# (requests per second, burst). Kite: quote 1/s, historical 3/s, orders 10/s, rest 10/s.
+ENDPOINT_LIMITS = {
+    QUOTE: (1.0, 1),
+    HISTORICAL: (3.0, 3),
+    ORDERS: (9.0, 9), # 1 below the exchange cap, as before
+    OTHERS: (9.0, 9)
+}
+
+# Lower value = served first
+PRIORITY_EXIT = 0       # stop-loss / target / square-off orders
+PRIORITY_ORDER = 1      # entries, modifications
+PRIORITY_NORMAL = 5     # positions, margins, order book sync
+PRIORITY_ANALYTICS = 9  # scans, chain quotes, historical downloads
+
+WAIT_SAMPLES = 1000 # wait times kept per bucket for percentiles
+
+class TokenBucket:
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.cond = threading.Condition(threading.Lock())
+        self.waiters = [] # heap of (priority, seq)
+        self._seq = itertools.count()
+        # Metrics
+        self.granted = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.samples = deque(maxlen=WAIT_SAMPLES)
+        self.by_priority = {}
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _try(self, ticket):
+        """
+        Caller holds the lock. Grants a token to ticket if it heads the
+        queue and one is available; else returns seconds to wait.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if self.waiters[0] == ticket and self.tokens >= 1:
+            heapq.heappop(self.waiters)
+            self.tokens -= 1
+            self.cond.notify_all() # next waiter becomes head
+            return 0.0
+        if self.waiters[0] != ticket:
+            # Not our turn: the head's grant will wake us; re-check periodically
+            return max((1 - self.tokens) / self.rate, 0) + 1.0 / self.rate
+        return (1 - self.tokens) / self.rate
+
+    def _enqueue(self, priority):
+        ticket = (priority, next(self._seq))
+        with self.cond:
+            heapq.heappush(self.waiters, ticket)
+        return ticket
+
+    def _abandon(self, ticket):
+        with self.cond:
+            if ticket in self.waiters:
+                self.waiters.remove(ticket)
+                heapq.heapify(self.waiters)
+                self.cond.notify_all()
+
+    def _record(self, priority, wait):
+        with self.cond:
+            self.granted += 1
+            if wait > 0.0005:
+                self.waited += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.samples.append(wait)
+            stats = self.by_priority.setdefault(priority, [0, 0.0])
+            stats[0] += 1
+            stats[1] += wait
+
+    def acquire(self, priority=PRIORITY_NORMAL, timeout=None):
+        """
+        Blocks the calling thread until a token is granted. Returns the
+        seconds waited, or None if timeout expired first.
+        """
+        start = time.monotonic()
+        ticket = self._enqueue(priority)
+        wait = None
+        try:
+            with self.cond:
+                while True:
+                    wait = self._try(ticket)
+                    if wait == 0:
+                        break
+                    if timeout is not None:
+                        left = timeout - (time.monotonic() - start)
+                        if left <= 0:
+                            break
+                        wait = min(wait, left)
+                    self.cond.wait(wait) # releases the lock while waiting
+        finally:
+            # Timed out or interrupted (e.g. KeyboardInterrupt in wait):
+            # a dead ticket left at the head would stall every waiter behind it
+            if wait != 0:
+                self._abandon(ticket)
+        if wait != 0:
+            return None
+        waited = time.monotonic() - start
+        self._record(priority, waited)
+        return waited
+
+    async def acquire_async(self, priority=PRIORITY_NORMAL):
+        """
+        asyncio version of acquire: same queue, yields to the loop while waiting.
+        """
+        start = time.monotonic()
+        ticket = self._enqueue(priority)
+        try:
+            while True:
+                with self.cond:
+                    wait = self._try(ticket)
+                if wait == 0:
+                    break
+                await asyncio.sleep(wait)
+        except BaseException:
+            self._abandon(ticket)
+            raise
+        waited = time.monotonic() - start
+        self._record(priority, waited)
+        return waited
+
+    def metrics(self):
+        with self.cond:
+            samples = sorted(self.samples)
+            def pct(p):
+                return round(samples[min(int(p * len(samples)), len(samples) - 1)] * 1000, 2) if samples else 0.0
+            return {
+                "granted": self.granted,
+                "waited": self.waited,
+                "queued": len(self.waiters),
+                "avg_wait_ms": round(self.total_wait / self.granted * 1000, 2) if self.granted else 0.0,
+                "p50_wait_ms": pct(0.50),
+                "p95_wait_ms": pct(0.95),
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+                "by_priority": {p: {"granted": n, "avg_wait_ms": round(w / n * 1000, 2)} for p, (n, w) in sorted(self.by_priority.items())}
+            }
+
+class RateLimiter:
+    """
+    One TokenBucket per Kite endpoint class.
+    """
+    def __init__(self, limits=None):
+        self.buckets = {name: TokenBucket(name, rate, burst) for name, (rate, burst) in (limits or ENDPOINT_LIMITS).items()}
+
+    def bucket(self, endpoint):
+        return self.buckets.get(endpoint) or self.buckets[OTHERS]
+
+    def acquire(self, endpoint, priority=PRIORITY_NORMAL, timeout=None):
+        return self.bucket(endpoint).acquire(priority, timeout)
+
+    async def acquire_async(self, endpoint, priority=PRIORITY_NORMAL):
+        return await self.bucket(endpoint).acquire_async(priority)
+
+    def metrics(self):
+        return {name: b.metrics() for name, b in self.buckets.items()}
+
+    def format_metrics(self):
+        lines = ["⏱️ **Rate Limiter**"]
+        for name, m in self.metrics().items():
+            lines.append(f"   {name}: {m['granted']} calls | waited {m['waited']} | "
+                         f"avg {m['avg_wait_ms']}ms | p95 {m['p95_wait_ms']}ms | max {m['max_wait_ms']}ms | queued {m['queued']}")
+        return "\n".join(lines)
+
+# KiteConnect method -> endpoint class
+METHOD_ENDPOINTS = {
+    "quote": QUOTE, "ltp": QUOTE, "ohlc": QUOTE,
+    "historical_data": HISTORICAL,
+    "place_order": ORDERS, "modify_order": ORDERS, "cancel_order": ORDERS, "exit_order": ORDERS
+}
+
+def endpoint_of(method):
+    return METHOD_ENDPOINTS.get(method, OTHERS)
+
+# Process-wide limiter shared by every Kite caller
+kite_limiter = RateLimiter()
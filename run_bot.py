@@ -6,12 +6,13 @@ def run():
     print("[-] Bot listener starting...")
     print("[-] Open your Telegram App and use:")
     print("    /scan  - to Run Analysis")
-    print("    /auto  - to Start Loop")
+    print("    /auto  - to Scan at every bar close (e.g. /auto 5m)")
+    print("    /stop  - to Stop Auto Mode")
+    print("    /execute - to Place the last trade plan")
     print("    /start - for Help")
     
     try:
-        # We just run the polling in the main thread now, no need for background threads
-        # since we don't have a console input loop anymore.
+        # Polling runs in the main thread; /auto schedules scans on the bot's event loop
         telegram_interface.run_telegram_bot()
     except KeyboardInterrupt:
         print("\n[!] Stopping Bot...")
@@ -0,0 +1,173 @@
+import time
+import threading
+from collections import Counter
+import telemetry
+from rate_limiter import kite_limiter, endpoint_of, PRIORITY_ANALYTICS
+
+# ------------------------------------------------------------------------
+# PER-SCAN MEMOIZING KITE PROXY
+# ------------------------------------------------------------------------
+class ScanKite:
+    """
+    Wraps a KiteConnect instance for the lifetime of ONE scan.
+    quote / ltp / instruments responses are cached per instrument, so every
+    engine that receives this object (validate_option, get_iv_value,
+    get_oi_delta, get_quote_spread...) shares a single fetch per symbol.
+    Everything else (place_order, orders, constants) is passed through.
+
+    One instance may be shared by several scans running in parallel; every
+    real request takes an analytics-priority token from the endpoint's
+    bucket in rate_limiter, so scans never queue ahead of orders.
+    """
+    rate_limited = True # kite_data helpers skip their own limiter token
+
+    def __init__(self, kite):
+        self._kite = kite
+        self._quotes = {}
+        self._ltps = {}
+        self._instruments = {}
+        self.calls = Counter() # Real network calls per endpoint
+        self.lock = threading.Lock()
+
+    def _fetch(self, endpoint, fn, *args):
+        kite_limiter.acquire(endpoint_of(endpoint), PRIORITY_ANALYTICS)
+        with self.lock:
+            self.calls[endpoint] += 1
+        return fn(*args)
+
+    @staticmethod
+    def _keys(instruments):
+        if isinstance(instruments, (list, tuple, set)):
+            return list(instruments)
+        return [instruments]
+
+    def quote(self, instruments):
+        keys = self._keys(instruments)
+        missing = [k for k in keys if str(k) not in self._quotes]
+        if missing:
+            data = self._fetch("quote", self._kite.quote, missing)
+            with self.lock:
+                for k in missing:
+                    # Remember misses too, so unknown symbols are not re-requested
+                    self._quotes[str(k)] = data.get(str(k))
+        return {str(k): self._quotes[str(k)] for k in keys if self._quotes.get(str(k)) is not None}
+
+    def ltp(self, instruments):
+        keys = self._keys(instruments)
+        result = {}
+        missing = []
+        for k in keys:
+            q = self._quotes.get(str(k))
+            if q is not None:
+                # A full quote already carries the last price
+                result[str(k)] = {"instrument_token": q.get("instrument_token"), "last_price": q.get("last_price")}
+            elif str(k) in self._ltps:
+                if self._ltps[str(k)] is not None:
+                    result[str(k)] = self._ltps[str(k)]
+            else:
+                missing.append(k)
+        if missing:
+            data = self._fetch("ltp", self._kite.ltp, missing)
+            with self.lock:
+                for k in missing:
+                    self._ltps[str(k)] = data.get(str(k))
+                    if data.get(str(k)) is not None:
+                        result[str(k)] = data[str(k)]
+        return result
+
+    def instruments(self, exchange=None):
+        if exchange not in self._instruments:
+            args = (exchange,) if exchange else ()
+            self._instruments[exchange] = self._fetch("instruments", self._kite.instruments, *args)
+        return self._instruments[exchange]
+
+    def __getattr__(self, name):
+        return getattr(self._kite, name)
+
+# ------------------------------------------------------------------------
+# SCAN CONTEXT
+# ------------------------------------------------------------------------
+class ScanContext:
+    """
+    Shared state for one run of the suggestion pipeline.
+
+    Every fetched or derived value lives in a single memo, so a stage asks
+    for "atm" or ("symbol", strike, type) and gets the value computed by
+    whichever stage needed it first.
+    """
+    def __init__(self, capital, margin, logger, kite=None, skip_stages=None, seed=None):
+        self.capital = capital
+        self.margin = margin
+        self.logger = logger
+        if kite is not None and not isinstance(kite, ScanKite):
+            kite = ScanKite(kite)
+        self.kite = kite
+        self.skip_stages = set(skip_stages or [])
+        self.timings = {}
+        self.stopped_at = None
+        self._memo = dict(seed or {})
+
+    def get(self, key, compute):
+        """
+        Returns the memoized value for key, computing it on first use.
+        """
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    def has(self, key):
+        return key in self._memo
+
+    def set(self, key, value):
+        self._memo[key] = value
+
+    def update(self, **values):
+        self._memo.update(values)
+
+    def __getitem__(self, key):
+        return self._memo[key]
+
+    def __contains__(self, key):
+        return key in self._memo
+
+def missing_outputs(ctx, stages):
+    """
+    {stage name: [keys]} for skipped stages whose outputs are not seeded.
+    """
+    missing = {}
+    for name, _, produces in stages:
+        if name in ctx.skip_stages:
+            keys = [k for k in produces if k not in ctx]
+            if keys:
+                missing[name] = keys
+    return missing
+
+def run_stages(ctx, stages):
+    """
+    Runs (name, fn, produces) stages in order against ctx.
+    A stage returns None to continue or a result dict to end the scan.
+    produces lists the context keys the stage sets for later stages.
+    Stages listed in ctx.skip_stages are bypassed, which is only allowed
+    when their outputs were seeded; every stage run is timed.
+    """
+    missing = missing_outputs(ctx, stages)
+    if missing:
+        detail = "; ".join(f"{name} -> {', '.join(keys)}" for name, keys in missing.items())
+        raise ValueError(f"Skipped stages need seeded values: {detail}")
+
+    for name, stage, _ in stages:
+        if name in ctx.skip_stages:
+            ctx.logger.log(f"[Pipeline] Skipping stage: {name}")
+            continue
+
+        start = time.perf_counter()
+        try:
+            with telemetry.span(f"stage:{name}"):
+                verdict = stage(ctx)
+        finally:
+            ctx.timings[name] = round((time.perf_counter() - start) * 1000, 2) # ms
+
+        if verdict is not None:
+            ctx.stopped_at = name
+            return verdict
+    return None
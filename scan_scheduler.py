@@ -0,0 +1,149 @@
+import time
+import asyncio
+import datetime
+from collections import deque
+from utils import logger
+
+# ------------------------------------------------------------------------
+# BAR-CLOSE SCAN SCHEDULER
+# ------------------------------------------------------------------------
+# Fires the scan just after each bar of the timeframe closes (NSE bars are
+# anchored at 09:15), only during market hours. The blocking scan runs in
+# an executor so the event loop keeps time; if a scan is still running
+# when the next bar closes, that bar is coalesced into the running scan
+# instead of queueing behind it, and a wake-up that comes too late is
+# skipped. Every run records how late it started.
+
+MARKET_OPEN = datetime.time(9, 15)
+MARKET_CLOSE = datetime.time(15, 30)
+TIMEFRAME_SECONDS = {"1m": 60, "3m": 180, "5m": 300, "10m": 600, "15m": 900, "30m": 1800, "60m": 3600}
+SETTLE_SECONDS = 2.0    # wait after the close so the bar is published
+MAX_LATENESS = 0.5      # fraction of a bar after which a run is skipped
+HISTORY_SIZE = 500
+
+def timeframe_seconds(timeframe):
+    if timeframe in TIMEFRAME_SECONDS:
+        return TIMEFRAME_SECONDS[timeframe]
+    return int(str(timeframe).rstrip("m")) * 60
+
+def is_market_open(now=None):
+    now = now or datetime.datetime.now()
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() <= MARKET_CLOSE
+
+def next_bar_close(now, timeframe):
+    """
+    First bar close strictly after now (bars anchored at MARKET_OPEN; the
+    session's last close is MARKET_CLOSE). Skips weekends.
+    """
+    step = datetime.timedelta(seconds=timeframe_seconds(timeframe))
+    day = now.date()
+    while True:
+        if day.weekday() < 5:
+            start = datetime.datetime.combine(day, MARKET_OPEN)
+            close = datetime.datetime.combine(day, MARKET_CLOSE)
+            if now < start + step:
+                return start + step
+            if now < close:
+                bars = (now - start) // step + 1
+                return min(start + bars * step, close)
+        day += datetime.timedelta(days=1)
+        now = datetime.datetime.combine(day, datetime.time.min)
+
+class ScanScheduler:
+    def __init__(self, scan_fn, timeframe="5m", executor=None, settle=SETTLE_SECONDS, max_lateness=MAX_LATENESS,
+                 clock=datetime.datetime.now):
+        """
+        scan_fn: blocking callable run once per bar close.
+        timeframe: "5m" etc, or a callable returning one (re-read every bar).
+        """
+        self.scan_fn = scan_fn
+        self.timeframe = timeframe
+        self.executor = executor
+        self.settle = settle
+        self.max_lateness = max_lateness
+        self.clock = clock
+        self.running = None     # asyncio future of the scan in flight
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self.counts = {"run": 0, "coalesced": 0, "late": 0, "error": 0}
+        self._stop = asyncio.Event()
+
+    def current_timeframe(self):
+        return self.timeframe() if callable(self.timeframe) else self.timeframe
+
+    async def run(self):
+        """
+        Schedules scans until stop() is called.
+        """
+        self._stop.clear()
+        loop = asyncio.get_running_loop()
+        while not self._stop.is_set():
+            timeframe = self.current_timeframe()
+            due = next_bar_close(self.clock(), timeframe)
+            wake = due + datetime.timedelta(seconds=self.settle)
+            try:
+                await asyncio.wait_for(self._stop.wait(), max((wake - self.clock()).total_seconds(), 0))
+                break # stopped while sleeping
+            except asyncio.TimeoutError:
+                pass
+
+            lateness = (self.clock() - wake).total_seconds()
+            if self.running and not self.running.done():
+                self._record(due, timeframe, lateness, "coalesced")
+                logger.info(f"[Scheduler] {due:%H:%M} bar coalesced into running scan")
+                continue
+            if lateness > self.max_lateness * timeframe_seconds(timeframe):
+                self._record(due, timeframe, lateness, "late")
+                logger.warning(f"[Scheduler] {due:%H:%M} bar skipped, woke {lateness:.1f}s late")
+                continue
+
+            entry = self._record(due, timeframe, lateness, "run")
+            self.running = loop.run_in_executor(self.executor, self._timed, entry)
+
+        if self.running:
+            await asyncio.wait([self.running])
+
+    def stop(self):
+        self._stop.set()
+
+    def _timed(self, entry):
+        start = time.perf_counter()
+        try:
+            self.scan_fn()
+        except Exception as e:
+            entry["status"] = "error"
+            entry["error"] = str(e)
+            self.counts["error"] += 1
+            logger.error(f"[Scheduler] Scan for {entry['bar_close']} failed: {e}")
+        entry["duration_s"] = round(time.perf_counter() - start, 3)
+
+    def _record(self, due, timeframe, lateness, status):
+        entry = {"bar_close": due.strftime("%Y-%m-%d %H:%M"), "timeframe": timeframe,
+                 "lateness_s": round(lateness, 3), "status": status, "duration_s": None}
+        self.counts[status] += 1
+        self.history.append(entry)
+        return entry
+
+    def stats(self):
+        """
+        Run counts plus lateness / duration percentiles of the runs.
+        """
+        runs = [h for h in self.history if h["status"] in ("run", "error")]
+        late = sorted(h["lateness_s"] for h in runs)
+        durations = sorted(h["duration_s"] for h in runs if h["duration_s"] is not None)
+        def pct(values, p):
+            return values[min(int(p * len(values)), len(values) - 1)] if values else 0.0
+        return dict(self.counts,
+                    busy=bool(self.running and not self.running.done()),
+                    p50_lateness_s=pct(late, 0.50), max_lateness_s=late[-1] if late else 0.0,
+                    p50_duration_s=pct(durations, 0.50), max_duration_s=durations[-1] if durations else 0.0,
+                    last=self.history[-1] if self.history else None)
+
+    def format_stats(self):
+        s = self.stats()
+        lines = [f"⏰ **Scheduler** ({self.current_timeframe()} bars, {'busy' if s['busy'] else 'idle'})",
+                 f"   Runs {s['run']} | Coalesced {s['coalesced']} | Late-skipped {s['late']} | Errors {s['error']}",
+                 f"   Lateness p50 {s['p50_lateness_s']}s max {s['max_lateness_s']}s | "
+                 f"Duration p50 {s['p50_duration_s']}s max {s['max_duration_s']}s"]
+        if s["last"]:
+            lines.append(f"   Last: {s['last']['bar_close']} {s['last']['status']}")
+        return "\n".join(lines)
@@ -1,14 +1,26 @@
 from datetime import datetime
+import threading
 import config
+import trade_journal
 from utils import logger
+from position_monitor import PositionMonitor
+from rate_limiter import PRIORITY_EXIT
+from basket_executor import BasketExecutor, make_leg
 
 class ShortStraddleStrategy:
-    def __init__(self, broker, risk_manager):
+    def __init__(self, broker, risk_manager, order_book=None, monitor=None):
         self.broker = broker
         self.risk_manager = risk_manager
+        self.order_book = order_book # Optional OrderBookMirror for real fill prices
         self.state = "WAITING" # WAITING, IN_POSITION, COMPLETED
         self.positions = {} # {symbol: {'entry_price': x, 'sl': y, 'target': z, 'qty': q}}
         self.pnl_locked = 0.0
+        self.lock = threading.Lock() # Exits arrive on the tick thread
+        # SL / target are checked on every tick by the monitor; REST polling
+        # only covers legs that are not ticking live
+        self.monitor = monitor or PositionMonitor()
+        self.monitor.on_exit = self.on_exit_trigger
+        self.executor = BasketExecutor(broker, order_book)
 
     def get_atm_strike(self, spot_price, step=50):
         return round(spot_price / step) * step
@@ -58,65 +70,101 @@ class ShortStraddleStrategy:
 
         # Place Orders via Risk Manager
         if self.risk_manager.check_trade_limits(qty):
-            ce_order = self.broker.place_order("SELL", "NFO", ce_token, qty, "INTRADAY", "MARKET", 0, ce_symbol)
-            pe_order = self.broker.place_order("SELL", "NFO", pe_token, qty, "INTRADAY", "MARKET", 0, pe_symbol)
-            
-            if ce_order and pe_order:
-                self.state = "IN_POSITION"
-                # Fetch entry prices to set SL/TP
-                ce_entry_price = self.broker.get_ltp("NFO", ce_token, ce_symbol) or 0
-                pe_entry_price = self.broker.get_ltp("NFO", pe_token, pe_symbol) or 0
-                
-                self.positions[ce_symbol] = {
-                    'token': ce_token, 'type': 'CE', 'qty': qty, 'entry': ce_entry_price,
-                    'sl': ce_entry_price + config.STOP_LOSS_PER_LOT, # Simplified point based SL
-                    'target': ce_entry_price - config.TARGET_PROFIT_PER_LOT # Shorting, so lower is better
-                }
-                self.positions[pe_symbol] = {
-                    'token': pe_token, 'type': 'PE', 'qty': qty, 'entry': pe_entry_price,
-                    'sl': pe_entry_price + config.STOP_LOSS_PER_LOT, 
-                    'target': pe_entry_price - config.TARGET_PROFIT_PER_LOT 
+            # Both legs in one concurrent basket; a rejected leg unwinds the other
+            basket = self.executor.execute([
+                make_leg("SELL", ce_symbol, ce_token, qty),
+                make_leg("SELL", pe_symbol, pe_token, qty)
+            ])
+
+            # Track whatever is live: both legs, or on PARTIAL the legs the
+            # rollback could not close (they still need their SL / target)
+            if basket['status'] == "PARTIAL":
+                logger.error(f"Basket PARTIAL: tracking {len(basket['open'])} open leg(s) for exit.")
+            opened = []
+            for leg in basket['open']:
+                entry_price = self.get_entry_price(leg['order_id'], leg['token'], leg['symbol'])
+                pos = {
+                    'token': leg['token'], 'type': 'CE' if leg['symbol'] == ce_symbol else 'PE',
+                    'qty': leg['qty'], 'entry': entry_price,
+                    'sl': entry_price + config.STOP_LOSS_PER_LOT, # Simplified point based SL
+                    'target': entry_price - config.TARGET_PROFIT_PER_LOT # Shorting, so lower is better
                 }
-                logger.info(f"Entered Positions. CE Entry: {ce_entry_price}, PE Entry: {pe_entry_price}")
+                with self.lock:
+                    self.positions[leg['symbol']] = pos
+                self.monitor.watch(leg['symbol'], pos['token'], pos['entry'], pos['sl'], pos['target'], pos['qty'], side="SELL")
+                opened.append(f"{leg['symbol']} @ {entry_price}")
+
+            if opened:
+                self.state = "IN_POSITION"
+                logger.info(f"Entered Positions ({basket['status']}): {', '.join(opened)}")
+
+    def get_entry_price(self, order_id, token, symbol):
+        """
+        Average fill price from the order book mirror, else current LTP.
+        """
+        if self.order_book:
+            price = self.order_book.average_price(order_id)
+            if price:
+                return price
+        return self.broker.get_ltp("NFO", token, symbol) or 0
+
+    def on_exit_trigger(self, symbol, leg, ltp, reason):
+        """
+        PositionMonitor callback (tick thread): SL or target crossed.
+        """
+        with self.lock:
+            pos = self.positions.pop(symbol, None)
+            if pos is None:
+                return
+            self.pnl_locked += (pos['entry'] - ltp) * pos['qty']
+
+        label = "SL" if reason == "SL" else "Target"
+        level = pos['sl'] if reason == "SL" else pos['target']
+        logger.info(f"{label} Hit for {symbol}. LTP: {ltp}, {label}: {level}")
+        held = self.held_position(symbol, pos)
+        self.broker.place_order("BUY", "NFO", pos['token'], pos['qty'], "INTRADAY", "MARKET", 0, symbol, priority=PRIORITY_EXIT)
+        self.journal_exit(symbol, held, ltp, f"{label} Hit")
+
+    def held_position(self, symbol, pos):
+        """
+        Entry side of a leg, read before its exit order is sent: the order
+        book's fills if available, else the strategy's own record.
+        """
+        held = trade_journal.book_position(symbol, self.order_book) if self.order_book else None
+        return held or {"entry": pos['entry'], "qty": pos['qty'], "side": "SELL"}
+
+    def journal_exit(self, symbol, held, exit_price, exit_reason):
+        try:
+            trade_journal.log_trade_from_book(symbol, exit_price, "9:20 Short Straddle", exit_reason,
+                                              position=held, strategy="Short Straddle")
+        except Exception as e:
+            logger.error(f"Journal write failed for {symbol}: {e}")
 
     def monitor_positions(self):
         if not self.positions:
             self.state = "COMPLETED"
             return
-            
-        total_mtm = 0
-        keys_to_remove = []
-        
-        for symbol, pos in self.positions.items():
-            ltp = self.broker.get_ltp("NFO", pos['token'], symbol)
-            if not ltp: continue
-            
-            # Update MTM (Short position: Entry - LTP)
-            # This is per unit. Total MTM = (Entry - LTP) * Qty
-            pnl = (pos['entry'] - ltp) * pos['qty']
-            total_mtm += pnl
-            
-            # Check SL
-            if ltp >= pos['sl']:
-                logger.info(f"SL Hit for {symbol}. LTP: {ltp}, SL: {pos['sl']}")
-                self.broker.place_order("BUY", "NFO", pos['token'], pos['qty'], "INTRADAY", "MARKET", 0, symbol)
-                keys_to_remove.append(symbol)
-            
-            # Check Target
-            elif ltp <= pos['target']:
-                logger.info(f"Target Hit for {symbol}. LTP: {ltp}, Target: {pos['target']}")
-                self.broker.place_order("BUY", "NFO", pos['token'], pos['qty'], "INTRADAY", "MARKET", 0, symbol)
-                keys_to_remove.append(symbol)
-                
-        # Clean up closed positions
-        for k in keys_to_remove:
-            del self.positions[k]
-            
-        self.risk_manager.update_pnl(total_mtm + self.pnl_locked)
+
+        # Legs not ticking live (stream down, no tick yet or ticks gone
+        # stale) are polled over REST every cycle, through the same triggers.
+        for leg in self.monitor.stale():
+            ltp = self.broker.get_ltp("NFO", leg['token'], leg['symbol'])
+            if ltp:
+                self.monitor.on_price(leg['symbol'], ltp)
+
+        self.risk_manager.update_pnl(self.monitor.mtm() + self.pnl_locked)
 
     def exit_all_positions(self, reason="Force Exit"):
         logger.info(f"Exiting all positions: {reason}")
-        for symbol, pos in self.positions.items():
-             self.broker.place_order("BUY", "NFO", pos['token'], pos['qty'], "INTRADAY", "MARKET", 0, symbol)
-        self.positions.clear()
+        self.monitor.clear()
+        with self.lock:
+            positions = dict(self.positions)
+            self.positions.clear()
+        held = {symbol: self.held_position(symbol, pos) for symbol, pos in positions.items()}
+        for symbol, pos in positions.items():
+             self.broker.place_order("BUY", "NFO", pos['token'], pos['qty'], "INTRADAY", "MARKET", 0, symbol, priority=PRIORITY_EXIT)
+        # Journal after every exit is out, so a slow write never delays one
+        for symbol, pos in positions.items():
+            exit_price = self.monitor.ltp(pos['token']) or self.broker.get_ltp("NFO", pos['token'], symbol) or pos['entry']
+            self.journal_exit(symbol, held[symbol], exit_price, reason)
         self.state = "COMPLETED"
@@ -1,8 +1,11 @@
 from kiteconnect import KiteTicker
+import config
 from config import API_KEY, ACCESS_TOKEN
 import logging
 import threading
 import time
+from collections import defaultdict
+import order_book
 
 # Global cache for LTP
 LTP_CACHE = {}
@@ -13,31 +16,87 @@ class StreamEngine:
         self.tokens = []
         self.is_connected = False
         self.lock = threading.Lock()
+        self.listeners = defaultdict(list) # instrument_token -> [callback(tick)]
         
     def start(self, tokens_list):
         """
         Starts the KiteTicker in a separate thread.
         """
-        self.tokens = tokens_list
-        # In a real scenario, we would initialize KiteTicker here
-        # self.kws = KiteTicker(API_KEY, ACCESS_TOKEN)
-        # self.kws.on_ticks = self.on_ticks
-        # self.kws.on_connect = self.on_connect
-        # self.kws.connect(threaded=True)
-        
-        # For now, we simulate a streamer or just rely on API polling
-        # as we cannot open a real WebSocket without valid tokens/network in this env.
-        print(f"[StreamEngine] Broker Ticker Simulation Started for {len(tokens_list)} tokens.")
-        self.is_connected = True
+        if self.kws is not None:
+            self.subscribe(tokens_list) # Already running: just add the tokens
+            return
+        # Keep tokens already subscribed by tick listeners
+        self.tokens = list(dict.fromkeys(self.tokens + list(tokens_list)))
+        if getattr(config, "USE_MOCK_BROKER", False):
+            # Mock broker: no websocket. is_connected stays False, so position
+            # monitors keep polling prices over REST.
+            print(f"[StreamEngine] Mock broker: no ticker feed for {len(tokens_list)} tokens (REST polling).")
+            return
+
+        # Live Kite ticker, or kite_simulator.py when KITE_TICKER_ROOT points at it
+        ticker_root = getattr(config, "KITE_TICKER_ROOT", None)
+        self.kws = KiteTicker(API_KEY, ACCESS_TOKEN, root=ticker_root)
+        self.kws.on_ticks = self.on_ticks
+        self.kws.on_connect = self.on_connect
+        self.kws.on_order_update = self.on_order_update
+        self.kws.on_close = self.on_close
+        self.kws.connect(threaded=True)
+        # is_connected flips in on_connect; subscriptions made before that go out there
+        print(f"[StreamEngine] Ticker connecting to {ticker_root or 'live Kite'} for {len(self.tokens)} tokens.")
         
+    def subscribe(self, tokens):
+        """
+        Adds tokens to the live subscription (and to the connect-time list).
+        """
+        with self.lock:
+            new = [t for t in tokens if t not in self.tokens]
+            self.tokens = self.tokens + new
+        if new and self.kws and self.is_connected:
+            self.kws.subscribe(new)
+            self.kws.set_mode(self.kws.MODE_LTP, new)
+
+    def add_tick_listener(self, token, callback):
+        """
+        Registers callback(tick) for every tick of one instrument and
+        subscribes the token if needed.
+        """
+        with self.lock:
+            self.listeners[token].append(callback)
+        self.subscribe([token])
+
+    def remove_tick_listener(self, token, callback):
+        with self.lock:
+            if callback in self.listeners.get(token, []):
+                self.listeners[token].remove(callback)
+            if not self.listeners.get(token):
+                self.listeners.pop(token, None)
+
     def on_ticks(self, ws, ticks):
         with self.lock:
             for tick in ticks:
                 LTP_CACHE[tick['instrument_token']] = tick['last_price']
+            # Snapshot listeners so callbacks run outside the lock
+            dispatch = [(cb, tick) for tick in ticks for cb in self.listeners.get(tick['instrument_token'], [])]
+
+        for callback, tick in dispatch:
+            try:
+                callback(tick)
+            except Exception as e:
+                print(f"[StreamEngine] Tick listener error: {e}")
                 
+    def on_order_update(self, ws, data):
+        # Keep the local order/trade mirror current without polling orders()
+        order_book.get_order_book().on_order_update(ws, data)
+
     def on_connect(self, ws, response):
-        ws.subscribe(self.tokens)
-        ws.set_mode(ws.MODE_LTP, self.tokens)
+        with self.lock:
+            tokens = list(self.tokens)
+            self.is_connected = True
+        ws.subscribe(tokens)
+        ws.set_mode(ws.MODE_LTP, tokens)
+
+    def on_close(self, ws, code, reason):
+        self.is_connected = False
         
     def get_ltp(self, token):
         start_time = time.time()
@@ -0,0 +1,99 @@
+import numpy as np
+import greeks_engine
+import expected_move_engine
+import expiry_engine
+import lot_engine
+from otm_engine import get_strike_gap, MIN_VOLUME, MIN_OI, MIN_PREMIUM
+
+# ------------------------------------------------------------------------
+# CHAIN-WIDE STRIKE OPTIMIZER
+# ------------------------------------------------------------------------
+# Quotes the strikes around ATM for the view's option type in one batch,
+# solves IV and greeks for all of them in one vectorized pass and runs the
+# batched expectancy model over the whole chain, then picks the strike
+# with the most edge that is liquid and affordable.
+
+CHAIN_WIDTH = 10        # strikes on each side of ATM
+DEFAULT_SIGMA = 0.15    # when IV cannot be solved from the premium
+HOLDING_MINUTES = 60
+
+def fetch_chain_snapshot(kite, base_symbol, expiry_date, atm, opt_type, width=CHAIN_WIDTH):
+    """
+    One batch quote for ATM +/- width strikes of one option type.
+    Returns {"strike", "symbol", "premium", "volume", "oi"} (arrays / list).
+    """
+    gap = get_strike_gap(base_symbol)
+    strikes = [atm + i * gap for i in range(-width, width + 1)]
+    syms = ["NFO:" + expiry_engine.get_option_symbol(base_symbol, expiry_date, stk, opt_type) for stk in strikes]
+
+    try:
+        quotes = kite.quote(syms) or {}
+    except Exception as e:
+        print(f"    [Optimizer] Chain quote failed: {e}")
+        quotes = {}
+
+    q = [quotes.get(sym, {}) for sym in syms]
+    return {
+        "strike": np.array(strikes, dtype=float),
+        "symbol": syms,
+        "premium": np.array([d.get("last_price", 0) or 0 for d in q], dtype=float),
+        "volume": np.array([d.get("volume", 0) or 0 for d in q], dtype=float),
+        "oi": np.array([d.get("oi", 0) or 0 for d in q], dtype=float)
+    }
+
+def evaluate_chain(chain, spot, T, opt_type, metrics, holding_minutes=HOLDING_MINUTES):
+    """
+    Greeks (vectorized) + expectancy for every strike of the chain.
+    Adds "iv" (percent), "delta", "theta", "edge_ratio", "expected_cost",
+    "expected_option_gain" and "allowed" arrays to a copy of chain.
+    """
+    out = dict(chain)
+    is_call = opt_type == "CE"
+    iv = greeks_engine.get_implied_volatility_vectorized(chain["premium"], spot, chain["strike"], T, greeks_engine.RISK_FREE_RATE, is_call)
+    sigma = np.where(iv > 0, iv / 100.0, DEFAULT_SIGMA)
+    g = greeks_engine.get_greeks_vectorized(spot, chain["strike"], T, greeks_engine.RISK_FREE_RATE, sigma, is_call)
+
+    # All strikes through the expectancy model in one batch call
+    res = expected_move_engine.evaluate_expectancy_batch(
+        chain["premium"], g["delta"], g["theta"], sigma * 100, dict(metrics, spot_price=spot), [holding_minutes]
+    )
+    priced = chain["premium"] > 0
+    edge = np.where(priced, res["edge_ratio"][:, 0], 0.0)
+    cost = np.where(priced, res["expected_cost"][:, 0], 0.0)
+    gain = np.where(priced, res["expected_option_gain"][:, 0], 0.0)
+    allowed = priced & res["allowed"][:, 0]
+
+    out.update(iv=sigma * 100, delta=g["delta"], theta=g["theta"], edge_ratio=edge,
+               expected_cost=cost, expected_option_gain=gain, allowed=allowed)
+    return out
+
+def optimize_strike(chain, spot, T, opt_type, metrics, capital, base_symbol, holding_minutes=HOLDING_MINUTES):
+    """
+    Best strike for the view: highest edge ratio among strikes that pass
+    the expectancy rule, the liquidity thresholds and buy at least one lot
+    within capital. Returns None if no strike qualifies.
+    """
+    ev = evaluate_chain(chain, spot, T, opt_type, metrics, holding_minutes)
+    lot_size = lot_engine.get_lot_size(base_symbol)
+    cost_per_lot = ev["premium"] * lot_size
+    lots = np.where(cost_per_lot > 0, np.floor(capital / np.where(cost_per_lot > 0, cost_per_lot, 1)), 0)
+
+    liquid = (ev["volume"] >= MIN_VOLUME) & (ev["oi"] >= MIN_OI) & (ev["premium"] >= MIN_PREMIUM)
+    feasible = liquid & (lots >= 1) & ev["allowed"]
+    if not feasible.any():
+        return None
+
+    best = int(np.argmax(np.where(feasible, ev["edge_ratio"], -np.inf)))
+    return {
+        "strike": int(ev["strike"][best]),
+        "symbol": ev["symbol"][best],
+        "premium": float(ev["premium"][best]),
+        "lots": int(lots[best]),
+        "qty": int(lots[best]) * lot_size,
+        "cost": float(cost_per_lot[best] * lots[best]),
+        "edge_ratio": float(ev["edge_ratio"][best]),
+        "delta": float(ev["delta"][best]),
+        "theta": float(ev["theta"][best]),
+        "iv": float(ev["iv"][best]),
+        "candidates": int(feasible.sum())
+    }
@@ -1,4 +1,7 @@
 import time
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+import config
 import user_profile
 import kite_data
 import atm_engine
@@ -11,12 +14,21 @@ import exit_engine
 import trailing_sl_engine
 import trade_journal
 import margin_engine
-from auto_symbol_selector import pick_best_symbol
+from auto_symbol_selector import pick_best_symbol, rank_symbols
 import oi_analysis_engine
 import hedging_engine
 import timeframe_engine
+import dnt_engine
+import greeks_engine
+import expected_move_engine
+import strike_optimizer
+import trade_veto_engine
 
 import performance_engine
+import telemetry
+import profiler
+from scan_context import ScanContext, ScanKite, run_stages
+from gate_scheduler import Gate, GateScheduler, COST_LOCAL, COST_QUOTE, COST_HISTORICAL, COST_CHAIN
 
 
 # -------------------------------------------------------------------------
@@ -52,421 +64,793 @@ def validate_option(symbol, kite):
         
     return ltp
 
-def _suggest_trade_logic(capital, margin, **kwargs):
+# -------------------------------------------------------------------------
+# MEMOIZED SCAN VALUES
+# -------------------------------------------------------------------------
+# Every fetched or derived value goes through ctx.get(), so whichever stage
+# needs it first pays for it and every later stage reuses it.
+
+def _regime_symbol(ctx):
+    symbol = ctx["symbol"]
+    return symbol if "NIFTY" in symbol else "NIFTY"
+
+def _atm(ctx):
+    return ctx.get("atm", lambda: atm_engine.get_atm_strike(ctx["spot_price"], ctx["symbol"]))
+
+def _expiry(ctx):
+    return ctx.get("expiry", lambda: expiry_engine.get_expiry(ctx["symbol"]))
+
+def _option_symbol(ctx, strike, opt_type):
+    return ctx.get(
+        ("option_symbol", strike, opt_type),
+        lambda: "NFO:" + expiry_engine.get_option_symbol(ctx["symbol"], _expiry(ctx)['date'], strike, opt_type)
+    )
+
+def _pcr(ctx):
+    return ctx.get("pcr", lambda: oi_analysis_engine.calculate_pcr(ctx.kite, ctx["symbol"]))
+
+def _iv(ctx):
+    def compute():
+        iv = kite_data.get_iv_value(ctx.kite, _option_symbol(ctx, _atm(ctx), "CE"))
+        if iv: oi_analysis_engine.update_iv_history(ctx["symbol"], iv)
+        return iv
+    return ctx.get("iv", compute)
+
+def _iv_rank(ctx):
+    def compute():
+        _iv(ctx) # History must include this scan's IV first
+        return oi_analysis_engine.calculate_iv_rank(ctx["symbol"])
+    return ctx.get("iv_rank", compute)
+
+def _oi_signal(ctx):
+    def compute():
+        oi_delta, quote_data = oi_analysis_engine.get_oi_delta(ctx.kite, _option_symbol(ctx, _atm(ctx), "CE"))
+        net_change = quote_data.get('net_change', 0)
+        return oi_analysis_engine.interpret_oi_signal(net_change, oi_delta)
+    return ctx.get("oi_signal", compute)
+
+def _timeframe(ctx):
+    return ctx.get("timeframe", lambda: timeframe_engine.pick_timeframe(ctx["volatility"]))
+
+def _metrics(ctx):
+    return ctx.get("metrics", lambda: market_regime_engine.get_market_metrics(_regime_symbol(ctx)))
+
+def _regime(ctx):
+    return ctx.get("regime", lambda: _metrics(ctx).get("regime", "SIDEWAYS"))
+
+def _dte(ctx):
+    def compute():
+        expiry = _expiry(ctx)
+        return round(greeks_engine.calculate_time_to_expiry(expiry['date']) * 365, 2) if expiry else None
+    return ctx.get("dte", compute)
+
+def _feedback(ctx):
+    return ctx.get("feedback", lambda: performance_engine.get_feedback(current_context={
+        "Regime": ctx["trend"],
+        "Strategy": "Trend Following",
+        "DTE": _dte(ctx),
+        "Time": datetime.datetime.now().strftime("%H:%M")
+    }))
+
+def _size_mult(ctx):
+    return ctx.get("size_mult", lambda: max(0.5, min(1.0, _feedback(ctx).get('size_multiplier', 1.0))))
+
+def _final_view(ctx):
+    def compute():
+        trend_dir = ctx["trend"]
+        if "DOWN" in trend_dir: return "BEARISH"
+        if "UP" in trend_dir: return "BULLISH"
+        return "BEARISH" if _pcr(ctx) < 0.8 else "BULLISH"
+    return ctx.get("final_view", compute)
+
+def _high_iv_condition(ctx):
+    def compute():
+        raw_hv = _metrics(ctx).get('hv', 0)
+        current_iv = _iv(ctx) if _iv(ctx) else 0
+        iv_rank = _iv_rank(ctx)
+
+        high_iv = False
+        if current_iv > (raw_hv * 1.2):
+            high_iv = True
+            ctx.logger.log(f"[!] High IV Detected: IV {current_iv:.1f} > HV {raw_hv:.1f} + 20%")
+        if iv_rank > 80:
+            high_iv = True
+            ctx.logger.log(f"[!] Extreme IV Rank Detected: {iv_rank}")
+
+        if high_iv:
+            ctx.logger.log(">>> FORCING SYSTEM TO CREDIT STRATEGIES (SELLING) <<<")
+            ctx.logger.log(">>> Long Option Entries will be VETOED/SKIPPED.")
+        return high_iv
+    return ctx.get("high_iv_condition", compute)
+
+def _validated_premium(ctx, sym):
+    return ctx.get(("premium", sym), lambda: validate_option(sym, ctx.kite))
+
+# -------------------------------------------------------------------------
+# PIPELINE STAGES
+# -------------------------------------------------------------------------
+def _stage_selection(ctx):
     """
-    Analyzes market with Advanced Quantitative Logic.
-    Strict Compliance: Zerodha Kite Only.
-    Returns: Dict { "status": "WAIT"|"TRADE", "reason": str, "data": dict }
+    Picks the symbol to trade and resolves its spot price.
+    Values seeded into the context (e.g. symbol) are used as-is.
     """
-    # Initialize Logger
-    import logger as logger_module
-    if 'logger' not in kwargs:
-         logger = logger_module.SimpleLogger() # Local instance
-    else:
-         logger = kwargs['logger']
+    logger = ctx.logger
+    if not ctx.has("symbol"):
+        logger.log("[*] Scanning Markets (Trend/Momentum/Volatility)...")
+        symbol, reason_msg, trend_dir, volatility, spot_price = pick_best_symbol()
+        ctx.update(symbol=symbol, reason_msg=reason_msg, trend=trend_dir,
+                   volatility=volatility, spot_price=spot_price)
+
+    symbol = ctx["symbol"]
+    spot_price = ctx.get("spot_price", lambda: None)
 
-    logger.log(f"\n--- ZERODHA QUANT OPTION BOT ---")
-    
-    # 3. Get API Instance
-    kite = kite_data.get_kite()
-    
-    # 1. User Profile
-    profile = user_profile.get_user_profile()
-    risk_level = profile.get("risk_level", "medium")
-    
-    # 2. Auto-Selection Execution
-    logger.log("[*] Scanning Markets (Trend/Momentum/Volatility)...")
-    symbol, reason_msg, trend_dir, volatility, spot_price = pick_best_symbol()
-    
     if spot_price is None or spot_price == 0:
         # Mapping for Indices check
         idx_map = {"NIFTY": "NSE:NIFTY 50", "BANKNIFTY": "NSE:NIFTY BANK", "FINNIFTY": "NSE:NIFTY FIN SERVICE"}
         lookup_sym = idx_map.get(symbol, f"NSE:{symbol}")
-        spot_price = kite_data.get_ltp(lookup_sym, kite)
+        spot_price = kite_data.get_ltp(lookup_sym, ctx.kite)
 
     if spot_price is None or spot_price == 0:
-        spot_price = kite_data.get_ltp(symbol, kite)
+        spot_price = kite_data.get_ltp(symbol, ctx.kite)
 
     if spot_price is None or spot_price == 0:
         msg = f"[!] Could not fetch Spot Price for {symbol}. Aborting."
         logger.log(msg)
         return {"status": "WAIT", "reason": "Data Fetch Failure (Spot Price)"}
 
-    # 3. New Quantitative Checks
-    pcr = oi_analysis_engine.calculate_pcr(kite, symbol)
-    atm = atm_engine.get_atm_strike(spot_price, symbol)
-    expiry_data = expiry_engine.get_expiry(symbol)
-    
-    if not expiry_data:
+    ctx.set("spot_price", spot_price)
+    return None
+
+def _stage_precheck(ctx):
+    """
+    Symbol-independent local gates (journal DNT), run before any fetch.
+    """
+    return PRE_GATES.run(ctx)
+
+def _stage_market_context(ctx):
+    """
+    Resolves the local parts of the context: expiry, timeframe and
+    performance feedback. Network-backed values (PCR, IV, regime) stay
+    lazy until a gate or a later stage asks for them.
+    """
+    logger = ctx.logger
+
+    if not _expiry(ctx):
         logger.log("[!] Could not determine Expiry.")
         return {"status": "WAIT", "reason": "Data Fetch Failure (Expiry)"}
 
-    atm_sym_base = expiry_engine.get_option_symbol(symbol, expiry_data['date'], atm, "CE")
-    atm_sym = "NFO:" + atm_sym_base
-    
-    iv = kite_data.get_iv_value(kite, atm_sym)
-    if iv: oi_analysis_engine.update_iv_history(symbol, iv)
-    iv_rank = oi_analysis_engine.calculate_iv_rank(symbol)
-    
-    # OI Signal
-    oi_delta, quote_data = oi_analysis_engine.get_oi_delta(kite, atm_sym)
-    net_change = quote_data.get('net_change', 0)
-    oi_signal = oi_analysis_engine.interpret_oi_signal(net_change, oi_delta)
-    
-    # Timeframe
-    timeframe = timeframe_engine.pick_timeframe(volatility)
-    
-    logger.log("\n========================================")
-    logger.log(f" MARKET CONTEXT: {symbol}")
-    logger.log("========================================")
-    logger.log(f"Trend      : {trend_dir} (Reason: {reason_msg})")
-    logger.log(f"Volatility : {volatility}")
-    logger.log(f"Timeframe  : {timeframe}")
-    logger.log(f"OI Signal  : {oi_signal} (PCR: {pcr:.2f})")
-    logger.log(f"IV Rank    : {iv_rank} (IV: {iv if iv else 'N/A'})")
-    logger.log(f"Spot Price : {spot_price}")
-    logger.log("========================================")
-    
+    _timeframe(ctx)
+
+    # A directional trend fixes the view without touching the PCR chain
+    trend_dir = ctx["trend"]
+    if "DOWN" in trend_dir or "UP" in trend_dir:
+        _final_view(ctx)
+
     # --- PERFORMANCE FEEDBACK INTEGRATION ---
-    feedback = performance_engine.get_feedback(current_context={
-        "Regime": trend_dir,
-        "Strategy": "Trend Following" 
-    })
-    
+    feedback = _feedback(ctx)
     logger.log(f"[Quant] Performance Feedback: {feedback}")
-    size_mult = max(0.5, min(1.0, feedback.get('size_multiplier', 1.0)))
+    size_mult = _size_mult(ctx)
     if size_mult < 1.0:
         logger.log(f"[!] Throttling Size by {(1-size_mult)*100:.0f}% due to performance history.")
-        
-    logger.log(f"Capital: {capital} | Avail Margin: {margin}")
-    
-    # Decide Strategy
-    final_view = "BULLISH"
-    if "DOWN" in trend_dir: final_view = "BEARISH"
-    elif "UP" in trend_dir: final_view = "BULLISH"
-    else:
-        if pcr < 0.8: final_view = "BEARISH"
-        else: final_view = "BULLISH"
-        
-    logger.log(f"[-] Final View: {final_view}")
-
-    # --- EXTRA CONFIRMATION CHECK (ADAPTIVE) ---
-    if feedback.get('extra_confirmation_required', False):
-        logger.log("[!] Performance Engine requires EXTRA CONFIRMATION.")
-        if volatility == "Low":
-             msg = "[x] Confirmation Failed: Volatility Low + Risk High."
-             logger.log(msg)
-             return {"status": "WAIT", "reason": "Performance Veto (Low Vol + High Risk)"}
-             
-        if final_view == "BULLISH" and pcr < 0.9:
-             msg = f"[x] Confirmation Failed: PCR {pcr:.2f} too low for Risky Bullish Setup."
-             logger.log(msg)
-             return {"status": "WAIT", "reason": f"Performance Veto (PCR {pcr:.2f} Low)"}
-        if final_view == "BEARISH" and pcr > 1.1:
-             msg = f"[x] Confirmation Failed: PCR {pcr:.2f} too high for Risky Bearish Setup."
-             logger.log(msg)
-             return {"status": "WAIT", "reason": f"Performance Veto (PCR {pcr:.2f} High)"}
-             
-        logger.log("[v] Extra Confirmation Passed.")
+
+    logger.log(f"Capital: {ctx.capital} | Avail Margin: {ctx.margin}")
+    return None
+
+def _stage_gates(ctx):
+    """
+    Runs the blocking checks through GATE_SCHEDULER (cheapest per veto
+    first, stop at first WAIT), then prints the context block.
+    """
+    verdict = GATE_SCHEDULER.run(ctx)
+    if verdict is not None:
+        return verdict
+
+    _log_market_context(ctx)
+    return None
+
+def _log_market_context(ctx):
+    logger = ctx.logger
+    iv = _iv(ctx)
+    # PCR is a chain-wide fetch; only show it if a gate needed it
+    pcr_txt = f"{ctx['pcr']:.2f}" if ctx.has("pcr") else "N/A"
+
+    logger.log("\n========================================")
+    logger.log(f" MARKET CONTEXT: {ctx['symbol']}")
+    logger.log("========================================")
+    logger.log(f"Trend      : {ctx['trend']} (Reason: {ctx.get('reason_msg', lambda: 'Seeded')})")
+    logger.log(f"Volatility : {ctx['volatility']}")
+    logger.log(f"Timeframe  : {_timeframe(ctx)}")
+    logger.log(f"OI Signal  : {_oi_signal(ctx)} (PCR: {pcr_txt})")
+    logger.log(f"IV Rank    : {_iv_rank(ctx)} (IV: {iv if iv else 'N/A'})")
+    logger.log(f"Regime     : {_regime(ctx)}")
+    logger.log(f"Spot Price : {ctx['spot_price']}")
+    logger.log("========================================")
+    logger.log(f"[-] Final View: {_final_view(ctx)}")
 
     # ----------------------------------------------------
-    # DO-NOT-TRADE (DNT) DETECTOR
+    # HIGH IV STRATEGY SWITCH
     # ----------------------------------------------------
-    import dnt_engine
-    regime_str = market_regime_engine.get_market_regime(symbol if "NIFTY" in symbol else "NIFTY")
-    
+    _high_iv_condition(ctx)
+
+# -------------------------------------------------------------------------
+# GATES
+# -------------------------------------------------------------------------
+def _gate_dnt_journal(ctx):
+    dnt_res = ctx.get("dnt_journal", dnt_engine.check_dnt_journal)
+    if dnt_res['do_not_trade']:
+        return _dnt_wait(ctx.logger, dnt_res)
+    return None
+
+def _gate_confirmation(ctx):
+    """
+    EXTRA CONFIRMATION CHECK (ADAPTIVE) demanded by performance history.
+    """
+    logger = ctx.logger
+    if not _feedback(ctx).get('extra_confirmation_required', False):
+        return None
+
+    logger.log("[!] Performance Engine requires EXTRA CONFIRMATION.")
+    if ctx["volatility"] == "Low":
+         msg = "[x] Confirmation Failed: Volatility Low + Risk High."
+         logger.log(msg)
+         return {"status": "WAIT", "reason": "Performance Veto (Low Vol + High Risk)"}
+
+    final_view = _final_view(ctx)
+    pcr = _pcr(ctx)
+    if final_view == "BULLISH" and pcr < 0.9:
+         msg = f"[x] Confirmation Failed: PCR {pcr:.2f} too low for Risky Bullish Setup."
+         logger.log(msg)
+         return {"status": "WAIT", "reason": f"Performance Veto (PCR {pcr:.2f} Low)"}
+    if final_view == "BEARISH" and pcr > 1.1:
+         msg = f"[x] Confirmation Failed: PCR {pcr:.2f} too high for Risky Bearish Setup."
+         logger.log(msg)
+         return {"status": "WAIT", "reason": f"Performance Veto (PCR {pcr:.2f} High)"}
+
+    logger.log("[v] Extra Confirmation Passed.")
+    return None
+
+def _gate_dnt_market(ctx):
+    """
+    DO-NOT-TRADE (DNT) market conditions: theta bleed and no-edge regimes.
+    """
     dnt_context = {
-        "regime": regime_str,
-        "volatility": volatility,
-        "trend": trend_dir,
-        "spot_price": spot_price,
-        "iv_rank": iv_rank
+        "regime": _regime(ctx),
+        "volatility": ctx["volatility"],
+        "trend": ctx["trend"],
+        "spot_price": ctx["spot_price"],
+        "iv_rank": _iv_rank(ctx)
     }
-    
-    dnt_res = dnt_engine.check_dnt(dnt_context)
-    
-    if dnt_res['do_not_trade']:
-        logger.log("\n🛑 DO-NOT-TRADE ACTIVE")
-        logger.log(f"   Reason: {dnt_res['primary_reason']} ({dnt_res['risk_category']})")
-        return {"status": "WAIT", "reason": f"DNT: {dnt_res['primary_reason']}"}
-    
-    # ----------------------------------------------------
-    # HIGH IV STRATEGY SWITCH
-    # ----------------------------------------------------
-    metrics = market_regime_engine.get_market_metrics(symbol if "NIFTY" in symbol else "NIFTY")
-    raw_hv = metrics.get('hv', 0)
-    current_iv = iv if iv else 0
-    
-    high_iv_condition = False
-    if current_iv > (raw_hv * 1.2):
-        high_iv_condition = True
-        logger.log(f"[!] High IV Detected: IV {current_iv:.1f} > HV {raw_hv:.1f} + 20%")
-    if iv_rank > 80:
-        high_iv_condition = True
-        logger.log(f"[!] Extreme IV Rank Detected: {iv_rank}")
-        
-    if high_iv_condition:
-        logger.log(">>> FORCING SYSTEM TO CREDIT STRATEGIES (SELLING) <<<")
-        logger.log(">>> Long Option Entries will be VETOED/SKIPPED.")
-    
-    # Double check DNT just in case
-    dnt_res = dnt_engine.check_dnt(dnt_context)
+
+    dnt_res = ctx.get("dnt_market", lambda: dnt_engine.check_dnt_market(dnt_context))
     if dnt_res['do_not_trade']:
-        return {"status": "WAIT", "reason": f"DNT: {dnt_res['primary_reason']}"}
-    
-    # ----------------------------------------------------
-    # EXPECTED MOVE MATH GATE
-    # ----------------------------------------------------
-    import expected_move_engine
-    import greeks_engine
-    
-    metrics['spot_price'] = spot_price
-    metrics['regime'] = regime_str
-    
-    atm = atm_engine.get_atm_strike(spot_price, symbol)
-    dte = greeks_engine.calculate_time_to_expiry(expiry_data['date'])
-    check_iv = iv if iv else 0.15 
-    check_type = "CE" if final_view == "BULLISH" else "PE"
-    
-    greeks_proxy = greeks_engine.get_greeks(spot_price, atm, dte, 0.07, check_iv, check_type)
-    greeks_proxy['iv'] = check_iv * 100 
-    
-    check_sym_base = expiry_engine.get_option_symbol(symbol, expiry_data['date'], atm, check_type)
-    check_sym = "NFO:" + check_sym_base
-    check_prem = kite_data.get_ltp(check_sym, kite) 
-    
+        return _dnt_wait(ctx.logger, dnt_res)
+    return None
+
+def _gate_expectancy(ctx):
+    """
+    EXPECTED MOVE MATH GATE on the ATM contract in the direction of the view.
+    Not applied on the BUY tier: its strike selection applies the same rule
+    to every strike of the chain (see _stage_strike_selection).
+    """
+    if ctx.margin < 50000:
+        return None
+    atm = _atm(ctx)
+    check_type = "CE" if _final_view(ctx) == "BULLISH" else "PE"
+    check_sym = _option_symbol(ctx, atm, check_type)
+    check_prem = ctx.get("check_premium", lambda: kite_data.get_ltp(check_sym, ctx.kite))
     if check_prem:
-        check_cand = {"premium": check_prem, "type": check_type, "strike": atm}
-        math_res = expected_move_engine.evaluate_expectancy(check_cand, metrics, greeks_proxy)
-        
-        logger.log("\n--- EXPECTANCY CHECK ---")
-        if not math_res['allowed']:
-             est_delta = abs(greeks_proxy.get('delta', 0.5))
-             gain = math_res['expected_option_gain']
-             cost = math_res['expected_cost']
-             edge = math_res['edge_ratio']
-
-             logger.log("\n-----------------------------------------------------------")
-             logger.log(" ⛔ MATH VETO: Trade has negative mathematical edge.")
-             logger.log("-----------------------------------------------------------")
-             logger.log(f"Reason: {math_res['decision_reason']}")
-
-             logger.log("\n[WHY WAS THIS VETOED?]")
-             logger.log("The Expected Spot Move is not enough to cover the Option Cost")
-             logger.log("because options only capture a fraction (Delta) of the move.")
-
-             logger.log(f"\n[THE MATH]")
-             logger.log(f"• Spot Move Required : {math_res['expected_spot_move']} pts (Based on Volatility)")
-             logger.log(f"• Option Delta       : {est_delta:.2f} (Captures ~{int(est_delta*100)}% of spot move)")
-             logger.log(f"• Expected Option Gain ≈ ₹{gain:.2f} (Spot Move * Delta)")
-             logger.log(f"• Total Cost/Risk      ≈ ₹{cost:.2f} (Stop Loss + Decay + Slippage)")
-
-             logger.log(f"\n[COMPARISON]")
-             logger.log(f"Expected Option Gain (₹{gain:.2f}) < Option Cost (₹{cost:.2f})")
-             logger.log(f"Edge = {edge:.2f} means you expect to get ₹{edge:.2f} back for every ₹1 risked.")
-
-             logger.log(f"\n[CONCLUSION]")
-             logger.log("This trade is mathematically losing even if direction is correct.")
-             logger.log("This setup benefits OPTION SELLERS, not buyers.")
-
-             logger.log(f"\n[WHAT MUST CHANGE?]")
-             logger.log("1. Expected Move must increase (Waiting for stronger breakout?)")
-             logger.log("2. Option Cost must fall (Wait for pullback/lower premiums?)")
-             logger.log("3. Delta must improve (Select a closer strike?)")
-             logger.log("-----------------------------------------------------------")
-             
-             return {"status": "WAIT", "reason": f"Math Veto: {math_res['decision_reason']}"}
-        else:
-             logger.log(f"✅ PASSED Edge Ratio: {math_res['edge_ratio']}")
-    
-    # Strike Integration
-    atm = atm_engine.get_atm_strike(spot_price, symbol)
-    final_trade_legs = []
-    
-    # Default State
-    is_hedged = False
-    strategy_name = ""
-    
+        return _check_expectancy(ctx, atm, check_type, check_prem)
+    return None
+
+def _check_expectancy(ctx, strike, opt_type, premium):
+    """
+    expected_move_engine verdict for one contract: WAIT if vetoed, else None.
+    """
+    logger = ctx.logger
+    spot_price = ctx["spot_price"]
+    metrics = dict(_metrics(ctx), spot_price=spot_price, regime=_regime(ctx))
+
+    dte = greeks_engine.calculate_time_to_expiry(_expiry(ctx)['date'])
+    iv = _iv(ctx)
+    check_iv = iv / 100.0 if iv else 0.15 # get_iv_value returns percent
+
+    greeks_proxy = greeks_engine.get_greeks(spot_price, strike, dte, 0.07, check_iv, opt_type)
+    greeks_proxy['iv'] = check_iv * 100
+
+    check_cand = {"premium": premium, "type": opt_type, "strike": strike}
+    math_res = expected_move_engine.evaluate_expectancy(check_cand, metrics, greeks_proxy)
+
+    logger.log("\n--- EXPECTANCY CHECK ---")
+    if not math_res['allowed']:
+         _log_math_veto(logger, math_res, greeks_proxy)
+         return {"status": "WAIT", "reason": f"Math Veto: {math_res['decision_reason']}"}
+    logger.log(f"✅ PASSED Edge Ratio: {math_res['edge_ratio']}")
+    return None
+
+def _expectancy_needs(ctx):
+    """
+    Nothing to fetch on the BUY tier, where the gate does not apply.
+    """
+    if ctx.margin < 50000:
+        return {}
+    return {"metrics": COST_HISTORICAL, "iv": COST_QUOTE, "final_view": COST_CHAIN, "check_premium": COST_QUOTE}
+
+def _dnt_wait(logger, dnt_res):
+    logger.log("\n🛑 DO-NOT-TRADE ACTIVE")
+    logger.log(f"   Reason: {dnt_res['primary_reason']} ({dnt_res['risk_category']})")
+    return {"status": "WAIT", "reason": f"DNT: {dnt_res['primary_reason']}"}
+
+# Gate inputs and what it costs to fetch each one if not yet memoized.
+PRE_GATES = GateScheduler([
+    Gate("dnt_journal", _gate_dnt_journal),
+])
+
+def _confirmation_needs(ctx):
+    """
+    The PCR chain (which also settles a neutral view) is only read when
+    performance feedback demands extra confirmation.
+    """
+    if _feedback(ctx).get('extra_confirmation_required', False):
+        return {"pcr": COST_CHAIN}
+    return {"feedback": COST_LOCAL}
+
+GATE_SCHEDULER = GateScheduler([
+    Gate("confirmation", _gate_confirmation, needs=_confirmation_needs),
+    Gate("dnt_market", _gate_dnt_market,
+         needs={"metrics": COST_HISTORICAL, "iv": COST_QUOTE}),
+    Gate("expectancy", _gate_expectancy, needs=_expectancy_needs),
+])
+
+def _log_math_veto(logger, math_res, greeks_proxy):
+    est_delta = abs(greeks_proxy.get('delta', 0.5))
+    gain = math_res['expected_option_gain']
+    cost = math_res['expected_cost']
+    edge = math_res['edge_ratio']
+
+    logger.log("\n-----------------------------------------------------------")
+    logger.log(" ⛔ MATH VETO: Trade has negative mathematical edge.")
+    logger.log("-----------------------------------------------------------")
+    logger.log(f"Reason: {math_res['decision_reason']}")
+
+    logger.log("\n[WHY WAS THIS VETOED?]")
+    logger.log("The Expected Spot Move is not enough to cover the Option Cost")
+    logger.log("because options only capture a fraction (Delta) of the move.")
+
+    logger.log(f"\n[THE MATH]")
+    logger.log(f"• Spot Move Required : {math_res['expected_spot_move']} pts (Based on Volatility)")
+    logger.log(f"• Option Delta       : {est_delta:.2f} (Captures ~{int(est_delta*100)}% of spot move)")
+    logger.log(f"• Expected Option Gain ≈ ₹{gain:.2f} (Spot Move * Delta)")
+    logger.log(f"• Total Cost/Risk      ≈ ₹{cost:.2f} (Stop Loss + Decay + Slippage)")
+
+    logger.log(f"\n[COMPARISON]")
+    logger.log(f"Expected Option Gain (₹{gain:.2f}) < Option Cost (₹{cost:.2f})")
+    logger.log(f"Edge = {edge:.2f} means you expect to get ₹{edge:.2f} back for every ₹1 risked.")
+
+    logger.log(f"\n[CONCLUSION]")
+    logger.log("This trade is mathematically losing even if direction is correct.")
+    logger.log("This setup benefits OPTION SELLERS, not buyers.")
+
+    logger.log(f"\n[WHAT MUST CHANGE?]")
+    logger.log("1. Expected Move must increase (Waiting for stronger breakout?)")
+    logger.log("2. Option Cost must fall (Wait for pullback/lower premiums?)")
+    logger.log("3. Delta must improve (Select a closer strike?)")
+    logger.log("-----------------------------------------------------------")
+
+def _best_edge_strike(ctx, opt_type):
+    """
+    strike_optimizer over one batched chain snapshot (memoized per type).
+    """
+    def compute():
+        expiry_date = _expiry(ctx)['date']
+        chain = strike_optimizer.fetch_chain_snapshot(ctx.kite, ctx["symbol"], expiry_date, _atm(ctx), opt_type)
+        metrics = dict(_metrics(ctx), regime=_regime(ctx))
+        T = greeks_engine.calculate_time_to_expiry(expiry_date)
+        return strike_optimizer.optimize_strike(chain, ctx["spot_price"], T, opt_type, metrics, ctx.capital, ctx["symbol"])
+    return ctx.get(("best_strike", opt_type), compute)
+
+def _stage_strike_selection(ctx):
+    """
+    Chooses strategy by margin tier and validates the strikes of every leg.
+    Legs are stored un-sized; quantities are set by the sizing stage.
+    """
+    logger = ctx.logger
+    symbol = ctx["symbol"]
+    margin = ctx.margin
+    final_view = _final_view(ctx)
+    expiry_data = _expiry(ctx)
+    atm = _atm(ctx)
+    legs = []
+
     if margin >= 150000:
         # HIGH MARGIN -> Sell Strategies
         logger.log(f"[-] High Margin (>=1.5L). Strategy: OPTION SELLING")
         sell_type = "PE" if final_view == "BULLISH" else "CE"
-        action = "SELL"
-        opt_type = sell_type 
-        
-        sym_base = expiry_engine.get_option_symbol(symbol, expiry_data['date'], atm, sell_type)
-        sym = "NFO:" + sym_base
-        prem = validate_option(sym, kite)
-        
+        ctx.update(strategy_kind="SELL", strategy_label=f"SELL {sell_type}")
+
+        sym = _option_symbol(ctx, atm, sell_type)
+        prem = _validated_premium(ctx, sym)
+
         if prem is None:
             logger.log(f"[!] Validation Failed for {sym}.")
             return {"status": "WAIT", "reason": "Option Validation Failed (LTP/Vol)"}
 
-        est_margin = margin_engine.estimate_short_margin(symbol, atm, prem)
-        lots = int(margin / est_margin) if est_margin > 0 else 0
-        lots = int(lots * size_mult)
-        
-        final_trade_legs.append({
+        legs.append({
             "action": "SELL", "symbol": sym,
             "strike": atm, "type": sell_type,
-            "qty": (lots if lots > 0 else 1) * (50 if "NIFTY" in symbol else 15),
             "premium": prem
         })
 
     elif margin >= 50000:
         # MID MARGIN -> Hedged Spreads
         print(f"[-] Mid Margin (50k-1.5L). Strategy: HEDGED SPREAD")
+        iv_rank = _iv_rank(ctx)
         hedged_strat = hedging_engine.get_hedged_strategy(
-            final_view, capital, margin, symbol, expiry_data, atm,
+            final_view, ctx.capital, margin, symbol, expiry_data, atm,
             iv_rank=(iv_rank if iv_rank else 0)
         )
         strategy_name = hedged_strat['name']
         logger.log(f"    -> Suggesting: {strategy_name}")
         logger.log(f"    -> Reason: {hedged_strat['reason']}")
-        is_hedged = True
-        
+        ctx.update(strategy_kind="HEDGED", strategy_label=strategy_name)
+
         if strategy_name == "WAIT":
              return {"status": "WAIT", "reason": "Hedge Engine suggested WAIT"}
-        
+
         for leg in hedged_strat['legs']:
-            leg_sym_base = expiry_engine.get_option_symbol(symbol, expiry_data['date'], leg['strike'], leg['type'])
-            leg_sym = "NFO:" + leg_sym_base
-            prem = validate_option(leg_sym, kite)
+            leg_sym = _option_symbol(ctx, leg['strike'], leg['type'])
+            prem = _validated_premium(ctx, leg_sym)
             if prem is None:
                 logger.log(f"[!] Validation Failed for {leg_sym}. Skipping Leg.")
                 return {"status": "WAIT", "reason": "Leg Validation Failed (LTP/Vol)"}
-                
-            final_trade_legs.append({
+
+            legs.append({
                 "action": leg['action'], "symbol": leg_sym,
                 "strike": leg['strike'], "type": leg['type'],
-                "qty": int(leg['quantity'] * size_mult) * (50 if "NIFTY" in symbol else 15),
+                "units": leg['quantity'],
                 "premium": prem
             })
-            
+
     else:
         # LOW MARGIN -> Buy Cheap OTM/ATM
-        if high_iv_condition:
+        if _high_iv_condition(ctx):
             logger.log("🚫 SKIPPING BUY TRADE: High IV requires Credit Strategy.")
             return {"status": "WAIT", "reason": "High IV + Low Margin (Cannot Sell)"}
 
         opt_type = "CE" if final_view == "BULLISH" else "PE"
         logger.log(f"[-] Low Margin (<50k). Strategy: BUY OPTION {opt_type}")
-        action = "BUY"
-        
-        otm_data = otm_engine.find_affordable_otm(capital, symbol, atm, expiry_data, opt_type, kite)
-        
+        ctx.update(strategy_kind="BUY", strategy_label=f"BUY {opt_type}")
+
+        # Most edge across the chain (every strike already passed the
+        # expectancy rule). If none qualifies (or the chain could not be
+        # read), the first affordable OTM must pass the rule itself.
+        otm_data = _best_edge_strike(ctx, opt_type)
+        optimized = otm_data is not None
+        if optimized:
+            logger.log(f"    -> Optimizer: {otm_data['symbol']} (Edge {otm_data['edge_ratio']:.2f}, Δ {otm_data['delta']:.2f}, {otm_data['candidates']} strikes qualified)")
+        else:
+            otm_data = otm_engine.find_affordable_otm(ctx.capital, symbol, atm, expiry_data, opt_type, ctx.kite)
+
         if otm_data["premium"] is None or otm_data["premium"] == 0:
              logger.log("[!] No valid premium found for Buying. Abort.")
              return {"status": "WAIT", "reason": "No Affordable Option Found"}
-             
-        check_prem = validate_option(otm_data["symbol"], kite)
+
+        if not optimized:
+            verdict = _check_expectancy(ctx, otm_data["strike"], opt_type, otm_data["premium"])
+            if verdict is not None:
+                return verdict
+
+        check_prem = _validated_premium(ctx, otm_data["symbol"])
         if not check_prem:
              logger.log("[!] Selected OTM failed strict validation (Vol/OI).")
              return {"status": "WAIT", "reason": "OTM Validation Failed"}
 
-        final_trade_legs.append({
-            "action": "BUY", "symbol": otm_data["symbol"], 
-            "strike": otm_data["strike"], "type": opt_type, 
-            "qty": int(otm_data["qty"] * size_mult), 
+        legs.append({
+            "action": "BUY", "symbol": otm_data["symbol"],
+            "strike": otm_data["strike"], "type": opt_type,
+            "units": otm_data["qty"],
             "premium": otm_data["premium"]
         })
-    
-    # 5. Output Trade Plan (Veto Check)
-    import trade_veto_engine
-    
-    regime_str = market_regime_engine.get_market_regime(symbol if "NIFTY" in symbol else "NIFTY") 
+
+    ctx.set("candidate_legs", legs)
+    return None
+
+def _leg_sigma(ctx):
+    """
+    ATM IV as a decimal if this scan already fetched it (never fetches).
+    """
+    iv = ctx["iv"] if ctx.has("iv") else None
+    return iv / 100.0 if iv else None
+
+def _plan_margin(ctx, legs):
+    """
+    Local portfolio margin for the plan's legs; hedges offset the shorts.
+    With config.MARGIN_BROKER_CHECK the estimate is also compared with
+    kite.basket_order_margins (under "broker"; None if the call failed).
+    """
+    margin_legs = [{
+        "symbol": leg['symbol'], "underlying": ctx["symbol"], "strike": leg['strike'], "type": leg['type'],
+        "qty": leg['qty'] if leg['action'] == "BUY" else -leg['qty'],
+        "sigma": _leg_sigma(ctx), "expiry": _expiry(ctx)['date']
+    } for leg in legs]
+    spots = {ctx["symbol"]: ctx["spot_price"]}
+    estimate = margin_engine.estimate_portfolio_margin(margin_legs, spots)
+    if getattr(config, "MARGIN_BROKER_CHECK", False) and ctx.kite is not None:
+        estimate["broker"] = margin_engine.verify_with_broker(margin_legs, ctx.kite, spots)
+    return estimate
+
+def _stage_sizing(ctx):
+    """
+    Converts un-sized legs into quantities, throttled by performance feedback.
+    """
+    symbol = ctx["symbol"]
+    size_mult = _size_mult(ctx)
+    lot_units = margin_engine.get_lot_size(symbol)
+    kind = ctx["strategy_kind"]
+
+    legs = []
+    for candidate in ctx["candidate_legs"]:
+        leg = dict(candidate)
+        if kind == "SELL":
+            # Local SPAN-style estimate for one short lot (no margin API call)
+            est_margin = margin_engine.margin_per_lot(
+                symbol, leg['strike'], leg['type'], spot=ctx["spot_price"],
+                sigma=_leg_sigma(ctx), expiry=_expiry(ctx)['date']
+            )
+            lots = int(ctx.margin / est_margin) if est_margin > 0 else 0
+            lots = int(lots * size_mult)
+            leg['qty'] = (lots if lots > 0 else 1) * lot_units
+        elif kind == "HEDGED":
+            leg['qty'] = int(leg.pop('units') * size_mult) * lot_units
+        else:
+            leg['qty'] = int(leg.pop('units') * size_mult)
+        legs.append(leg)
+
+    ctx.set("legs", legs)
+    return None
+
+def _stage_veto(ctx):
+    """
+    Runs every leg through trade_veto_engine; any veto blocks the trade.
+    """
+    logger = ctx.logger
+    iv_rank = _iv_rank(ctx)
     veto_context = {
-        "regime": regime_str,
-        "trend": trend_dir,
-        "volatility": volatility,
-        "spot_price": spot_price,
+        "regime": _regime(ctx),
+        "trend": ctx["trend"],
+        "volatility": ctx["volatility"],
+        "spot_price": ctx["spot_price"],
         "iv_rank": iv_rank if iv_rank else 0
     }
-    
+
     logger.log("\n--- VETO CHECK ---")
-    
-    legs_to_keep = []
-    trade_blocked = False
-    block_reason = ""
-    
-    for leg in final_trade_legs:
-        cand = {
-            "symbol": leg['symbol'],
-            "action": leg['action'], 
-            "type": leg['type'], 
-            "strike": leg['strike'],
-            "expiry": expiry_data['date'],
-            "premium": leg['premium']
-        }
-        
-        veto_res = trade_veto_engine.check_veto(cand, veto_context, kite)
-        
+
+    cands = [{
+        "symbol": leg['symbol'],
+        "action": leg['action'],
+        "type": leg['type'],
+        "strike": leg['strike'],
+        "expiry": _expiry(ctx)['date'],
+        "premium": leg['premium']
+    } for leg in ctx["legs"]]
+
+    # All legs against one quote snapshot (served from the scan's quote cache)
+    verdicts = trade_veto_engine.check_veto_batch(cands, veto_context, ctx.kite)
+
+    for leg, veto_res in zip(ctx["legs"], verdicts):
         if veto_res['veto']:
             logger.log(f"🚫 BLOCKED: {leg['symbol']}")
             logger.log(f"   Reason: {veto_res['veto_reason']} ({veto_res['veto_category']})")
-            trade_blocked = True
-            block_reason = veto_res['veto_reason']
-            break 
-        else:
-            logger.log(f"✅ PASSED: {leg['symbol']}")
-            legs_to_keep.append(leg)
-            
-    if trade_blocked:
-        logger.log("✋ Trade Aborted due to Veto.")
-        return {"status": "WAIT", "reason": f"Veto: {block_reason}"}
-
-    # If passed, print plan
+            logger.log("✋ Trade Aborted due to Veto.")
+            return {"status": "WAIT", "reason": f"Veto: {veto_res['veto_reason']}", "veto_code": veto_res['veto_code']}
+
+        logger.log(f"✅ PASSED: {leg['symbol']}")
+
+    return None
+
+# Ordered stage table: (name, stage, context keys it produces).
+# Names are what callers pass in skip_stages; a skipped stage's keys must
+# be in the seed. Lazily memoized values (expiry, pcr, iv...) are not
+# listed because any later stage computes them on demand.
+STAGES = [
+    ("precheck", _stage_precheck, ()),
+    ("selection", _stage_selection, ("symbol", "trend", "volatility", "spot_price")),
+    ("market_context", _stage_market_context, ()),
+    ("gates", _stage_gates, ()),
+    ("strike_selection", _stage_strike_selection, ("strategy_kind", "strategy_label", "candidate_legs")),
+    ("sizing", _stage_sizing, ("legs",)),
+    ("veto", _stage_veto, ()),
+]
+PRECHECK_STAGES = [stage for stage in STAGES if stage[0] == "precheck"]
+
+def _build_trade_plan(ctx):
+    """
+    Prints the final plan and attaches SL/Target to each leg.
+    """
+    logger = ctx.logger
+    final_trade_legs = ctx["legs"]
+    strategy_label = ctx["strategy_label"]
+
     logger.log("\n========================================")
-    logger.log(f" TRADE PLAN: {strategy_name if is_hedged else (action + ' ' + opt_type)}")
+    logger.log(f" TRADE PLAN: {strategy_label}")
     logger.log("========================================")
-    
+
     total_cost = 0
     total_margin = 0
-    
-    for leg in final_trade_legs:
+
+    for idx, leg in enumerate(final_trade_legs):
         val = leg['qty'] * leg['premium']
         sl_price = 0
         target_price = 0
         if leg['action'] == "BUY":
-            sl_price = leg['premium'] * 0.80   
-            target_price = leg['premium'] * 1.30 
+            sl_price = leg['premium'] * 0.80
+            target_price = leg['premium'] * 1.30
             total_cost += val
         else:
-            sl_price = leg['premium'] * 1.30   
-            target_price = leg['premium'] * 0.50 
-            total_cost -= val 
-            total_margin += 60000 
+            sl_price = leg['premium'] * 1.30
+            target_price = leg['premium'] * 0.50
+            total_cost -= val
 
-        logger.log(f"Leg {final_trade_legs.index(leg)+1}: {leg['action']} {leg['symbol']} @ {leg['premium']}")
+        logger.log(f"Leg {idx+1}: {leg['action']} {leg['symbol']} @ {leg['premium']}")
         logger.log(f"       Qty: {leg['qty']} | Val: {val:.2f}")
         logger.log(f"       [SL]: {sl_price:.2f} | [Tgt]: {target_price:.2f}")
 
         leg['sl'] = sl_price
         leg['target'] = target_price
-            
+
+    if any(leg['action'] == "SELL" for leg in final_trade_legs):
+        margin_est = _plan_margin(ctx, final_trade_legs)
+        total_margin = margin_est["total"]
+        logger.log(f"Margin (local est.): SPAN {margin_est['span']:.0f} + Exposure {margin_est['exposure']:.0f}"
+                   f" | Hedge Benefit: {margin_est['hedge_benefit']:.0f}")
+        if margin_est.get("broker"):
+            check = margin_est["broker"]
+            logger.log(f"Margin (broker)    : {check['broker']:.0f} (local est. off by {check['diff_pct']:+.1f}%)")
+
     logger.log(f"Net Premium Impact: {total_cost:.2f} ({'Debit' if total_cost > 0 else 'Credit'})")
     logger.log(f"\nEst. Capital/Margin Req: {total_margin if total_margin > 0 else total_cost:.2f}")
 
     return {
-        "status": "TRADE", 
+        "status": "TRADE",
         "reason": "All Conditions Met",
         "data": {
-            "strategy": strategy_name if is_hedged else f"{action} {opt_type}",
+            "strategy": strategy_label,
             "cost": total_cost,
             "margin": total_margin,
             "legs": final_trade_legs
         }
     }
 
+@telemetry.traced()
+def _suggest_trade_logic(capital, margin, **kwargs):
+    """
+    Analyzes market with Advanced Quantitative Logic.
+    Strict Compliance: Zerodha Kite Only.
+
+    Runs the STAGES pipeline over one ScanContext. Optional kwargs:
+    - logger: SimpleLogger to write to
+    - kite: API instance (defaults to kite_data.get_kite())
+    - skip_stages: iterable of stage names to bypass
+    - seed: dict of pre-computed context values (e.g. symbol, trend);
+      must hold the outputs of every skipped stage (see STAGES)
+
+    Returns: Dict { "status": "WAIT"|"TRADE", "reason": str, "data": dict, "timings": dict }
+    """
+    # Initialize Logger
+    import logger as logger_module
+    if 'logger' not in kwargs:
+         logger = logger_module.SimpleLogger() # Local instance
+    else:
+         logger = kwargs['logger']
+
+    logger.log(f"\n--- ZERODHA QUANT OPTION BOT ---")
+
+    ctx = ScanContext(
+        capital, margin, logger,
+        kite=kwargs.get('kite') or kite_data.get_kite(),
+        skip_stages=kwargs.get('skip_stages'),
+        seed=kwargs.get('seed')
+    )
+
+    result = run_stages(ctx, STAGES)
+    if result is None:
+        result = _build_trade_plan(ctx)
+
+    result["timings"] = dict(ctx.timings)
+    return result
+
+
+# -------------------------------------------------------------------------
+# MULTI-CANDIDATE EVALUATION (TOP-N SYMBOLS)
+# -------------------------------------------------------------------------
+MAX_PARALLEL_CANDIDATES = 3 # Bounded so candidate scans share the rate limit fairly
+
+def _suggest_top_candidates(capital, margin, top_n, **kwargs):
+    """
+    Evaluates the top_n ranked symbols concurrently and returns the best
+    (highest ranked) one that passes. All passing candidates, best first,
+    are listed under "candidates"; failed ones under "rejections".
+
+    Candidates share one ScanKite (one snapshot, one rate limiter) and each
+    buffers its own log, merged in rank order once all are done.
+    """
+    import logger as logger_module
+    logger = kwargs['logger']
+    logger.log(f"\n--- ZERODHA QUANT OPTION BOT (TOP {top_n}) ---")
+
+    # Journal DNT is symbol-independent: check it once for the whole batch
+    pre_ctx = ScanContext(capital, margin, logger)
+    verdict = run_stages(pre_ctx, PRECHECK_STAGES)
+    if verdict is not None:
+        verdict["timings"] = dict(pre_ctx.timings)
+        return verdict
+
+    logger.log("[*] Scanning Markets (Trend/Momentum/Volatility)...")
+    ranked = rank_symbols(limit=top_n)
+    if not ranked:
+        logger.log("[!] No symbol could be scored.")
+        return {"status": "WAIT", "reason": "No Candidates Found"}
+
+    shared_kite = ScanKite(kwargs.get('kite') or kite_data.get_kite())
+    skip_stages = set(kwargs.get('skip_stages') or []) | {"precheck"}
+
+    def evaluate(details):
+        cand_logger = logger_module.SimpleLogger(echo=False)
+        seed = {
+            "symbol": details['symbol'],
+            "reason_msg": details['reasons'],
+            "trend": details['trend'],
+            "volatility": details['volatility'],
+            "spot_price": details['close']
+        }
+        try:
+            result = _suggest_trade_logic(capital, margin, logger=cand_logger, kite=shared_kite,
+                                          skip_stages=skip_stages, seed=seed)
+        except Exception as e:
+            cand_logger.log(f"[!] Candidate {details['symbol']} crashed: {e}")
+            result = {"status": "WAIT", "reason": f"Crash: {e}"}
+        result["symbol"] = details['symbol']
+        return result, cand_logger
+
+    workers = max(1, min(MAX_PARALLEL_CANDIDATES, len(ranked)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(telemetry.bind(evaluate), ranked))
+
+    passing = []
+    rejections = []
+    for rank, (result, cand_logger) in enumerate(outcomes, start=1):
+        logger.log(f"\n##### CANDIDATE #{rank}: {result['symbol']} -> {result['status']} #####")
+        for line in cand_logger.logs:
+            logger.log(line)
+        if result['status'] == "TRADE":
+            passing.append(result)
+        else:
+            rejections.append({"symbol": result['symbol'], "reason": result['reason']})
+
+    logger.log(f"\n[Pipeline] API calls for {len(ranked)} candidates: {dict(shared_kite.calls)}")
+
+    if not passing:
+        best = outcomes[0][0]
+        return {
+            "status": "WAIT",
+            "reason": f"All {len(ranked)} candidates rejected ({best['symbol']}: {best['reason']})",
+            "candidates": [],
+            "rejections": rejections
+        }
+
+    best = dict(passing[0])
+    best["candidates"] = passing
+    best["rejections"] = rejections
+    logger.log(f"[Pipeline] Selected {best['symbol']} ({len(passing)}/{len(ranked)} candidates passed)")
+    return best
 
 # -------------------------------------------------------------------------
 # WRAPPER FOR TELEGRAM INTEGRATION
 # -------------------------------------------------------------------------
-def suggest_trade(capital, margin, **kwargs):
+def suggest_trade(capital, margin, top_n=1, **kwargs):
     """
     Wrapper function that:
     1. Initializes Logger
-    2. Runs analysis (_suggest_trade_logic)
+    2. Runs analysis (_suggest_trade_logic, or _suggest_top_candidates if top_n > 1)
     3. Flushes logs to Telegram
     4. Returns Result
     """
@@ -479,14 +863,20 @@ def suggest_trade(capital, margin, **kwargs):
         logger = logger_module.SimpleLogger()
         kwargs['logger'] = logger
         
-    try:
-        # Run Core Logic
-        result = _suggest_trade_logic(capital, margin, **kwargs)
-        return result
-    except Exception as e:
-        logger.log(f"[!] Critical Error in Suggestion Engine: {e}")
-        return {"status": "WAIT", "reason": f"Crash: {e}"}
-    finally:
-        # ALWAYS flush logs to Telegram at the end
-        if hasattr(logger, 'flush_to_telegram'):
-            logger.flush_to_telegram()
+    # One scan id for everything below (telemetry spans, API timings, profiles)
+    with telemetry.scan("suggest_trade") as scan_id, profiler.profile_scan(scan_id):
+        try:
+            # Run Core Logic
+            if top_n > 1:
+                result = _suggest_top_candidates(capital, margin, top_n, **kwargs)
+            else:
+                result = _suggest_trade_logic(capital, margin, **kwargs)
+        except Exception as e:
+            logger.log(f"[!] Critical Error in Suggestion Engine: {e}")
+            result = {"status": "WAIT", "reason": f"Crash: {e}"}
+        finally:
+            # ALWAYS flush logs to Telegram at the end
+            if hasattr(logger, 'flush_to_telegram'):
+                logger.flush_to_telegram()
+    result["scan_id"] = scan_id
+    return result
@@ -1,32 +1,349 @@
+import time
+import queue
+import atexit
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 import config
 import logging
+from rate_limiter import TokenBucket
 
-# Setup a local logger for this module to avoid recursion loops 
+# Setup a local logger for this module to avoid recursion loops
 # (if we used the main logger which uses this module)
 logging.basicConfig(level=logging.INFO)
 local_logger = logging.getLogger("TelegramInterface")
 
-def send_telegram_message(message):
+# ------------------------------------------------------------------------
+# BACKGROUND DELIVERY QUEUE
+# ------------------------------------------------------------------------
+# send_telegram_message only enqueues; one daemon thread delivers over a
+# pooled HTTP session. Messages for the same chat that arrive within
+# COALESCE_WINDOW go out together, re-split at Telegram's 4096-character
+# limit (code fences closed and re-opened across chunks). Each chat has
+# its own token bucket, and failed sends back off and retry.
+
+API_URL = "https://api.telegram.org/bot{token}/{method}"
+MAX_MESSAGE_LEN = 4096
+COALESCE_WINDOW = 0.5   # seconds to gather a burst before sending
+CHAT_RATE = 1.0         # messages per second per chat (Telegram guideline)
+CHAT_BURST = 3
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0      # seconds, doubled per retry
+SEND_TIMEOUT = 10
+EXIT_FLUSH_TIMEOUT = 5  # seconds given to pending messages at interpreter exit
+FENCE = "```"
+
+def split_message(text, limit=MAX_MESSAGE_LEN):
     """
-    Sends a message to the configured Telegram Chat.
-    Swallows exceptions to prevent bot crashes.
+    Splits text into chunks of at most limit characters, on line breaks
+    where possible. A ``` block cut by a split is closed at the end of
+    its chunk and re-opened at the start of the next one.
     """
-    if not config.TELEGRAM_BOT_TOKEN or not config.TELEGRAM_CHAT_ID:
+    if len(text) <= limit:
+        return [text]
+
+    reserve = len(FENCE) + 1          # room for a closing fence
+    width = limit - 2 * reserve - 1   # longest line piece that always fits
+    chunks, current = [], []
+    size, in_fence = 0, False
+
+    for line in text.split("\n"):
+        pieces = [line[i:i + width] for i in range(0, len(line), width)] or [""]
+        for piece in pieces:
+            if current and size + 1 + len(piece) + reserve > limit:
+                chunks.append("\n".join(current + [FENCE] if in_fence else current))
+                current = [FENCE] if in_fence else []
+                size = len(FENCE) if in_fence else 0
+            size += len(piece) + (1 if current else 0)
+            current.append(piece)
+        if line.strip().startswith(FENCE):
+            in_fence = not in_fence
+
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+class TelegramSender:
+    def __init__(self, token=None, coalesce_window=COALESCE_WINDOW):
+        self.token = token
+        self.coalesce_window = coalesce_window
+        self.queue = queue.Queue()
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.buckets = {} # chat_id -> TokenBucket
+        self.pending = 0
+        self.cond = threading.Condition()
+        self.sent = 0
+        self.failed = 0
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="TelegramSender", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=EXIT_FLUSH_TIMEOUT):
+        self.flush(timeout)
+        self._stop.set()
+        self.queue.put(None)
+
+    def send(self, text, chat_id, parse_mode="Markdown"):
+        """
+        Enqueues a message and returns immediately.
+        """
+        with self.cond:
+            self.pending += 1
+        self.queue.put((str(chat_id), text, parse_mode))
+        self.start()
+
+    def flush(self, timeout=None):
+        """
+        Blocks until every queued message is delivered (or given up).
+        Returns False if timeout expired first.
+        """
+        with self.cond:
+            return self.cond.wait_for(lambda: self.pending == 0, timeout)
+
+    # --------------------------------------------------------------------
+    # WORKER
+    # --------------------------------------------------------------------
+    def _run(self):
+        while not self._stop.is_set():
+            item = self.queue.get()
+            if item is None:
+                continue
+            batch = [item]
+            # Gather the rest of the burst
+            deadline = time.monotonic() + self.coalesce_window
+            while True:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                try:
+                    nxt = self.queue.get(timeout=left)
+                except queue.Empty:
+                    break
+                if nxt is not None:
+                    batch.append(nxt)
+
+            try:
+                for chat_id, parse_mode, text in self._coalesce(batch):
+                    for chunk in split_message(text):
+                        self._deliver(chat_id, chunk, parse_mode)
+            except Exception as e:
+                local_logger.error(f"Telegram delivery error: {e}")
+            finally:
+                with self.cond:
+                    self.pending -= len(batch)
+                    self.cond.notify_all()
+
+    def _coalesce(self, batch):
+        """
+        Joins consecutive messages with the same chat and parse mode.
+        """
+        groups = []
+        for chat_id, text, parse_mode in batch:
+            if groups and groups[-1][0] == chat_id and groups[-1][1] == parse_mode:
+                groups[-1][2].append(text)
+            else:
+                groups.append((chat_id, parse_mode, [text]))
+        return [(chat_id, parse_mode, "\n".join(texts)) for chat_id, parse_mode, texts in groups]
+
+    def _deliver(self, chat_id, text, parse_mode):
+        bucket = self.buckets.setdefault(chat_id, TokenBucket(f"telegram:{chat_id}", CHAT_RATE, CHAT_BURST))
+        url = API_URL.format(token=self.token or config.TELEGRAM_BOT_TOKEN, method="sendMessage")
+        payload = {"chat_id": chat_id, "text": text}
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+
+        for attempt in range(MAX_RETRIES + 1):
+            bucket.acquire()
+            delay = BACKOFF_BASE * (2 ** attempt)
+            try:
+                response = self.session.post(url, json=payload, timeout=SEND_TIMEOUT)
+                if response.status_code == 200:
+                    self.sent += 1
+                    return True
+                if response.status_code == 429:
+                    # Flood control: Telegram says how long to back off
+                    try:
+                        delay = response.json().get("parameters", {}).get("retry_after", delay)
+                    except ValueError:
+                        pass
+                elif response.status_code == 400 and "parse" in response.text.lower() and "parse_mode" in payload:
+                    # Markdown entity error (stray _ or *): resend as plain text
+                    payload.pop("parse_mode")
+                    continue
+                elif response.status_code < 500:
+                    local_logger.error(f"Failed to send Telegram message: {response.text}")
+                    break
+            except Exception as e:
+                local_logger.warning(f"Telegram connection error (attempt {attempt + 1}): {e}")
+            if attempt < MAX_RETRIES:
+                time.sleep(delay)
+
+        self.failed += 1
+        local_logger.error(f"Giving up on Telegram message to {chat_id} after {MAX_RETRIES + 1} attempts")
+        return False
+
+# Process-wide sender; pending messages get a short grace period at exit
+_sender = None
+_sender_lock = threading.Lock()
+
+def get_sender():
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = TelegramSender()
+            atexit.register(_sender.flush, EXIT_FLUSH_TIMEOUT)
+        return _sender
+
+def send_telegram_message(message, chat_id=None, parse_mode="Markdown"):
+    """
+    Queues a message for the configured Telegram Chat (or chat_id).
+    Never blocks on the network; delivery errors are logged, not raised.
+    """
+    chat_id = chat_id or config.TELEGRAM_CHAT_ID
+    if not config.TELEGRAM_BOT_TOKEN or not chat_id:
         local_logger.warning("Telegram credentials missing in config.py")
         return
 
-    url = f"https://api.telegram.org/bot{config.TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": config.TELEGRAM_CHAT_ID,
-        "text": message,
-        "parse_mode": "Markdown" # Optional: Use 'HTML' or None if characters like _ * are issues
-    }
-    
-    try:
-        # Timeout is important to avoid hanging the main thread
-        response = requests.post(url, json=payload, timeout=5)
-        if response.status_code != 200:
-            local_logger.error(f"Failed to send Telegram message: {response.text}")
-    except Exception as e:
-        local_logger.error(f"Telegram connection error: {e}")
+    get_sender().send(message, chat_id, parse_mode)
+
+# ------------------------------------------------------------------------
+# COMMAND LISTENER (python-telegram-bot)
+# ------------------------------------------------------------------------
+# /auto runs a scan_scheduler.ScanScheduler as a task on the bot's own
+# event loop; scans and the advisor run in the default executor so the
+# listener stays responsive.
+
+HELP_TEXT = ("🤖 *Zerodha Trading Bot Active*\n\nCommands:\n/scan - Run Instant Analysis\n"
+             "/auto <timeframe> - Scan at every bar close (e.g. /auto 5m)\n/stop - Stop Auto Loop\n"
+             "/status - Check Status\n/advice - Analyze Open Positions\n"
+             "/execute - Place the last scan's trade plan as one basket\n"
+             "/profile <n> [collapsed|speedscope] - Profile the next n scans")
+
+def run_telegram_bot():
+    """
+    Starts the Telegram bot listener (blocks until interrupted).
+    """
+    if not config.TELEGRAM_BOT_TOKEN or "YOUR_" in config.TELEGRAM_BOT_TOKEN:
+        print("[!] Invalid Telegram Token. Bot listener will not start.")
+        return
+
+    import asyncio
+    from telegram.ext import ApplicationBuilder, CommandHandler
+    import scan_scheduler
+    import suggestion_engine
+    import timeframe_engine
+
+    state = {"scheduler": None, "task": None, "plan": None}
+
+    def scan():
+        result = suggestion_engine.suggest_trade(config.CAPITAL, config.CAPITAL)
+        if result.get("status") == "TRADE":
+            state["plan"] = result # Kept for /execute
+
+    async def reply(update, text):
+        await update.effective_chat.send_message(text, parse_mode="Markdown")
+
+    async def start_command(update, context):
+        await reply(update, HELP_TEXT)
+
+    async def scan_command(update, context):
+        await reply(update, "🔍 *Scanning Market... Please Wait.*")
+        # Report goes out through the logger's Telegram flush
+        asyncio.get_running_loop().run_in_executor(None, scan)
+
+    async def auto_command(update, context):
+        if state["task"] and not state["task"].done():
+            await reply(update, "⚠️ Auto-mode is already running. Use /stop first.")
+            return
+        timeframe = context.args[0] if context.args else timeframe_engine.pick_timeframe()
+        if timeframe.isdigit():
+            timeframe += "m"
+        try:
+            scan_scheduler.timeframe_seconds(timeframe)
+        except ValueError:
+            await reply(update, "ℹ️ Usage: /auto <timeframe> (e.g. 5m, 15m)")
+            return
+        state["scheduler"] = scan_scheduler.ScanScheduler(scan, timeframe)
+        state["task"] = asyncio.get_running_loop().create_task(state["scheduler"].run())
+        await reply(update, f"🔄 *Auto-Mode Started*. Scanning at every {timeframe} bar close (market hours).")
+
+    async def stop_command(update, context):
+        if not (state["task"] and not state["task"].done()):
+            await reply(update, "ℹ️ Auto-mode is not running.")
+            return
+        state["scheduler"].stop()
+        await reply(update, "🛑 Stopping auto-mode (a running scan is allowed to finish)...")
+
+    async def status_command(update, context):
+        from rate_limiter import kite_limiter
+        lines = [f"✅ Bot is running.\nCapital: ₹{config.CAPITAL}"]
+        if state["scheduler"]:
+            lines.append(state["scheduler"].format_stats())
+        lines.append(kite_limiter.format_metrics())
+        await reply(update, "\n".join(lines))
+
+    async def profile_command(update, context):
+        import profiler
+        try:
+            scans = int(context.args[0]) if context.args else 1
+            armed = profiler.arm(scans, context.args[1] if len(context.args) > 1 else "collapsed")
+        except ValueError as e:
+            await reply(update, f"ℹ️ Usage: /profile <n> [collapsed|speedscope]\n{e}")
+            return
+        await reply(update, f"🔬 Profiling the next {armed['remaining']} scan(s) ({armed['format']}, saved under {armed['directory']}/).")
+
+    async def advice_command(update, context):
+        await reply(update, "🧠 *Analyzing Positions...*")
+
+        def run_advisor():
+            import kite_data
+            import position_advisor_engine
+            try:
+                kite = kite_data.get_kite()
+                positions = kite.positions()['net']
+                send_telegram_message(position_advisor_engine.get_advice_report(kite, positions))
+            except Exception as e:
+                send_telegram_message(f"❌ Advisor Error: {e}")
+
+        asyncio.get_running_loop().run_in_executor(None, run_advisor)
+
+    async def execute_command(update, context):
+        plan = state["plan"]
+        if not plan:
+            await reply(update, "ℹ️ No trade plan yet. Run /scan first.")
+            return
+        state["plan"] = None # A plan is placed at most once
+        await reply(update, f"📤 *Placing {plan['data']['strategy']}* ({len(plan['data']['legs'])} legs)...")
+
+        def run_basket():
+            import basket_executor
+            import order_book
+            from zerodha_adapter import ZerodhaAdapter
+            try:
+                broker = ZerodhaAdapter(access_token=config.ACCESS_TOKEN)
+                report = basket_executor.execute_plan(plan, broker, order_book.get_order_book())
+                lines = [f"🧾 **Basket {report['status']}** in {report['elapsed_ms']}ms"]
+                lines += [f"   {r['action']} {r['qty']} x {r['symbol']}: {r['status']} ({r['latency_ms']}ms)"
+                          for r in report['legs'] + report['rollback']]
+                send_telegram_message("\n".join(lines))
+            except Exception as e:
+                send_telegram_message(f"❌ Execution Error: {e}")
+
+        asyncio.get_running_loop().run_in_executor(None, run_basket)
+
+    print("--- Starting Telegram Bot Listener ---")
+    application = ApplicationBuilder().token(config.TELEGRAM_BOT_TOKEN).build()
+    for name, handler in (("start", start_command), ("scan", scan_command), ("auto", auto_command),
+                          ("stop", stop_command), ("status", status_command), ("advice", advice_command),
+                          ("profile", profile_command), ("execute", execute_command)):
+        application.add_handler(CommandHandler(name, handler))
+
+    # Run the bot polling
+    application.run_polling()
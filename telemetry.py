@@ -0,0 +1,329 @@
+import os
+import json
+import time
+import bisect
+import itertools
+import threading
+import contextvars
+import datetime
+import functools
+from contextlib import contextmanager
+import config
+
+# ------------------------------------------------------------------------
+# SCAN TELEMETRY
+# ------------------------------------------------------------------------
+# Spans (pipeline stages, gates, engine calls) and per-endpoint Kite
+# latency histograms, tagged with the id of the scan they ran under.
+# Events are appended to a JSON-lines file and the aggregates are
+# rewritten as a Prometheus text file at the end of every scan.
+#
+# Disabled (the default), span() hands back one shared no-op context
+# manager and instrument()'s proxy returns the raw Kite methods, so the
+# cost is an attribute check per call.
+
+ENABLED = getattr(config, "TELEMETRY_ENABLED", False) or os.environ.get("BOT_TELEMETRY") == "1"
+TELEMETRY_DIR = getattr(config, "TELEMETRY_DIR", "telemetry")
+EVENTS_FILE = "events.jsonl"
+PROMETHEUS_FILE = "metrics.prom"
+FLUSH_EVERY = 500 # buffered events before an early flush
+
+# Histogram upper bounds (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# KiteConnect methods that hit the network (timed by instrument())
+API_METHODS = {
+    "quote", "ltp", "ohlc", "historical_data", "instruments", "positions", "holdings", "orders",
+    "trades", "order_history", "margins", "place_order", "modify_order", "cancel_order", "exit_order",
+    "basket_order_margins", "order_margins", "profile"
+}
+
+_scan_id = contextvars.ContextVar("scan_id", default=None)
+_parent = contextvars.ContextVar("span_parent", default=None)
+_scan_seq = itertools.count(1)
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # last slot = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding quantile q (None if empty).
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+class Telemetry:
+    def __init__(self, directory=TELEMETRY_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.api = {}       # endpoint -> Histogram
+        self.api_errors = {}
+        self.spans = {}     # span name -> Histogram
+        self.scans = {}     # kind -> count
+        self.buffer = []
+
+    def emit(self, event):
+        event["ts"] = datetime.datetime.now().isoformat(timespec="milliseconds")
+        with self.lock:
+            self.buffer.append(event)
+            full = len(self.buffer) >= FLUSH_EVERY
+        if full:
+            self.flush()
+
+    def observe_span(self, name, seconds):
+        with self.lock:
+            self.spans.setdefault(name, Histogram()).observe(seconds)
+
+    def observe_api(self, endpoint, seconds, error=False):
+        with self.lock:
+            self.api.setdefault(endpoint, Histogram()).observe(seconds)
+            if error:
+                self.api_errors[endpoint] = self.api_errors.get(endpoint, 0) + 1
+
+    def count_scan(self, kind):
+        with self.lock:
+            self.scans[kind] = self.scans.get(kind, 0) + 1
+
+    def flush(self):
+        """
+        Appends buffered events to the JSON-lines file and rewrites the
+        Prometheus file.
+        """
+        with self.lock:
+            events, self.buffer = self.buffer, []
+            prom = self.prometheus_text()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if events:
+                with open(os.path.join(self.directory, EVENTS_FILE), "a") as f:
+                    f.write("".join(json.dumps(e, default=str) + "\n" for e in events))
+            path = os.path.join(self.directory, PROMETHEUS_FILE)
+            with open(path + ".tmp", "w") as f:
+                f.write(prom)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"[Telemetry] Export failed: {e}")
+
+    def prometheus_text(self):
+        """
+        Prometheus text exposition of the aggregates (caller holds the lock).
+        """
+        lines = []
+        def histogram(metric, label, series, help_text):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for key, h in sorted(series.items()):
+                cumulative = 0
+                for bound, n in zip(h.buckets + (float("inf"),), h.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{metric}_bucket{{{label}="{key}",le="{le}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{{label}="{key}"}} {h.sum:.6f}')
+                lines.append(f'{metric}_count{{{label}="{key}"}} {h.count}')
+
+        histogram("kite_api_request_seconds", "endpoint", self.api, "Kite REST call latency")
+        lines.append("# HELP kite_api_errors_total Kite REST calls that raised")
+        lines.append("# TYPE kite_api_errors_total counter")
+        for endpoint in sorted(self.api):
+            lines.append(f'kite_api_errors_total{{endpoint="{endpoint}"}} {self.api_errors.get(endpoint, 0)}')
+        histogram("scan_span_seconds", "span", self.spans, "Time spent per pipeline stage / engine call")
+        lines.append("# HELP scans_total Scans run")
+        lines.append("# TYPE scans_total counter")
+        for kind, n in sorted(self.scans.items()):
+            lines.append(f'scans_total{{kind="{kind}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        {"api": {endpoint: {...}}, "spans": {name: {...}}} with counts and p50/p95 bounds (ms).
+        """
+        def stats(h, errors=None):
+            out = {"count": h.count, "avg_ms": round(h.sum / h.count * 1000, 2) if h.count else 0.0,
+                   "p50_ms": (h.quantile(0.50) or 0) * 1000, "p95_ms": (h.quantile(0.95) or 0) * 1000}
+            if errors is not None:
+                out["errors"] = errors
+            return out
+        with self.lock:
+            return {"api": {k: stats(h, self.api_errors.get(k, 0)) for k, h in self.api.items()},
+                    "spans": {k: stats(h) for k, h in self.spans.items()}}
+
+_telemetry = Telemetry()
+
+def get_telemetry():
+    return _telemetry
+
+def enable(directory=None):
+    global ENABLED
+    if directory:
+        _telemetry.directory = directory
+    ENABLED = True
+
+def disable():
+    global ENABLED
+    _telemetry.flush()
+    ENABLED = False
+
+# ------------------------------------------------------------------------
+# SCANS AND SPANS
+# ------------------------------------------------------------------------
+def current_scan_id():
+    return _scan_id.get()
+
+def new_scan_id(kind):
+    return f"{kind}-{datetime.datetime.now():%Y%m%d-%H%M%S}-{next(_scan_seq)}"
+
+@contextmanager
+def scan(kind):
+    """
+    Runs the block as one scan: assigns a scan id (always, so other tools
+    can key on it) and, when enabled, records a root span and exports at
+    the end. Nested scans keep the outer id.
+    """
+    if _scan_id.get() is not None:
+        yield _scan_id.get()
+        return
+    scan_id = new_scan_id(kind)
+    token = _scan_id.set(scan_id)
+    try:
+        if not ENABLED:
+            yield scan_id
+            return
+        _telemetry.count_scan(kind)
+        with span(kind):
+            yield scan_id
+    finally:
+        _scan_id.reset(token)
+        if ENABLED:
+            _telemetry.flush()
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+
+_NOOP = _NoopSpan()
+
+@contextmanager
+def _span(name, tags):
+    token = _parent.set(name)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _parent.reset(token)
+        record_span(name, time.perf_counter() - start, error=error, **tags)
+
+def span(name, **tags):
+    """
+    Times the block as a span named name (no-op when disabled).
+    """
+    if not ENABLED:
+        return _NOOP
+    return _span(name, tags)
+
+def traced(name=None):
+    """
+    Decorator: every call of the function is a span (fn.__name__ by default).
+    """
+    def wrap(fn):
+        label = name or fn.__name__
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with _span(label, {}):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+def record_span(name, seconds, error=None, **tags):
+    """
+    Records an already-measured duration as a span (for code that times itself).
+    """
+    if not ENABLED:
+        return
+    _telemetry.observe_span(name, seconds)
+    event = {"type": "span", "scan_id": _scan_id.get(), "name": name, "parent": _parent.get(),
+             "ms": round(seconds * 1000, 3)}
+    if error:
+        event["error"] = error
+    if tags:
+        event["tags"] = tags
+    _telemetry.emit(event)
+
+def bind(fn):
+    """
+    Wraps fn so it runs under the caller's scan id and parent span when
+    called from a worker thread (thread pools do not copy contextvars).
+    """
+    scan_id, parent = _scan_id.get(), _parent.get()
+    def bound(*args, **kwargs):
+        t1, t2 = _scan_id.set(scan_id), _parent.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _parent.reset(t2)
+            _scan_id.reset(t1)
+    return bound
+
+# ------------------------------------------------------------------------
+# KITE INSTRUMENTATION
+# ------------------------------------------------------------------------
+class InstrumentedKite:
+    """
+    Transparent KiteConnect proxy timing every REST method in API_METHODS
+    into the per-endpoint histograms.
+    """
+    def __init__(self, kite):
+        object.__setattr__(self, "_kite", kite)
+
+    def __getattr__(self, name):
+        attr = getattr(self._kite, name)
+        if not ENABLED or name not in API_METHODS:
+            return attr
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            error = None
+            try:
+                return attr(*args, **kwargs)
+            except Exception as e:
+                error = type(e).__name__
+                raise
+            finally:
+                seconds = time.perf_counter() - start
+                _telemetry.observe_api(name, seconds, error is not None)
+                event = {"type": "api", "scan_id": _scan_id.get(), "endpoint": name, "parent": _parent.get(),
+                         "ms": round(seconds * 1000, 3)}
+                if error:
+                    event["error"] = error
+                _telemetry.emit(event)
+        return timed
+
+    def __setattr__(self, name, value):
+        setattr(self._kite, name, value)
+
+def instrument(kite):
+    if kite is None or isinstance(kite, InstrumentedKite):
+        return kite
+    return InstrumentedKite(kite)
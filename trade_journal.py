@@ -1,36 +1,68 @@
-import csv
-import os
 import datetime
-
-JOURNAL_FILE = "trade_journal.csv"
+import journal_store
+import performance_cube
 
 def log_trade(symbol, strike, expiry_type, entry, exit_price, pnl, reason, exit_reason, **kwargs):
     """
-    Logs trade details to a CSV file.
+    Logs trade details to the journal store (journal_store.JOURNAL_DB).
     """
-    file_exists = os.path.isfile(JOURNAL_FILE)
-    
-    with open(JOURNAL_FILE, mode='a', newline='') as file:
-        writer = csv.writer(file)
-        
-        # Header if new
-        if not file_exists:
-            writer.writerow(["Timestamp", "Symbol", "Strike", "ExpiryType", "Entry", "Exit", "PnL", "EntryReason", "ExitReason", "Regime", "Strategy", "DTE", "Confidence"])
-            
-        writer.writerow([
-            datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            symbol,
-            strike,
-            kwargs.get('expiry_type', expiry_type),
-            round(entry, 2),
-            round(exit_price, 2),
-            round(pnl, 2),
-            reason,
-            exit_reason,
-            kwargs.get('regime', 'N/A'),
-            kwargs.get('strategy', 'N/A'),
-            kwargs.get('dte', 'N/A'),
-            kwargs.get('confidence', 'N/A')
-        ])
+    store = journal_store.get_journal_store()
+    store.add({
+        "Timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "Symbol": symbol,
+        "Strike": strike,
+        "ExpiryType": kwargs.get('expiry_type', expiry_type),
+        "Entry": round(entry, 2),
+        "Exit": round(exit_price, 2),
+        "PnL": round(pnl, 2),
+        "EntryReason": reason,
+        "ExitReason": exit_reason,
+        "Regime": kwargs.get('regime', 'N/A'),
+        "Strategy": kwargs.get('strategy', 'N/A'),
+        "DTE": kwargs.get('dte', 'N/A'),
+        "Confidence": kwargs.get('confidence', 'N/A')
+    })
+    performance_cube.get_cube().sync() # folds in just the new row
     
-    print(f"[Journal] Trade saved to {JOURNAL_FILE}")
+    print(f"[Journal] Trade saved to {store.path}")
+
+def book_position(symbol, book=None):
+    """
+    Entry side of the open position in symbol from the order book mirror:
+    {"entry": avg price, "qty": units, "side": "BUY"|"SELL"}, or None if flat.
+    Read it BEFORE sending the exit order; once that fills the book is flat.
+    """
+    if book is None:
+        import order_book
+        book = order_book.get_order_book()
+
+    entries = book.open_entry_fills(symbol)
+    qty = sum(f.get("quantity", 0) for f in entries)
+    if not qty:
+        return None
+    return {
+        "entry": book.average_entry_price(symbol),
+        "qty": qty,
+        "side": entries[0].get("transaction_type")
+    }
+
+def log_trade_from_book(symbol, exit_price, reason, exit_reason, position=None, strike="N/A", expiry_type="N/A", **kwargs):
+    """
+    Logs a closing trade using the order book mirror for the entry side,
+    so no orders()/trades() call is made here. position is the
+    book_position() captured before the exit order; without it the book
+    is read now, which only works while the position is still open.
+    """
+    position = position or book_position(symbol)
+    if not position:
+        print(f"[Journal] No open position in the order book for {symbol}; trade not logged.")
+        return
+
+    entry = position["entry"]
+    qty = position["qty"]
+    if position["side"] == "BUY":
+        pnl = (exit_price - entry) * qty
+    else:
+        pnl = (entry - exit_price) * qty
+
+    log_trade(symbol, strike, expiry_type, entry, exit_price, pnl, reason, exit_reason, **kwargs)
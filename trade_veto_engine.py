@@ -1,9 +1,21 @@
 
 import datetime
+import numpy as np
 import greeks_engine
-import kite_data
 import market_regime_engine
 
+# Reason codes, in the order the rules are evaluated (first hit wins)
+VETO_RULES = [
+    # code, reason, category
+    ("WIDE_SPREAD", "Wide Spread", "LIQUIDITY"),
+    ("WIDE_SPREAD_CHEAP", "Wide Spread on Cheap Option", "LIQUIDITY"),
+    ("LOW_PRICE_SELL", "Price too low for Selling", "LIQUIDITY"),
+    ("EXPIRY_TOO_CLOSE", "Expiry Too Close (<3 Days)", "TIME DECAY"),
+    ("LATE_DAY_OTM", "Late Day OTM Buy", "TIME DECAY"),
+    ("RANGE_REGIME", "Buying in Sideways Market", "RANGE REGIME"),
+    ("VOLATILITY_TAX", "Overpriced Option", "VOLATILITY TAX"),
+]
+
 def check_veto(candidate, market_context, kite):
     """
     Analyzes a trade candidate and returns a Veto Object.
@@ -18,129 +30,148 @@ def check_veto(candidate, market_context, kite):
       "veto": bool,
       "veto_reason": str,
       "veto_category": str,
+      "veto_code": str,
       "details": str
     }
     """
-    
-    symbol = candidate['symbol']
-    action = candidate['action'] # BUY / SELL
-    opt_type = candidate['type'] # CE / PE
-    ltp = candidate['premium']
-    
-    # Defaults
-    result = {
-        "veto": False, 
-        "veto_reason": "", 
-        "veto_category": "", 
-        "details": ""
-    }
+    return check_veto_batch([candidate], market_context, kite)[0]
+
+def fetch_veto_snapshot(candidates, kite):
+    """
+    ONE quote call for every leg (depth for spreads, iv / last_price for IV).
+    """
+    syms = [_nfo(c['symbol']) for c in candidates]
+    try:
+        return kite.quote(syms) or {}
+    except Exception as e:
+        print(f"[Veto] Snapshot quote failed: {e}")
+        return {}
+
+def _nfo(symbol):
+    return symbol if symbol.startswith("NFO:") else "NFO:" + symbol
+
+def _snapshot_iv(quotes, candidates, spot, T):
+    """
+    Quote IV where present, else solved from last price (percent, 0 if unknown).
+    """
+    iv = np.array([quotes.get(_nfo(c['symbol']), {}).get("iv") or 0 for c in candidates], dtype=float)
+    missing = iv <= 0
+    if missing.any() and spot:
+        ltp = np.array([quotes.get(_nfo(c['symbol']), {}).get("last_price", 0) or 0 for c in candidates], dtype=float)
+        K = np.array([c.get('strike', 0) or 0 for c in candidates], dtype=float)
+        is_call = np.array([c['type'] == "CE" for c in candidates])
+        solved = greeks_engine.get_implied_volatility_vectorized(ltp, spot, K, T, 0.07, is_call)
+        iv = np.where(missing, solved, iv)
+    return iv
+
+def check_veto_batch(candidates, market_context, kite=None, snapshot=None, now=None):
+    """
+    Veto check for all legs at once against one shared market snapshot.
+
+    snapshot: {"NFO:SYMBOL": quote} (fetched with one quote call if None).
+    The spread, time-decay, range-regime and volatility-tax rules run as
+    boolean masks over the legs. Returns one verdict per leg (same shape as
+    check_veto) with the first failing rule's "veto_code" from VETO_RULES.
+    """
+    n = len(candidates)
+    if n == 0:
+        return []
+    quotes = snapshot if snapshot is not None else fetch_veto_snapshot(candidates, kite)
+    now = now or datetime.datetime.now()
+    current_time_str = now.strftime("%H:%M")
+
+    action = np.array([c['action'] for c in candidates])
+    opt_type = np.array([c['type'] for c in candidates])
+    ltp = np.array([c['premium'] for c in candidates], dtype=float)
+    strike = np.array([c.get('strike', 0) or 0 for c in candidates], dtype=float)
+    buy = action == "BUY"
 
     # ----------------------------------------------------------------
     # 1. LIQUIDITY & SPREAD VETO
     # ----------------------------------------------------------------
     # Rule 1: Spread > 2% -> Veto
     # Rule 2: Spread > 1% AND Premium < 20 -> Veto
-    spread_info = kite_data.get_quote_spread(symbol, kite)
-    
-    if spread_info:
-        spread_pct = spread_info['spread_pct']
-        
-        if spread_pct > 2.0:
-            return _veto("Wide Spread", "LIQUIDITY", f"Bid-Ask Spread is {spread_pct:.2f}% (>2%). Slippage Risk.")
-            
-        if spread_pct > 1.0 and ltp < 20.0:
-            return _veto("Wide Spread on Cheap Option", "LIQUIDITY", f"Spread {spread_pct:.2f}% is too high for LTP {ltp}.")
-            
+    spread_pct = np.full(n, np.nan)
+    for i, c in enumerate(candidates):
+        depth = quotes.get(_nfo(c['symbol']), {}).get('depth') or {}
+        bids, asks = depth.get('buy') or [], depth.get('sell') or []
+        if bids and asks and bids[0]['price'] > 0:
+            spread_pct[i] = (asks[0]['price'] - bids[0]['price']) / bids[0]['price'] * 100
+    has_spread = ~np.isnan(spread_pct)
+    spread = np.nan_to_num(spread_pct)
+
+    wide = has_spread & (spread > 2.0)
+    wide_cheap = has_spread & (spread > 1.0) & (ltp < 20.0)
     # Basic Check for Sellers (Gamma/Tail Risk on pennies)
-    if ltp < 5 and action == "SELL":
-        return _veto("Price too low for Selling", "LIQUIDITY", f"LTP {ltp} is risky for selling (Gamma risk).")
+    low_sell = (ltp < 5) & (action == "SELL")
 
     # ----------------------------------------------------------------
     # 2. TIME DECAY VETO (Blocks Late Day OTM Buys)
     # ----------------------------------------------------------------
-    now = datetime.datetime.now()
-    current_time_str = now.strftime("%H:%M")
-    
-    # Calculate DTE
-    expiry_date = candidate.get('expiry') # Need strictly
-    dfe = greeks_engine.calculate_time_to_expiry(expiry_date) * 365 # Days
-    
-    if action == "BUY":
-        # New Rule: Block ALL new Longs if DTE <= 3
-        if dfe <= 3.0:
-             return _veto("Expiry Too Close (<3 Days)", "TIME DECAY", f"Buying with DTE {dfe:.1f} is high Gamma risk.")
-
-        # If DTE <= 1 (Expiry or day before) AND Time > 13:30 AND OTM
-        if dfe <= 1.0 and current_time_str > "13:30":
-            # Check OTM status
-            spot = market_context.get('spot_price', 0)
-            strike = candidate.get('strike', 0)
-            is_otm = (opt_type == "CE" and spot < strike) or (opt_type == "PE" and spot > strike)
-            
-            if is_otm:
-                return _veto("Late Day OTM Buy", "TIME DECAY", "Buying OTM options > 1:30 PM near expiry is poor R:R.")
+    # DTE once per distinct expiry
+    dte_cache = {}
+    for c in candidates:
+        exp = c.get('expiry')
+        if exp not in dte_cache:
+            dte_cache[exp] = greeks_engine.calculate_time_to_expiry(exp)
+    T = np.array([dte_cache[c.get('expiry')] for c in candidates])
+    dfe = T * 365 # Days
+
+    spot = market_context.get('spot_price', 0)
+    is_otm = ((opt_type == "CE") & (spot < strike)) | ((opt_type == "PE") & (spot > strike))
+    too_close = buy & (dfe <= 3.0)
+    late_otm = buy & (dfe <= 1.0) & (current_time_str > "13:30") & is_otm
 
     # ----------------------------------------------------------------
     # 3. RANGE REGIME VETO (Blocks Longs in Chop)
     # ----------------------------------------------------------------
     regime = market_context.get('regime', "SIDEWAYS")
-    
-    if action == "BUY" and ("SIDEWAYS" in regime or "SLOW" in regime):
-        # Allow only if Volatility is expanding
-        vol_state = market_context.get('volatility', "LOW")
-        if "HIGH" not in vol_state:
-             return _veto("Buying in Sideways Market", "RANGE REGIME", f"Regime is {regime} and Volatility is {vol_state}. Sellers edge.")
+    vol_state = market_context.get('volatility', "LOW")
+    range_bound = ("SIDEWAYS" in regime or "SLOW" in regime) and "HIGH" not in vol_state
+    range_veto = buy & range_bound
 
     # ----------------------------------------------------------------
     # 4. VOLATILITY TAX VETO (Blocks Expensive/Overpriced Options)
     # ----------------------------------------------------------------
     # Formula: Volatility Tax = IV / RV
-    # IF Tax > 1.2 -> Veto Longs
-    
-    iv = kite_data.get_iv_value(kite, symbol) or 0
+    # IF Tax > 1.2 or Extreme Rank > 80 -> Veto Longs
     iv_rank = market_context.get('iv_rank', 0)
     rv = market_context.get('hv', 0) # Using HV as Realized Volatility
-    
-    # Calculate Volatility Tax
-    vol_tax = 0
-    if rv > 0:
-        vol_tax = iv / rv
-    
-    if action == "BUY":
-        # Rule: Volatility Tax > 1.2 or Extreme Rank > 80
-        tax_breach = (vol_tax > 1.2)
-        rank_breach = (iv_rank > 80)
-        
-        if tax_breach or rank_breach:
-             reason = f"Volatility Tax {vol_tax:.2f} > 1.2" if tax_breach else f"IV Rank {iv_rank} > 80"
-             return _veto("Overpriced Option", "VOLATILITY TAX", f"{reason}. IV is expensive vs Realized Vol.")
-             
-    # ----------------------------------------------------------------
-    # 5. URGENCY VETO (The "Why Now?" Check)
-    # ----------------------------------------------------------------
-    # Direction without urgency = Bleed.
-    # If Buying, we need Trend Strength or High Momentum
-    trend_dir = market_context.get('trend', "")
-    
-    if action == "BUY":
-        # Check alignment
-        if opt_type == "CE" and "UP" not in trend_dir:
-             # Counter trend buy?
-             pass # Maybe mean reversion, allow for now unless strict
-        
-        # Check Theta vs Move
-        # If Theta is high, we need high conviction
-        # Calculate Theta
-        # We need greeks. 
-        # For efficiency, maybe skip expensive calc if satisfied elsewhere.
-        pass
-
-    return result
-
-def _veto(reason, category, details):
+    vol_tax = np.zeros(n)
+    if rv > 0 and buy.any():
+        vol_tax = _snapshot_iv(quotes, candidates, spot, T) / rv
+    tax_breach = vol_tax > 1.2
+    vol_veto = buy & (tax_breach | (iv_rank > 80))
+
+    # First failing rule per leg, in VETO_RULES order
+    masks = np.vstack([wide, wide_cheap, low_sell, too_close, late_otm, range_veto, vol_veto])
+    hit = masks.any(axis=0)
+    first = masks.argmax(axis=0)
+
+    results = []
+    for i in range(n):
+        if not hit[i]:
+            results.append({"veto": False, "veto_reason": "", "veto_category": "", "veto_code": "", "details": ""})
+            continue
+        code, reason, category = VETO_RULES[first[i]]
+        details = {
+            "WIDE_SPREAD": f"Bid-Ask Spread is {spread[i]:.2f}% (>2%). Slippage Risk.",
+            "WIDE_SPREAD_CHEAP": f"Spread {spread[i]:.2f}% is too high for LTP {ltp[i]:g}.",
+            "LOW_PRICE_SELL": f"LTP {ltp[i]:g} is risky for selling (Gamma risk).",
+            "EXPIRY_TOO_CLOSE": f"Buying with DTE {dfe[i]:.1f} is high Gamma risk.",
+            "LATE_DAY_OTM": "Buying OTM options > 1:30 PM near expiry is poor R:R.",
+            "RANGE_REGIME": f"Regime is {regime} and Volatility is {vol_state}. Sellers edge.",
+            "VOLATILITY_TAX": (f"Volatility Tax {vol_tax[i]:.2f} > 1.2" if tax_breach[i] else f"IV Rank {iv_rank} > 80")
+                              + ". IV is expensive vs Realized Vol."
+        }[code]
+        results.append(_veto(reason, category, details, code))
+    return results
+
+def _veto(reason, category, details, code=""):
     return {
         "veto": True,
         "veto_reason": reason,
         "veto_category": category,
+        "veto_code": code,
         "details": details
     }
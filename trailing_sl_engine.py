@@ -1,3 +1,15 @@
+import os
+import threading
+import numpy as np
+
+# (price as multiple of entry, SL locked as multiple of entry), highest first.
+# Each step is a fixed price level, so trigger books can arm them up front.
+TRAIL_STEPS = [
+    (1.30, 1.15), # Trail to +15% profit
+    (1.20, 1.05), # Trail to +5% profit
+    (1.10, 0.95)  # Trail to -5% (Reduce risk)
+]
+
 def get_trailing_sl(entry_price, current_price, current_sl):
     """
     Calculates the new trailing stop-loss based on price movement.
@@ -15,20 +27,182 @@ def get_trailing_sl(entry_price, current_price, current_sl):
     
     new_sl = current_sl
     
-    # Check Price thresholds
-    if current_price >= entry_price * 1.30:
-        # Trail to +15% profit
-        proposed = entry_price * 1.15
-        if proposed > new_sl: new_sl = proposed
-        
-    elif current_price >= entry_price * 1.20:
-        # Trail to +5% profit
-        proposed = entry_price * 1.05
-        if proposed > new_sl: new_sl = proposed
-        
-    elif current_price >= entry_price * 1.10:
-        # Trail to -5% (Reduce risk)
-        proposed = entry_price * 0.95
-        if proposed > new_sl: new_sl = proposed
+    # Check Price thresholds (highest step reached wins)
+    for move_pct, lock_pct in TRAIL_STEPS:
+        if current_price >= entry_price * move_pct:
+            proposed = entry_price * lock_pct
+            if proposed > new_sl: new_sl = proposed
+            break
         
     return new_sl
+
+# ------------------------------------------------------------------------
+# VECTORIZED + PERSISTENT TRAILING STOPS
+# ------------------------------------------------------------------------
+TRAILING_STATE_FILE = "trailing_stops.npz"
+INITIAL_SL_PCT = 0.70 # Default starting SL (70% of entry)
+
+def get_trailing_sl_batch(entry_price, current_price, current_sl):
+    """
+    Array version of get_trailing_sl: same steps, one pass for all positions.
+    """
+    entry = np.asarray(entry_price, dtype=float)
+    price = np.asarray(current_price, dtype=float)
+    new_sl = np.array(current_sl, dtype=float, copy=True)
+
+    # Highest step reached wins; steps are ordered highest first
+    proposed = np.full(np.broadcast(entry, price).shape, -np.inf)
+    reached = np.zeros(proposed.shape, dtype=bool)
+    for move_pct, lock_pct in TRAIL_STEPS:
+        hit = ~reached & (price >= entry * move_pct)
+        proposed = np.where(hit, entry * lock_pct, proposed)
+        reached |= hit
+
+    valid = entry > 0
+    return np.where(valid, np.maximum(new_sl, proposed), new_sl)
+
+class TrailingStopBook:
+    """
+    Entry, high-water mark and current stop for every tracked position in
+    flat numpy arrays (symbol -> row index). update() ratchets every stop
+    in one vectorized call; checkpoint() writes the arrays to one .npz so
+    stops survive restarts. Rows are removed by swapping in the last row.
+    """
+    def __init__(self, path=TRAILING_STATE_FILE, capacity=64):
+        self.path = path
+        self.lock = threading.Lock()
+        self.symbols = []
+        self.index = {}
+        self.entry = np.zeros(capacity)
+        self.hwm = np.zeros(capacity)
+        self.sl = np.zeros(capacity)
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def _grow(self):
+        cap = max(len(self.entry) * 2, 1)
+        for name in ("entry", "hwm", "sl"):
+            arr = np.zeros(cap)
+            arr[:len(self.symbols)] = getattr(self, name)[:len(self.symbols)]
+            setattr(self, name, arr)
+
+    def add(self, symbol, entry_price, sl=None):
+        """
+        Starts tracking symbol (no-op if already tracked, so a restart
+        keeps the persisted stop).
+        """
+        with self.lock:
+            if symbol in self.index:
+                return False
+            if len(self.symbols) == len(self.entry):
+                self._grow()
+            i = len(self.symbols)
+            self.symbols.append(symbol)
+            self.index[symbol] = i
+            self.entry[i] = entry_price
+            self.hwm[i] = entry_price
+            self.sl[i] = sl if sl is not None else entry_price * INITIAL_SL_PCT
+            self.dirty = True
+        return True
+
+    def remove(self, symbol):
+        with self.lock:
+            i = self.index.pop(symbol, None)
+            if i is None:
+                return False
+            last = len(self.symbols) - 1
+            if i != last:
+                moved = self.symbols[last]
+                self.symbols[i] = moved
+                self.index[moved] = i
+                for arr in (self.entry, self.hwm, self.sl):
+                    arr[i] = arr[last]
+            self.symbols.pop()
+            self.dirty = True
+        return True
+
+    def get(self, symbol):
+        with self.lock:
+            i = self.index.get(symbol)
+            if i is None:
+                return None
+            return {"entry": float(self.entry[i]), "hwm": float(self.hwm[i]), "sl": float(self.sl[i])}
+
+    def update(self, prices):
+        """
+        prices: {symbol: ltp} or an array aligned with self.symbols (NaN = no price).
+        Raises high-water marks, ratchets stops and returns the symbols whose
+        price is below their stop (exit_engine.should_exit_by_trailing_sl).
+        """
+        with self.lock:
+            n = len(self.symbols)
+            if isinstance(prices, dict):
+                px = np.full(n, np.nan)
+                for symbol, ltp in prices.items():
+                    i = self.index.get(symbol)
+                    if i is not None and ltp:
+                        px[i] = ltp
+            else:
+                px = np.asarray(prices, dtype=float)
+
+            priced = ~np.isnan(px)
+            hwm = np.where(priced, np.fmax(self.hwm[:n], px), self.hwm[:n])
+            new_sl = get_trailing_sl_batch(self.entry[:n], hwm, self.sl[:n])
+
+            if not (np.array_equal(hwm, self.hwm[:n]) and np.array_equal(new_sl, self.sl[:n])):
+                self.hwm[:n] = hwm
+                self.sl[:n] = new_sl
+                self.dirty = True
+
+            hit = priced & (self.sl[:n] > 0) & (np.nan_to_num(px) < self.sl[:n])
+            return [self.symbols[i] for i in np.flatnonzero(hit)]
+
+    def checkpoint(self, force=False):
+        """
+        Writes the arrays atomically (tmp file + rename) when anything changed.
+        """
+        with self.lock:
+            if not (self.dirty or force) or not self.path:
+                return False
+            n = len(self.symbols)
+            tmp = self.path + ".tmp.npz"
+            np.savez(tmp, symbols=np.array(self.symbols, dtype=str), entry=self.entry[:n],
+                     hwm=self.hwm[:n], sl=self.sl[:n])
+            os.replace(tmp, self.path)
+            self.dirty = False
+        return True
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            data = np.load(self.path)
+        except Exception as e:
+            print(f"[TrailingSL] Could not load {self.path}: {e}")
+            return False
+        with self.lock:
+            self.symbols = [str(s) for s in data["symbols"]]
+            self.index = {s: i for i, s in enumerate(self.symbols)}
+            cap = max(len(self.symbols), 64)
+            for name in ("entry", "hwm", "sl"):
+                arr = np.zeros(cap)
+                arr[:len(self.symbols)] = data[name]
+                setattr(self, name, arr)
+            self.dirty = False
+        return True
+
+_book = None
+_book_lock = threading.Lock()
+
+def get_trailing_book(path=TRAILING_STATE_FILE):
+    """
+    Process-wide trailing stop book, restored from disk on first use.
+    """
+    global _book
+    with _book_lock:
+        if _book is None:
+            _book = TrailingStopBook(path)
+            _book.load()
+    return _book
@@ -0,0 +1,125 @@
+import heapq
+import itertools
+import threading
+from collections import defaultdict
+
+# ------------------------------------------------------------------------
+# PRICE-TRIGGER BOOK
+# ------------------------------------------------------------------------
+# Per instrument, ABOVE triggers sit in a min-heap and BELOW triggers in a
+# max-heap, so a tick only looks at the heap tops and pops the levels it
+# crossed. Moving or cancelling a trigger does not search the heap: the
+# trigger's version is bumped and the old heap entry is dropped when it
+# surfaces (lazy invalidation). Cost per tick is O(fired * log n).
+
+ABOVE = "ABOVE" # fires when price >= level
+BELOW = "BELOW" # fires when price <= level
+
+COMPACT_RATIO = 2 # rebuild a heap once stale entries outnumber live ones this much
+
+class TriggerBook:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.triggers = {}              # trigger_id -> {"id", "instrument", "level", "direction", "payload", "version"}
+        self.upper = defaultdict(list)  # instrument -> heap of (level, seq, id, version)
+        self.lower = defaultdict(list)  # instrument -> heap of (-level, seq, id, version)
+        self.live = defaultdict(int)    # instrument -> live trigger count
+        self._ids = itertools.count(1)
+        self._seq = itertools.count()
+
+    def add(self, instrument, level, direction, payload=None):
+        """
+        Arms a one-shot trigger and returns its id.
+        """
+        tid = next(self._ids)
+        with self.lock:
+            self.triggers[tid] = {"id": tid, "instrument": instrument, "level": level,
+                                  "direction": direction, "payload": payload, "version": 0}
+            self.live[instrument] += 1
+            self._push(self.triggers[tid])
+        return tid
+
+    def move(self, tid, level):
+        """
+        Re-levels a live trigger in place (trailing stops). Returns False if
+        the trigger already fired or was cancelled.
+        """
+        with self.lock:
+            trig = self.triggers.get(tid)
+            if trig is None:
+                return False
+            trig["level"] = level
+            trig["version"] += 1
+            self._push(trig)
+            self._maybe_compact(trig["instrument"])
+        return True
+
+    def cancel(self, tid):
+        with self.lock:
+            trig = self.triggers.pop(tid, None)
+            if trig is None:
+                return None
+            self.live[trig["instrument"]] -= 1
+            self._maybe_compact(trig["instrument"])
+        return trig
+
+    def get(self, tid):
+        with self.lock:
+            trig = self.triggers.get(tid)
+            return dict(trig) if trig else None
+
+    def on_price(self, instrument, price):
+        """
+        Pops and returns every trigger on instrument crossed by price
+        (each trigger fires once).
+        """
+        fired = []
+        with self.lock:
+            upper = self.upper.get(instrument)
+            while upper and upper[0][0] <= price:
+                _, _, tid, version = heapq.heappop(upper)
+                self._fire(tid, version, fired)
+
+            lower = self.lower.get(instrument)
+            while lower and -lower[0][0] >= price:
+                _, _, tid, version = heapq.heappop(lower)
+                self._fire(tid, version, fired)
+        return fired
+
+    def __len__(self):
+        return len(self.triggers)
+
+    # --------------------------------------------------------------------
+    # INTERNALS (caller holds the lock)
+    # --------------------------------------------------------------------
+    def _push(self, trig):
+        if trig["direction"] == ABOVE:
+            heapq.heappush(self.upper[trig["instrument"]], (trig["level"], next(self._seq), trig["id"], trig["version"]))
+        else:
+            heapq.heappush(self.lower[trig["instrument"]], (-trig["level"], next(self._seq), trig["id"], trig["version"]))
+
+    def _fire(self, tid, version, fired):
+        trig = self.triggers.get(tid)
+        if trig is None or trig["version"] != version:
+            return # stale entry (moved or cancelled)
+        del self.triggers[tid]
+        self.live[trig["instrument"]] -= 1
+        fired.append(trig)
+
+    def _maybe_compact(self, instrument):
+        entries = len(self.upper.get(instrument, ())) + len(self.lower.get(instrument, ()))
+        if entries <= COMPACT_RATIO * max(self.live[instrument], 1):
+            return
+        upper, lower = [], []
+        for heap, out in ((self.upper[instrument], upper), (self.lower[instrument], lower)):
+            for entry in heap:
+                trig = self.triggers.get(entry[2])
+                if trig is not None and trig["version"] == entry[3]:
+                    out.append(entry)
+            heapq.heapify(out)
+        self.upper[instrument] = upper
+        self.lower[instrument] = lower
+        if not self.live[instrument]:
+            self.upper.pop(instrument, None)
+            self.lower.pop(instrument, None)
+            self.live.pop(instrument, None)
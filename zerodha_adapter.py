@@ -1,13 +1,18 @@
 import logging
 from kiteconnect import KiteConnect
 import config
+import telemetry
 from broker_interface import BrokerInterface
-from utils import logger, exchange_rate_limiter
+from utils import logger
+from rate_limiter import kite_limiter, QUOTE, ORDERS, OTHERS, PRIORITY_NORMAL, PRIORITY_ORDER
 
 class ZerodhaAdapter(BrokerInterface):
-    def __init__(self):
-        self.kite = KiteConnect(api_key=config.API_KEY)
-        self.access_token = None
+    def __init__(self, access_token=None):
+        self.kite = telemetry.instrument(KiteConnect(api_key=config.API_KEY, root=getattr(config, "KITE_ROOT", None)))
+        self.access_token = access_token
+        if access_token:
+            # Session already generated (e.g. config.ACCESS_TOKEN): no interactive login
+            self.kite.set_access_token(access_token)
 
     def login(self):
         """
@@ -42,7 +47,7 @@ class ZerodhaAdapter(BrokerInterface):
         Zerodha uses 'Exchange:Symbol' format for fetching LTP.
         Example: 'NSE:NIFTY 50', 'NFO:NIFTY24JAN21500CE'
         """
-        exchange_rate_limiter.wait_for_token()
+        kite_limiter.acquire(QUOTE, PRIORITY_ORDER)
         try:
             # Construct instrument id
             # If symbol_name is "NIFTY 50", we use "NSE:NIFTY 50"
@@ -61,11 +66,12 @@ class ZerodhaAdapter(BrokerInterface):
             logger.error(f"Error fetching LTP for {symbol_name}: {e}")
             return None
 
-    def place_order(self, transaction_type, exchange, symbol_token, qty, product_type, order_type="MARKET", price=0, symbol_name=""):
+    def place_order(self, transaction_type, exchange, symbol_token, qty, product_type, order_type="MARKET", price=0, symbol_name="", priority=PRIORITY_ORDER):
         """
         transaction_type: 'BUY' or 'SELL'
+        priority: rate_limiter.PRIORITY_EXIT for stop-loss / square-off orders
         """
-        exchange_rate_limiter.wait_for_token()
+        kite_limiter.acquire(ORDERS, priority)
         
         # Kite Constants
         trans_type = self.kite.TRANSACTION_TYPE_BUY if transaction_type == "BUY" else self.kite.TRANSACTION_TYPE_SELL
@@ -92,7 +98,7 @@ class ZerodhaAdapter(BrokerInterface):
             return None
 
     def get_positions(self):
-        exchange_rate_limiter.wait_for_token()
+        kite_limiter.acquire(OTHERS, PRIORITY_NORMAL)
         try:
             # Kite returns {'net': [], 'day': []}
             kite_pos = self.kite.positions()